@@ -1,5 +1,6 @@
 import streamlit as st
-from src.agent import app
+from src import registry
+from src.agent import stream_answer
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -16,6 +17,15 @@ st.info(""" This is a simple chat interface for an agent that can answer questio
         \n Try city name for wether report 'Delhi'
         """)
 
+# --- Shared Clients ---
+# Streamlit reruns this script on every interaction; build the heavy clients only once per process
+@st.cache_resource
+def warmup_clients():
+    registry.warmup()
+    return True
+
+warmup_clients()
+
 # --- Session State for Chat History ---
 # Initialize chat history if it doesn't exist
 if "messages" not in st.session_state:
@@ -36,18 +46,12 @@ if prompt := st.chat_input("Ask me anything..."):
         st.markdown(prompt)
 
     # --- Get Agent's Response ---
-    # Display a loading spinner while the agent is thinking
-    with st.spinner("Thinking..."):
-        # The input to the graph is a dictionary with keys matching the AgentState
-        inputs = {"question": prompt}
-        
-        # Invoke the agent
-        final_state = app.invoke(inputs)
-        
-        # Extract the final answer
-        response = final_state.get("answer", "Sorry, I encountered an error.")
-
-    # Add agent's response to session state and display it
-    st.session_state.messages.append({"role": "assistant", "content": response})
+    # Stream the answer into the chat as the LLM generates it, instead of waiting for the full text
     with st.chat_message("assistant"):
-        st.markdown(response)
\ No newline at end of file
+        response = st.write_stream(stream_answer(prompt))
+        if not response:
+            response = "Sorry, I encountered an error."
+            st.markdown(response)
+
+    # Add agent's response to session state
+    st.session_state.messages.append({"role": "assistant", "content": response})
@@ -0,0 +1,404 @@
+"""
+Offline benchmark suite for cold start, ingestion, retrieval and the agent graph.
+
+Everything runs in-process with fake embeddings, a fake LLM, a stubbed weather API and an
+in-memory Qdrant, so results are reproducible without network access or API keys.
+
+    python -m benchmarks.run                                # quick run (1k and 10k chunks)
+    python -m benchmarks.run --sizes 1000 100000 1000000    # full scale run
+    python -m benchmarks.run --save-baseline                # record the current numbers
+
+The suite runs `--repeat` times and each metric is the median of the runs. The result is
+compared with `benchmarks/baseline.json`; a metric more than `--tolerance` worse than its
+baseline is reported as a regression and the command exits with status 1. p99 latencies and
+memory are reported but not gated (see `UNGATED`).
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+from unittest.mock import MagicMock
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+from qdrant_client import QdrantClient, models
+
+from src import config
+from src import metrics
+from src import registry
+from src import vector_db
+from src.embeddings import FakeEmbeddings, normalize_rows
+from src.mmap_store import MmapVectorStore
+from src.sparse_index import BM25Index
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = "data/sample.pdf"
+QUESTIONS = [
+    "What's the weather in Delhi?",
+    "Tell me about Avdeep's experience",
+    "Will it rain in London?",
+    "Which projects has he worked on?",
+]
+
+# Metrics where a higher value is better; every other metric is better when lower
+HIGHER_IS_BETTER = ("pages_per_s", "chunks_per_s", "qps", "saved_ms_mean")
+
+# Metrics too noisy to gate on, whatever the tolerance: tail latency rests on one or two samples,
+# and an RSS delta depends on how much memory earlier benchmarks in the process freed
+UNGATED = ("p99_ms", "memory_mb")
+
+
+# --- Offline Environment ---
+
+@contextmanager
+def offline_environment(workdir: str):
+    """
+    Points every shared client at an in-process fake and every on-disk artefact at `workdir`.
+    The previous configuration and registry are restored afterwards.
+    """
+    overrides = {
+        "QDRANT_COLLECTION_NAME": "benchmark_chunks",
+        "INGEST_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+        "INGEST_CHECKPOINT_PATH": os.path.join(workdir, "checkpoint.jsonl"),
+        "SPARSE_INDEX_PATH": os.path.join(workdir, "sparse_index.json"),
+        "ANSWER_CACHE_ENABLED": False,
+        "MICRO_BATCH_ENABLED": False,
+        "EMBEDDING_CACHE_ENABLED": False,
+        "METRICS_LOG_PATH": None,
+    }
+    previous = {name: getattr(config, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    registry.shutdown()
+
+    weather = MagicMock()
+    weather.run.return_value = "Delhi: 31°C, clear sky"
+    registry.override("qdrant_client", QdrantClient(":memory:"))
+    registry.override("embeddings_model", FakeEmbeddings())
+    registry.override("weather_wrapper", weather)
+    registry.override("sparse_index", BM25Index())
+    # The fake LLM answers instantly, so the graph's own overhead is what gets measured
+    registry.override("decider_chain", RunnableLambda(lambda inputs: "rag"))
+    registry.override("processing_chain", RunnableLambda(lambda inputs: f"Answer: {inputs['context'][:200]}"))
+    try:
+        yield
+    finally:
+        registry.shutdown()
+        for name, value in previous.items():
+            setattr(config, name, value)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# --- Benchmarks ---
+
+# Runs in a fresh interpreter, so nothing is imported yet; prints the two timings as JSON
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from src import agent
+imported = time.perf_counter()
+agent.build_app()
+built = time.perf_counter()
+print(json.dumps({"import": imported - start, "build": built - imported}))
+"""
+
+
+def bench_startup(runs: int = 5) -> Dict[str, float]:
+    """
+    Measures a cold start: importing the agent module, then compiling the graph with `build_app()`.
+    Each run is a new Python process (interpreter start-up itself is not counted).
+    """
+    imports, builds = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=REPO_ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        imports.append(timings["import"])
+        builds.append(timings["build"])
+    return {
+        "startup.import_ms": metrics.percentile(imports, 50) * 1000,
+        "startup.build_app_ms": metrics.percentile(builds, 50) * 1000,
+    }
+
+
+def bench_ingestion(workdir: str, copies: int = 10) -> Dict[str, float]:
+    """Runs the real PDF pipeline over `copies` copies of the sample PDF and reports throughput."""
+    from pypdf import PdfReader
+
+    from src import pdf_processor
+
+    pdf_dir = os.path.join(workdir, "pdfs")
+    os.makedirs(pdf_dir, exist_ok=True)
+    for i in range(copies):
+        shutil.copy(SAMPLE_PDF, os.path.join(pdf_dir, f"copy_{i}.pdf"))
+    pages = copies * len(PdfReader(SAMPLE_PDF).pages)
+
+    start = time.perf_counter()
+    stats = pdf_processor.process_and_store_pdfs(pdf_dir, force=True)
+    elapsed = time.perf_counter() - start
+    return {
+        "ingest.pages_per_s": pages / elapsed,
+        "ingest.chunks_per_s": stats["added"] / elapsed,
+    }
+
+
+def load_synthetic_chunks(client: QdrantClient, collection_name: str, count: int, dimension: int,
+                          batch_size: int = 10000, seed: int = 0):
+    """Fills a collection with `count` random unit vectors, one batch at a time to bound memory."""
+    rng = np.random.default_rng(seed)
+    client.create_collection(collection_name=collection_name, **vector_db.collection_settings("default", dimension))
+    for offset in range(0, count, batch_size):
+        size = min(batch_size, count - offset)
+        vectors = normalize_rows(rng.standard_normal((size, dimension)).astype(np.float32))
+        client.upsert(collection_name=collection_name, wait=True, points=models.Batch(
+            ids=list(range(offset, offset + size)),
+            vectors=vectors.tolist(),
+            payloads=[{"page_content": f"chunk {i}"} for i in range(offset, offset + size)],
+        ))
+
+
+def bench_queries(size: int, queries: int = 100, dimension: int = None, backend: str = "qdrant") -> Dict[str, float]:
+    """
+    Measures single and batched search latency and the memory held by a collection of `size` chunks,
+    on the in-memory Qdrant client or the memory-mapped store ('mmap'). For the mmap store it
+    also times opening the store from disk in a new instance and answering a first query.
+    """
+    dimension = dimension or config.EMBEDDING_MODEL_DIMENSION
+    with tempfile.TemporaryDirectory() as store_dir:
+        client = QdrantClient(":memory:") if backend == "qdrant" else MmapVectorStore(store_dir)
+        collection_name = f"benchmark_{size}"
+        gc.collect()  # so memory freed by earlier benchmarks does not offset this one
+        rss_before = rss_bytes()
+        load_synthetic_chunks(client, collection_name, size, dimension)
+        memory = max(0, rss_bytes() - rss_before)
+
+        rng = np.random.default_rng(1)
+        query_vectors = normalize_rows(rng.standard_normal((queries, dimension)).astype(np.float32)).tolist()
+        latencies = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            client.query_points(collection_name=collection_name, query=vector, limit=3)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        vector_db.search_batch(client, query_vectors, top_k=3, collection_name=collection_name)
+        batch_elapsed = time.perf_counter() - start
+        client.close()
+
+        prefix = f"query.{size}" if backend == "qdrant" else f"query.{backend}.{size}"
+        results = {
+            f"{prefix}.p50_ms": metrics.percentile(latencies, 50) * 1000,
+            f"{prefix}.p95_ms": metrics.percentile(latencies, 95) * 1000,
+            f"{prefix}.p99_ms": metrics.percentile(latencies, 99) * 1000,
+            f"{prefix}.qps": queries / sum(latencies),
+            f"{prefix}.batch_qps": queries / batch_elapsed,
+            f"{prefix}.memory_mb": memory / 2**20,
+        }
+        if backend == "mmap":
+            start = time.perf_counter()
+            reopened = MmapVectorStore(store_dir)
+            reopened.query_points(collection_name=collection_name, query=query_vectors[0], limit=3)
+            results[f"{prefix}.open_ms"] = (time.perf_counter() - start) * 1000
+            reopened.close()
+    return results
+
+
+def bench_graph(runs: int = 50) -> Dict[str, float]:
+    """
+    Runs the compiled graph with instant fakes and reports per-node latency and the time the
+    graph spends outside the nodes (scheduling, state merging, edges).
+    """
+    from src import agent
+
+    # Compilation is part of the cold start benchmark, not of each run
+    agent.build_app()
+    agent.build_async_app()
+    metrics.reset()
+    totals = []
+    for i in range(runs):
+        start = time.perf_counter()
+        agent.app.invoke({"question": QUESTIONS[i % len(QUESTIONS)]})
+        totals.append(time.perf_counter() - start)
+
+    results = {"graph.total.p50_ms": metrics.percentile(totals, 50) * 1000,
+               "graph.total.p95_ms": metrics.percentile(totals, 95) * 1000}
+    node_time = 0.0
+    for node in ("decider", "weather_node", "rag_node", "llm_processor_node"):
+        summary = metrics.summary("node_seconds", node=node)
+        if summary["count"]:
+            results[f"graph.{node}.p50_ms"] = summary["p50"] * 1000
+            node_time += summary["mean"] * summary["count"]
+    results["graph.overhead_per_run_ms"] = (sum(totals) - node_time) / runs * 1000
+
+    start = time.perf_counter()
+    asyncio.run(agent.abatch(QUESTIONS * 5))
+    results["graph.async_batch.qps"] = len(QUESTIONS) * 5 / (time.perf_counter() - start)
+    return results
+
+
+class DelayedEmbeddings(FakeEmbeddings):
+    """Fake embeddings with a fixed delay per call, standing in for the remote endpoint's round trip."""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.delay)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.delay)
+        return super().embed_query(text)
+
+
+def bench_speculation(runs: int = 20, decider_ms: float = 40.0, embedding_ms: float = 20.0) -> Dict[str, float]:
+    """
+    Compares the sequential graph with speculative execution on questions the rules cannot route,
+    with a simulated decider LLM and embedding round trip. Reports both latencies and the
+    saved and wasted time recorded by the speculative runs.
+    """
+    from src import agent
+
+    def slow_decider(inputs):
+        time.sleep(decider_ms / 1000)
+        return "rag"
+
+    registry.override("decider_chain", RunnableLambda(slow_decider))
+    registry.override("embeddings_model", DelayedEmbeddings(embedding_ms / 1000))
+    graphs = {
+        "sequential": agent.build_workflow(agent.decider_node, agent.weather_node, agent.rag_node,
+                                           agent.llm_processor_node).compile(),
+        "speculative": agent.build_speculative_workflow(agent.speculative_node, agent.llm_processor_node).compile(),
+    }
+    questions = ["anything new on springfield", "what happened in 2021", "summarize it", "more details please"]
+
+    results = {}
+    metrics.reset()
+    for name, graph in graphs.items():
+        totals = []
+        for i in range(runs):
+            start = time.perf_counter()
+            graph.invoke({"question": questions[i % len(questions)]})
+            totals.append(time.perf_counter() - start)
+        results[f"speculation.{name}.p50_ms"] = metrics.percentile(totals, 50) * 1000
+    report = agent.speculation_report()
+    results["speculation.saved_ms_mean"] = report["saved_ms_mean"]
+    results["speculation.wasted_ms_mean"] = report["wasted_ms_mean"]
+    return results
+
+
+def run_suite(sizes: List[int], ingest_copies: int = 10, queries: int = 100, graph_runs: int = 50,
+              startup_runs: int = 5) -> Dict[str, float]:
+    """Runs every benchmark and returns a flat {metric: value} dict."""
+    print("--- Benchmark: cold start ---")
+    results = bench_startup(startup_runs)
+    with tempfile.TemporaryDirectory() as workdir, offline_environment(workdir):
+        print("--- Benchmark: ingestion ---")
+        results.update(bench_ingestion(workdir, ingest_copies))
+        print("--- Benchmark: agent graph ---")
+        results.update(bench_graph(graph_runs))
+        print("--- Benchmark: speculative execution ---")
+        results.update(bench_speculation(max(4, graph_runs // 2)))
+    for size in sizes:
+        print(f"--- Benchmark: queries over {size} chunks (in-memory Qdrant and mmap store) ---")
+        results.update(bench_queries(size, queries))
+        results.update(bench_queries(size, queries, backend="mmap"))
+    return results
+
+
+# --- Baseline Comparison ---
+
+def median_results(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """Combines repeated runs of the suite into the median of each metric."""
+    names = sorted(set().union(*runs))
+    return {name: statistics.median(run[name] for run in runs if name in run) for name in names}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float = 0.25) -> List[str]:
+    """
+    Returns a description of every metric that is more than `tolerance` (relative) worse than
+    its baseline. Metrics missing from either side, and tail metrics (`UNGATED`), are ignored.
+    """
+    regressions = []
+    for name, value in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or base == 0 or name.endswith(UNGATED):
+            continue
+        higher_is_better = name.endswith(HIGHER_IS_BETTER)
+        change = (value - base) / abs(base)
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{name}: {value:.4g} vs baseline {base:.4g} ({change:+.0%})")
+    return regressions
+
+
+def format_results(results: Dict[str, float], baseline: Dict[str, float]) -> str:
+    lines = [f"{'metric':<40} {'value':>12} {'baseline':>12}"]
+    for name, value in sorted(results.items()):
+        base = baseline.get(name)
+        base_text = f"{base:.4g}" if base is not None else "-"
+        lines.append(f"{name:<40} {value:>12.4g} {base_text:>12}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000], help="Chunk counts for query benchmarks")
+    parser.add_argument("--ingest-copies", type=int, default=10, help="Copies of the sample PDF to ingest")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--graph-runs", type=int, default=50)
+    parser.add_argument("--startup-runs", type=int, default=5, help="Fresh processes timed for the cold start")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of the suite; each metric is their median")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before failing")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(max(1, args.repeat)):
+        print(f"=== Run {i + 1} of {max(1, args.repeat)} ===")
+        runs.append(run_suite(args.sizes, args.ingest_copies, args.queries, args.graph_runs, args.startup_runs))
+    results = median_results(runs)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_results(results, baseline))
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({name: round(value, 4) for name, value in sorted(results.items())}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
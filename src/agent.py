@@ -1,15 +1,63 @@
-from typing import TypedDict, Annotated
-from langgraph.graph import StateGraph, END
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, TypedDict, Annotated, AsyncIterator, Dict, Iterator, List, Optional
 
-from src import llm_utils
-from src import tool as tools
+from src import config
+from src import metrics
+from src import registry
 
+# LangGraph, LangChain, Qdrant and the model clients take seconds to import, so they are
+# imported where they are first needed: importing this module only defines functions,
+# and the graph is compiled by `build_app()` on first use.
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
+
+def _merge_timings(left: Optional[Dict[str, float]], right: Optional[Dict[str, float]]) -> Dict[str, float]:
+    return {**(left or {}), **(right or {})}
 
 # Define the state for our graph
 class AgentState(TypedDict):
     question: str
     context: str
     answer: str
+    route: str
+    # The retrieved chunks (best first) and the milliseconds each stage took, for evaluation
+    documents: list
+    timings: Annotated[Dict[str, float], _merge_timings]
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+def _fetch_context(route: str, question: str) -> dict:
+    """Runs the tool of a route and returns the state update with its context, chunks and timings."""
+    from src import tool as tools
+
+    start = time.perf_counter()
+    if route == "weather":
+        # For simplicity, we assume the question itself contains the city name
+        context = tools.get_weather_info.invoke(question)
+        return {"context": context, "timings": {"weather": _elapsed_ms(start)}}
+    documents = tools.retrieve_documents(question)
+    retrieved = time.perf_counter()
+    context = tools.format_context(documents)
+    return {"context": context, "documents": documents,
+            "timings": {"retrieval": (retrieved - start) * 1000, "context": _elapsed_ms(retrieved)}}
+
+async def _afetch_context(route: str, question: str) -> dict:
+    """Async version of `_fetch_context`."""
+    from src import tool as tools
+
+    start = time.perf_counter()
+    if route == "weather":
+        context = await tools.aget_weather_info(question)
+        return {"context": context, "timings": {"weather": _elapsed_ms(start)}}
+    documents = await tools.aretrieve_documents(question)
+    retrieved = time.perf_counter()
+    context = tools.format_context(documents)
+    return {"context": context, "documents": documents,
+            "timings": {"retrieval": (retrieved - start) * 1000, "context": _elapsed_ms(retrieved)}}
 
 # --- Node Functions ---
 
@@ -18,41 +66,208 @@ def decider_node(state: AgentState):
     Determines the next step based on the user's question.
     This node populates the 'context' field with the classification.
     """
+    from src import router
+
     print("--- Node: Decider ---")
     question = state["question"]
-    decider_chain = llm_utils.get_decider_chain()
-    # The result of this chain will be 'weather' or 'rag'
-    result = decider_chain.invoke({"question": question})
-    print(f"Decision: '{result}'")
-    
+    start = time.perf_counter()
+    # Local rules answer most questions; the LLM decider is only called when they are unsure.
+    # The result will be 'weather' or 'rag'
+    decision = router.route(question)
+    print(f"Decision: '{decision.route}'")
+
     # We store the decision to be used in the conditional edge
-    return {"context": result}
+    return {"context": decision.route, "route": decision.route, "timings": {"route": _elapsed_ms(start)}}
 
 def weather_node(state: AgentState):
     """Calls the weather tool with the user's question."""
     print("--- Node: Weather Tool ---")
-    question = state["question"]
-    # For simplicity, we assume the question itself contains the city name
-    weather_data = tools.get_weather_info.invoke(question)
-    return {"context": weather_data}
+    return _fetch_context("weather", state["question"])
 
 def rag_node(state: AgentState):
-    """Calls the RAG tool with the user's question."""
+    """Retrieves the chunks for the user's question and assembles them into the context."""
     print("--- Node: RAG Tool ---")
-    question = state["question"]
-    rag_context = tools.retrieve_pdf_context.invoke(question)
-    return {"context": rag_context}
+    return _fetch_context("rag", state["question"])
 
 def llm_processor_node(state: AgentState):
     """Generates the final answer using the LLM."""
+    from src import llm_utils
+
     print("--- Node: LLM Processor ---")
     context = state["context"]
     question = state["question"]
-    
+
+    processing_chain = llm_utils.get_processing_chain()
+    start = time.perf_counter()
+    with metrics.timer("llm_seconds", chain="processor"):
+        final_answer = processing_chain.invoke({"context": context, "question": question})
+    llm_utils.count_tokens("processor", context + question, final_answer)
+
+    return {"answer": final_answer, "timings": {"generation": _elapsed_ms(start)}}
+
+# --- Async Node Functions ---
+# Same behaviour as above, but awaiting the async clients so a single event loop
+# can serve many conversations without holding a thread per request.
+
+async def adecider_node(state: AgentState):
+    """Async version of `decider_node`."""
+    from src import router
+
+    print("--- Node: Decider ---")
+    start = time.perf_counter()
+    decision = await router.aroute(state["question"])
+    print(f"Decision: '{decision.route}'")
+    return {"context": decision.route, "route": decision.route, "timings": {"route": _elapsed_ms(start)}}
+
+async def aweather_node(state: AgentState):
+    """Async version of `weather_node`."""
+    print("--- Node: Weather Tool ---")
+    return await _afetch_context("weather", state["question"])
+
+async def arag_node(state: AgentState):
+    """Async version of `rag_node`."""
+    print("--- Node: RAG Tool ---")
+    return await _afetch_context("rag", state["question"])
+
+async def allm_processor_node(state: AgentState):
+    """Async version of `llm_processor_node`."""
+    from src import llm_utils
+
+    print("--- Node: LLM Processor ---")
     processing_chain = llm_utils.get_processing_chain()
-    final_answer = processing_chain.invoke({"context": context, "question": question})
-    
-    return {"answer": final_answer}
+    start = time.perf_counter()
+    with metrics.timer("llm_seconds", chain="processor"):
+        final_answer = await processing_chain.ainvoke({"context": state["context"], "question": state["question"]})
+    llm_utils.count_tokens("processor", state["context"] + state["question"], final_answer)
+    return {"answer": final_answer, "timings": {"generation": _elapsed_ms(start)}}
+
+# --- Speculative Execution ---
+# The decider LLM sits on the critical path before any tool runs. When the routing rules are
+# unsure, speculative mode starts both tools while the decider runs, keeps the branch it picks
+# and cancels (or, if already running, discards) the other.
+
+def _other_route(route: str) -> str:
+    return "rag" if route == "weather" else "weather"
+
+def _timed_tool(route: str, question: str):
+    start = time.perf_counter()
+    return _fetch_context(route, question), time.perf_counter() - start
+
+def _with_route(update: dict, route: str, route_ms: float) -> dict:
+    """Adds the routing decision and its time to the winning branch's state update."""
+    return {**update, "route": route, "timings": {**update["timings"], "route": route_ms}}
+
+def _record_speculation(decider_s: float, winner_s: float, total_s: float, cancelled: bool):
+    """
+    Records what speculation bought: the sequential path would have taken decider + winning tool,
+    so the saving is that minus the actual time. Time spent on the losing branch is recorded
+    separately as 'speculation_wasted_seconds'.
+    """
+    metrics.increment("speculation_runs_total")
+    metrics.observe("speculation_saved_seconds", max(0.0, decider_s + winner_s - total_s))
+    if cancelled:
+        metrics.increment("speculation_cancelled_total")
+
+def _record_discarded(future: Future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    metrics.observe("speculation_wasted_seconds", future.result()[1])
+
+def get_speculation_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide thread pool running speculative branches of the sync graph."""
+    return registry.get_or_create(
+        "speculation_executor",
+        lambda: ThreadPoolExecutor(max_workers=config.SPECULATIVE_WORKERS, thread_name_prefix="speculation"),
+        close=lambda executor: executor.shutdown(wait=True, cancel_futures=True)
+    )
+
+def speculative_node(state: AgentState):
+    """Routes the question and fetches its context, running both tools alongside a slow decider."""
+    from src import router
+
+    print("--- Node: Speculative Decider ---")
+    question = state["question"]
+    if not router.needs_decider(question):
+        # The rules decide in microseconds; there is nothing to overlap
+        start = time.perf_counter()
+        decision = router.route(question)
+        return _with_route(_fetch_context(decision.route, question), decision.route, _elapsed_ms(start))
+
+    start = time.perf_counter()
+    executor = get_speculation_executor()
+    branches = {route: executor.submit(_timed_tool, route, question) for route in ("weather", "rag")}
+    try:
+        decision = router.route(question)
+    except Exception:
+        for future in branches.values():
+            future.cancel()
+        raise
+    decider_s = time.perf_counter() - start
+    print(f"Decision: '{decision.route}'")
+
+    loser = branches[_other_route(decision.route)]
+    cancelled = loser.cancel()
+    if not cancelled:
+        # Already running: let it finish in the background and count its time as wasted
+        loser.add_done_callback(_record_discarded)
+    update, winner_s = branches[decision.route].result()
+    _record_speculation(decider_s, winner_s, time.perf_counter() - start, cancelled)
+    return _with_route(update, decision.route, decider_s * 1000)
+
+async def aspeculative_node(state: AgentState):
+    """Async version of `speculative_node`; the losing branch's task is cancelled."""
+    from src import router
+
+    print("--- Node: Speculative Decider ---")
+    question = state["question"]
+    if not router.needs_decider(question):
+        start = time.perf_counter()
+        decision = await router.aroute(question)
+        return _with_route(await _afetch_context(decision.route, question), decision.route, _elapsed_ms(start))
+
+    durations: Dict[str, float] = {}
+
+    async def branch(route: str) -> dict:
+        branch_start = time.perf_counter()
+        try:
+            return await _afetch_context(route, question)
+        finally:
+            durations[route] = time.perf_counter() - branch_start
+
+    start = time.perf_counter()
+    branches = {route: asyncio.create_task(branch(route)) for route in ("weather", "rag")}
+    try:
+        decision = await router.aroute(question)
+    except BaseException:
+        for task in branches.values():
+            task.cancel()
+        await asyncio.gather(*branches.values(), return_exceptions=True)
+        raise
+    decider_s = time.perf_counter() - start
+    print(f"Decision: '{decision.route}'")
+
+    loser_route = _other_route(decision.route)
+    cancelled = branches[loser_route].cancel()
+    update = await branches[decision.route]
+    await asyncio.gather(branches[loser_route], return_exceptions=True)
+    _record_speculation(decider_s, durations[decision.route], time.perf_counter() - start, cancelled)
+    if loser_route in durations:
+        # Up to the cancellation, or the whole branch if it finished first
+        metrics.observe("speculation_wasted_seconds", durations[loser_route])
+    return _with_route(update, decision.route, decider_s * 1000)
+
+def speculation_report() -> Dict[str, float]:
+    """Summarizes speculative runs: latency saved on the critical path and work spent on discarded branches."""
+    saved = metrics.summary("speculation_saved_seconds")
+    wasted = metrics.summary("speculation_wasted_seconds")
+    return {
+        "runs": metrics.counter("speculation_runs_total"),
+        "cancelled": metrics.counter("speculation_cancelled_total"),
+        "saved_ms_mean": saved["mean"] * 1000,
+        "saved_ms_p95": saved["p95"] * 1000,
+        "wasted_ms_mean": wasted["mean"] * 1000,
+        "wasted_ms_total": wasted["mean"] * wasted["count"] * 1000,
+    }
 
 # --- Conditional Edge Logic ---
 
@@ -69,36 +284,218 @@ def decide_next_node(state: AgentState) -> str:
 
 # --- Graph Definition and Compilation ---
 
-# Create a new graph
-workflow = StateGraph(AgentState)
-
-# Add the nodes
-workflow.add_node("decider", decider_node)
-workflow.add_node("weather_node", weather_node)
-workflow.add_node("rag_node", rag_node)
-workflow.add_node("llm_processor_node", llm_processor_node)
-
-# Set the entry point
-workflow.set_entry_point("decider")
-
-# Add the conditional edge from the decider
-workflow.add_conditional_edges(
-    "decider",
-    decide_next_node,
-    {
-        "weather_node": "weather_node",
-        "rag_node": "rag_node"
-    }
-)
+def build_workflow(decider, weather, rag, llm_processor) -> "StateGraph":
+    """Wires the given node functions into the agent graph, timing each node into 'node_seconds'."""
+    from langgraph.graph import StateGraph, END
+
+    # Create a new graph
+    workflow = StateGraph(AgentState)
+
+    # Add the nodes
+    workflow.add_node("decider", metrics.timed("node_seconds", node="decider")(decider))
+    workflow.add_node("weather_node", metrics.timed("node_seconds", node="weather_node")(weather))
+    workflow.add_node("rag_node", metrics.timed("node_seconds", node="rag_node")(rag))
+    workflow.add_node("llm_processor_node", metrics.timed("node_seconds", node="llm_processor_node")(llm_processor))
+
+    # Set the entry point
+    workflow.set_entry_point("decider")
+
+    # Add the conditional edge from the decider
+    workflow.add_conditional_edges(
+        "decider",
+        decide_next_node,
+        {
+            "weather_node": "weather_node",
+            "rag_node": "rag_node"
+        }
+    )
+
+    # Add the edges from the tool nodes to the final processor node
+    workflow.add_edge("weather_node", "llm_processor_node")
+    workflow.add_edge("rag_node", "llm_processor_node")
+
+    # The final node connects to the END
+    workflow.add_edge("llm_processor_node", END)
+    return workflow
+
+def build_speculative_workflow(speculate, llm_processor) -> "StateGraph":
+    """The speculative graph: one node routes and fetches the context, then the processor answers."""
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("speculative_decider", metrics.timed("node_seconds", node="speculative_decider")(speculate))
+    workflow.add_node("llm_processor_node", metrics.timed("node_seconds", node="llm_processor_node")(llm_processor))
+    workflow.set_entry_point("speculative_decider")
+    workflow.add_edge("speculative_decider", "llm_processor_node")
+    workflow.add_edge("llm_processor_node", END)
+    return workflow
+
+def _compile(workflow):
+    # Tracing settings must be in the environment before LangChain runs anything
+    config.configure_tracing()
+    compiled = workflow.compile()
+    print("LangGraph agent compiled successfully!")
+    return compiled
+
+def build_app():
+    """Returns the compiled agent graph (speculative if enabled), compiling it on first use."""
+    def build():
+        if config.SPECULATIVE_EXECUTION_ENABLED:
+            return _compile(build_speculative_workflow(speculative_node, llm_processor_node))
+        return _compile(build_workflow(decider_node, weather_node, rag_node, llm_processor_node))
+
+    return registry.get_or_create("agent_app", build)
+
+def build_async_app():
+    """Returns the compiled graph with async nodes, compiling it on first use."""
+    def build():
+        if config.SPECULATIVE_EXECUTION_ENABLED:
+            return _compile(build_speculative_workflow(aspeculative_node, allm_processor_node))
+        return _compile(build_workflow(adecider_node, aweather_node, arag_node, allm_processor_node))
+
+    return registry.get_or_create("async_agent_app", build)
+
+def __getattr__(name: str):
+    # `agent.app` and `agent.async_app` still work, but only compile the graph when accessed
+    if name == "app":
+        return build_app()
+    if name == "async_app":
+        return build_async_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Entry Points ---
+# These check the semantic answer cache first; a hit skips the graph entirely.
+
+def _cached_state(question: str, hit: dict) -> dict:
+    print(f"--- Answer cache hit (similarity {hit['score']:.3f} to '{hit['question']}') ---")
+    return {"question": question, "answer": hit["answer"], "route": hit["route"], "cached": True}
 
-# Add the edges from the tool nodes to the final processor node
-workflow.add_edge("weather_node", "llm_processor_node")
-workflow.add_edge("rag_node", "llm_processor_node")
+def ask(question: str) -> dict:
+    """Answers one question, from the answer cache when possible, otherwise by running the graph."""
+    from src import answer_cache
+
+    hit = answer_cache.lookup(question)
+    if hit:
+        return _cached_state(question, hit)
+    final_state = build_app().invoke({"question": question})
+    answer_cache.store_final_state(question, final_state)
+    return final_state
+
+async def ainvoke(question: str) -> dict:
+    """Runs the agent on one question without blocking the event loop."""
+    from src import answer_cache
+
+    hit = await answer_cache.alookup(question)
+    if hit:
+        return _cached_state(question, hit)
+    final_state = await build_async_app().ainvoke({"question": question})
+    await asyncio.to_thread(answer_cache.store_final_state, question, final_state)
+    return final_state
+
+async def abatch(questions: List[str], max_concurrency: int = None) -> List[dict]:
+    """
+    Runs the agent on many questions concurrently on one event loop.
+
+    Args:
+        questions (List[str]): The user questions.
+        max_concurrency (int, optional): Upper bound on conversations in flight at once.
+
+    Returns:
+        List[dict]: The final state of each run, in input order.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or len(questions) or 1)
+
+    async def run(question: str) -> dict:
+        async with semaphore:
+            return await ainvoke(question)
+
+    return await asyncio.gather(*(run(q) for q in questions))
+
+# --- Streaming Entry Points ---
+
+# The node whose LLM tokens make up the final answer
+ANSWER_NODE = "llm_processor_node"
+
+def _answer_token(mode: str, chunk) -> str:
+    """Returns the text of an answer token from a graph stream event, or '' for anything else."""
+    if mode != "messages":
+        return ""
+    message, stream_metadata = chunk
+    if stream_metadata.get("langgraph_node") != ANSWER_NODE:
+        return ""
+    return message.content if isinstance(message.content, str) else ""
+
+class _AnswerStream:
+    """Timing and final-state bookkeeping shared by `stream_answer` and `astream_answer`."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.final_state: dict = {}
+
+    def token(self, text: str) -> str:
+        """Passes a token through, recording time-to-first-token on the first one."""
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            metrics.observe("answer_ttft_seconds", self.first_token_at - self.start)
+        return text
+
+    def feed(self, mode: str, chunk) -> str:
+        """Takes one graph stream event and returns the answer token in it, or ''."""
+        if mode == "values":
+            self.final_state = chunk
+            return ""
+        token = _answer_token(mode, chunk)
+        return self.token(token) if token else ""
+
+    def remainder(self) -> str:
+        """The whole answer when nothing was streamed, e.g. from a processor that is a plain function."""
+        answer = self.final_state.get("answer") if self.first_token_at is None else None
+        return self.token(answer) if answer else ""
+
+    def finish(self):
+        metrics.observe("answer_total_seconds", time.perf_counter() - self.start)
+
+def stream_answer(question: str) -> Iterator[str]:
+    """
+    Runs the agent and yields the final answer token by token as the processor LLM generates it.
+    Time-to-first-token and total time are recorded as the 'answer_ttft_seconds' and
+    'answer_total_seconds' metrics.
+    """
+    from src import answer_cache
 
-# The final node connects to the END
-workflow.add_edge("llm_processor_node", END)
+    stream = _AnswerStream()
+    hit = answer_cache.lookup(question)
+    if hit:
+        yield stream.token(_cached_state(question, hit)["answer"])
+        stream.finish()
+        return
+    for mode, chunk in build_app().stream({"question": question}, stream_mode=["messages", "values"]):
+        token = stream.feed(mode, chunk)
+        if token:
+            yield token
+    remainder = stream.remainder()
+    if remainder:
+        yield remainder
+    stream.finish()
+    answer_cache.store_final_state(question, stream.final_state)
 
-# Compile the graph into a runnable app
-app = workflow.compile()
+async def astream_answer(question: str) -> AsyncIterator[str]:
+    """Async version of `stream_answer`, running on the async graph."""
+    from src import answer_cache
 
-print("LangGraph agent compiled successfully!")
\ No newline at end of file
+    stream = _AnswerStream()
+    hit = await answer_cache.alookup(question)
+    if hit:
+        yield stream.token(_cached_state(question, hit)["answer"])
+        stream.finish()
+        return
+    async for mode, chunk in build_async_app().astream({"question": question}, stream_mode=["messages", "values"]):
+        token = stream.feed(mode, chunk)
+        if token:
+            yield token
+    remainder = stream.remainder()
+    if remainder:
+        yield remainder
+    stream.finish()
+    await asyncio.to_thread(answer_cache.store_final_state, question, stream.final_state)
@@ -0,0 +1,188 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from qdrant_client import QdrantClient, models
+
+from src import config
+from src import embeddings
+from src import metrics
+from src import registry
+from src import vector_db
+from src.batching import MicroBatcher
+from src.embedding_cache import normalize_text
+from src.weather_cache import normalize_city
+
+# Namespace for answer cache point IDs: one point per normalized question
+ANSWER_ID_NAMESPACE = uuid.UUID("2b7e1a90-4c5d-5f3e-8a6b-9d0c1e2f3a4b")
+
+# Hits fetched per lookup, so an expired best match does not hide a fresh one behind it
+SEARCH_CANDIDATES = 4
+
+# Tool outputs that mean the answer should not be reused
+UNCACHEABLE_CONTEXT_PREFIXES = (
+    "An error occurred",
+    "No relevant information found",
+)
+
+
+def _ttl_for(route: str) -> float:
+    """Weather answers go out of date quickly; answers from the document last much longer."""
+    if route == "weather":
+        return config.ANSWER_CACHE_WEATHER_TTL_SECONDS
+    return config.ANSWER_CACHE_RAG_TTL_SECONDS
+
+
+def _create_collection() -> str:
+    vector_db.create_collection_if_not_exists(
+        vector_db.get_shared_client(), config.ANSWER_CACHE_COLLECTION_NAME, profile="default"
+    )
+    return config.ANSWER_CACHE_COLLECTION_NAME
+
+
+def get_client() -> QdrantClient:
+    """Returns the shared Qdrant client, creating the answer cache collection on first use."""
+    registry.get_or_create("answer_cache_collection", _create_collection)
+    return vector_db.get_shared_client()
+
+
+def _is_expired(payload: Dict) -> bool:
+    return time.time() - payload["created_at"] > _ttl_for(payload["route"])
+
+
+def _matches(question: str, payload: Dict) -> bool:
+    # Similar weather questions often differ only in the city; a forecast is only reused for its own city
+    return payload["route"] != "weather" or payload.get("city") == normalize_city(question)
+
+
+def _search_batch(client: QdrantClient, questions: List[str],
+                  query_embeddings: List[List[float]]) -> List[Optional[Dict]]:
+    """
+    Returns the best fresh hit for each question, or None. The TTL is checked here rather
+    than in the query because it depends on the current settings; expired entries that turn up
+    are deleted on the way. Weather answers must also be for the question's city.
+    """
+    with vector_db.serialized(client):
+        results = vector_db.search_batch(client, query_embeddings, top_k=SEARCH_CANDIDATES,
+                                         score_threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                                         collection_name=config.ANSWER_CACHE_COLLECTION_NAME)
+    found, expired = [], set()
+    for question, hits in zip(questions, results):
+        best = None
+        for hit in hits:
+            if _is_expired(hit.payload):
+                expired.add(hit.id)
+            elif best is None and _matches(question, hit.payload):
+                best = hit
+        found.append(_to_hit(best) if best else None)
+    if expired:
+        with vector_db.serialized(client):
+            client.delete(collection_name=config.ANSWER_CACHE_COLLECTION_NAME,
+                          points_selector=models.PointIdsList(points=sorted(expired)), wait=False)
+    return found
+
+
+def _to_hit(hit: vector_db.SearchHit) -> Dict:
+    payload = hit.payload
+    return {"answer": payload["answer"], "route": payload["route"], "question": payload["question"],
+            "score": hit.score}
+
+
+def lookup_batch(questions: List[str]) -> List[Optional[Dict]]:
+    """Embeds many questions in one call and looks all of them up in one Qdrant request."""
+    query_embeddings = embeddings.get_embeddings_model().embed_documents(questions)
+    return _search_batch(get_client(), questions, query_embeddings)
+
+
+def get_lookup_batcher() -> MicroBatcher:
+    """Returns the process-wide batcher that groups concurrent cache lookups."""
+    get_client()  # registered first, so it is closed after the batcher drains
+    return registry.get_or_create(
+        "answer_cache_batcher",
+        lambda: MicroBatcher(lookup_batch, config.MICRO_BATCH_MAX_SIZE, config.MICRO_BATCH_MAX_WAIT_MS,
+                             name="answer-cache-batcher"),
+        close=lambda batcher: batcher.close()
+    )
+
+
+def _count(hit: Optional[Dict]) -> Optional[Dict]:
+    metrics.increment("cache_requests_total", cache="answer", result="hit" if hit else "miss")
+    return hit
+
+
+def lookup(question: str) -> Optional[Dict]:
+    """
+    Returns a cached answer for the question or a paraphrase of it, or None on a miss.
+    A hit needs a cosine similarity of at least ANSWER_CACHE_SIMILARITY_THRESHOLD, an entry
+    younger than its route's TTL and, for a weather answer, the same city.
+    """
+    if not config.ANSWER_CACHE_ENABLED:
+        return None
+    # Concurrent requests share one embedding call and one search, like retrieval does
+    if config.MICRO_BATCH_ENABLED:
+        return _count(get_lookup_batcher()(question))
+    query_embedding = embeddings.get_embeddings_model().embed_query(question)
+    return _count(_search_batch(get_client(), [question], [query_embedding])[0])
+
+
+async def alookup(question: str) -> Optional[Dict]:
+    """Async version of `lookup`."""
+    if not config.ANSWER_CACHE_ENABLED:
+        return None
+    if config.MICRO_BATCH_ENABLED:
+        return _count(await asyncio.wrap_future(get_lookup_batcher().submit(question)))
+    query_embedding = await embeddings.get_embeddings_model().aembed_query(question)
+    [hit] = await asyncio.to_thread(_search_batch, get_client(), [question], [query_embedding])
+    return _count(hit)
+
+
+def is_cacheable(final_state: Dict) -> bool:
+    """Only successful answers are cached; tool errors and empty retrievals are not."""
+    context = final_state.get("context") or ""
+    return bool(final_state.get("answer")) and not context.startswith(UNCACHEABLE_CONTEXT_PREFIXES)
+
+
+def store(question: str, answer: str, route: str):
+    """Caches the answer to a question under its embedding."""
+    if not config.ANSWER_CACHE_ENABLED:
+        return
+    query_embedding = embeddings.get_embeddings_model().embed_query(question)
+    payload = {"question": question, "answer": answer, "route": route, "created_at": time.time()}
+    if route == "weather":
+        payload["city"] = normalize_city(question)
+    client = get_client()
+    with vector_db.serialized(client):
+        client.upsert(
+            collection_name=config.ANSWER_CACHE_COLLECTION_NAME,
+            points=[models.PointStruct(
+                id=str(uuid.uuid5(ANSWER_ID_NAMESPACE, normalize_text(question))),
+                vector=query_embedding,
+                payload=payload
+            )]
+        )
+
+
+def store_final_state(question: str, final_state: Dict):
+    """Caches a finished graph run if it produced a reusable answer."""
+    if is_cacheable(final_state):
+        store(question, final_state["answer"], final_state.get("route", "rag"))
+
+
+def invalidate(route: str = None):
+    """
+    Drops cached answers, either all of them or only those of one route.
+    Ingestion calls this with route='rag' whenever the document collection changes.
+    """
+    client = vector_db.get_shared_client()
+    if route is None:
+        selector = models.FilterSelector(filter=models.Filter())
+    else:
+        selector = models.FilterSelector(filter=models.Filter(
+            must=[models.FieldCondition(key="route", match=models.MatchValue(value=route))]
+        ))
+    with vector_db.serialized(client):
+        if not client.collection_exists(collection_name=config.ANSWER_CACHE_COLLECTION_NAME):
+            return
+        client.delete(collection_name=config.ANSWER_CACHE_COLLECTION_NAME, points_selector=selector, wait=True)
+    print(f"Invalidated cached answers ({route or 'all routes'}).")
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, List, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Groups items submitted concurrently from many threads into batched calls.
+
+    A background thread waits for the first item, then keeps collecting until the batch holds
+    `max_batch_size` items or `max_wait_ms` has passed, and calls `process` once for the whole
+    batch. `process` must return one result per item, in order.
+    """
+
+    def __init__(self, process: Callable[[List[T]], List[R]], max_batch_size: int = 16,
+                 max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = {"items": 0, "batches": 0, "largest_batch": 0}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: T) -> Future:
+        """
+        Queues an item and returns a future for its result.
+
+        Raises:
+            RuntimeError: If the batcher is closed.
+        """
+        future = Future()
+        # Checked and queued under the lock, so nothing is queued after `close` starts draining
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: T) -> R:
+        """Submits an item and blocks until its result is ready."""
+        return self.submit(item).result()
+
+    def _collect(self) -> List:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._closed and self._queue.empty()):
+            # Items whose caller cancelled while they were queued are dropped, not processed
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            self.stats["items"] += len(items)
+            self.stats["batches"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(items))
+            try:
+                results = self.process(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch of {len(items)} items returned {len(results)} results.")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.stats["items"] / self.stats["batches"] if self.stats["batches"] else 0.0
+
+    def close(self):
+        """Stops accepting items; those already queued are still processed."""
+        with self._lock:
+            self._closed = True
+        self._thread.join()
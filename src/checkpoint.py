@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Set
+
+from src import config
+from src import manifest
+
+
+def job_id(document_hashes: Dict[str, str], force: bool = False) -> str:
+    """
+    Identifies an ingestion job by its inputs: the documents with their content hashes and the
+    settings that shape the stored chunks. A checkpoint is only resumed by the same job.
+    """
+    key = {
+        "documents": sorted(document_hashes.items()),
+        "force": force,
+        "chunking": [config.CHUNK_SIZE, config.CHUNK_OVERLAP],
+        "embeddings": [config.EMBEDDING_BACKEND, config.EMBEDDING_MODEL_NAME],
+        "store": [config.VECTOR_STORE_BACKEND, config.QDRANT_COLLECTION_NAME],
+    }
+    return manifest.content_hash(json.dumps(key, sort_keys=True))[:16]
+
+
+class IngestCheckpoint:
+    """
+    An append-only JSON Lines log of an ingestion job, written as the job makes progress.
+
+    The first line names the job; every later line records one committed step:
+    - {"batch": n, "point_ids": [...]}: a batch of chunks that is now stored in the collection.
+    - {"document": path, "entry": {...}, "stale_ids": [...]}: a document whose chunks are all
+      stored, with the manifest entry to record for it and the points deleted from it.
+
+    Each line is flushed and synced before the job moves on, so after a crash the log holds
+    exactly the work that was committed. A torn last line is ignored when the log is read back.
+    """
+
+    def __init__(self, path: str, job: str):
+        self.path = path
+        self.job = job
+        self.batches = 0
+        self.committed: Set[str] = set()
+        self.documents: Dict[str, Dict] = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, job: str, path: str = None, resume: bool = True) -> "IngestCheckpoint":
+        """
+        Opens the checkpoint of a job, resuming an earlier run of the same job if one was interrupted.
+
+        Args:
+            job (str): The job ID from `job_id`.
+            path (str, optional): The log file. Defaults to `config.INGEST_CHECKPOINT_PATH`.
+            resume (bool): If False, any existing checkpoint is discarded and the job starts over.
+
+        Returns:
+            IngestCheckpoint: The checkpoint, holding the progress of the earlier run if resumed.
+        """
+        checkpoint = cls(path or config.INGEST_CHECKPOINT_PATH, job)
+        if resume and checkpoint._read():
+            checkpoint._file = open(checkpoint.path, "a", encoding="utf-8")
+        else:
+            os.makedirs(os.path.dirname(checkpoint.path) or ".", exist_ok=True)
+            checkpoint._file = open(checkpoint.path, "w", encoding="utf-8")
+            checkpoint._append({"job": job, "created_at": time.time()})
+        return checkpoint
+
+    def _read(self) -> bool:
+        """Loads an earlier run of this job from the log. Returns False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except json.JSONDecodeError:
+            header = {}
+        if header.get("job") != self.job:
+            if header:
+                print("Discarding the checkpoint of a different ingestion job.")
+            return False
+
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # the write in progress when the run stopped
+            if "batch" in record:
+                self.batches += 1
+                self.committed.update(record["point_ids"])
+            elif "document" in record:
+                self.documents[record["document"]] = record
+        return True
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.batches or self.documents)
+
+    def _append(self, record: Dict):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_batch(self, point_ids: List[str]):
+        """Records a batch of chunks as stored."""
+        with self._lock:
+            self.batches += 1
+            self.committed.update(point_ids)
+            self._append({"batch": self.batches, "point_ids": point_ids})
+
+    def record_document(self, path: str, entry: Dict, stale_ids: Iterable[str] = ()):
+        """Records a document as complete, with its manifest entry and the stale points it dropped."""
+        record = {"document": path, "entry": entry, "stale_ids": sorted(stale_ids)}
+        with self._lock:
+            self.documents[path] = record
+            self._append(record)
+
+    def is_complete(self, path: str) -> bool:
+        return path in self.documents
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """Closes and deletes the log once the job's results have been saved for good."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __str__(self) -> str:
+        return (f"Checkpoint: {self.batches} batches ({len(self.committed)} chunks) stored, "
+                f"{len(self.documents)} document(s) complete")
+
+
+def restore_documents(checkpoint: IngestCheckpoint, client, ingest_manifest: Dict, lexical_index) -> int:
+    """
+    Re-applies what an interrupted run had committed but not yet saved: the manifest entries of
+    completed documents, and the lexical index entries of stored chunks (read back from the
+    collection) minus the stale points that were deleted.
+
+    Returns:
+        int: The number of chunks restored into the lexical index.
+    """
+
+    for path, record in checkpoint.documents.items():
+        ingest_manifest["documents"][path] = record["entry"]
+        lexical_index.remove(record["stale_ids"])
+
+    missing = [point_id for point_id in sorted(checkpoint.committed) if point_id not in lexical_index]
+    for start in range(0, len(missing), 256):
+        records = client.retrieve(collection_name=config.QDRANT_COLLECTION_NAME,
+                                  ids=missing[start:start + 256], with_payload=True, with_vectors=False)
+        for record in records:
+            lexical_index.add(str(record.id), record.payload.get("page_content", ""))
+    return len(missing)
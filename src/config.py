@@ -11,10 +11,28 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 HUGGINGFACEHUB_API_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
-# Set LangSmith tracing environment variables
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
-os.environ["LANGCHAIN_PROJECT"] = "LangGraph RAG Weather Agent" # Optional: a name for your project in LangSmith
-os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
+# --- Tracing ---
+# LangSmith tracing is optional: it is on when a LangSmith key is set, unless LANGCHAIN_TRACING_V2=false.
+# Local metrics (src/metrics.py) work either way and need no network.
+LANGSMITH_TRACING = bool(LANGCHAIN_API_KEY) and os.getenv("LANGCHAIN_TRACING_V2", "true").lower() == "true"
+LANGSMITH_PROJECT = os.getenv("LANGCHAIN_PROJECT", "LangGraph RAG Weather Agent")
+
+
+def configure_tracing():
+    """
+    Exports the tracing settings to the environment variables LangChain reads.
+    Importing this module does not touch the environment; the agent calls this before compiling its graph.
+    """
+    os.environ["LANGCHAIN_TRACING_V2"] = "true" if LANGSMITH_TRACING else "false"
+    if LANGSMITH_TRACING:
+        os.environ["LANGCHAIN_PROJECT"] = LANGSMITH_PROJECT
+        os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
+
+
+# --- Local Metrics ---
+# Structured JSON events (one line per timed call) go to this file, or to 'stdout' / 'stderr'.
+# Unset disables the JSON log; Prometheus-style metrics are served by the HTTP server at /metrics.
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH")
 
 
 # --- LLM and Embedding Models ---
@@ -24,11 +42,160 @@ EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 # For "text-embedding-3-small", it's 1536.
 # For "text-embedding-3-large", it's 3072.
 EMBEDDING_MODEL_DIMENSION = 384
+# Where embeddings are computed: "remote" (Hugging Face endpoint), "local" (in-process on CPU,
+# needs sentence-transformers) or "fake" (deterministic hashing, for tests and benchmarks)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "remote")
+# Torch threads used by the local backend (0 keeps the library default)
+EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "0"))
+EMBEDDING_LOCAL_DEVICE = os.getenv("EMBEDDING_LOCAL_DEVICE", "cpu")
+
+# --- LLM Scheduler ---
+# Every LLM call goes through one scheduler that keeps the process under the provider's rate
+# limits (token buckets per minute; 0 disables a limit) and bounds the calls in flight
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "12000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Completion tokens per call; reserved from the token bucket up front, corrected by the actual usage
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "512"))
+# Keep-alive HTTP connections shared by all calls
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+# One HTTP attempt times out after REQUEST_TIMEOUT; the whole call, including waiting for the
+# rate limits and retries, gives up at the DEADLINE
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "10"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))
+# Retries of rate-limited, timed-out or failed (5xx) attempts, with exponential backoff and jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5"))
+# Sends a second copy of a call that has not answered after this long; the first answer wins (0 disables)
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+# Overrides the provider endpoint, e.g. for a local mock server
+GROQ_API_BASE = os.getenv("GROQ_API_BASE")
+
+# --- Embedding Cache ---
+# Two tiers: an in-memory LRU in front of a persistent SQLite store
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_MEMORY_ENTRIES", "10000"))
+EMBEDDING_CACHE_MAX_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_DISK_ENTRIES", "1000000"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# --- Ingestion ---
+# Number of chunks sent to the embedding endpoint per request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Maximum number of embedding requests running at the same time
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+# Retries per failed batch, with exponential backoff starting at the given delay
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+EMBEDDING_RETRY_BACKOFF_SECONDS = float(os.getenv("EMBEDDING_RETRY_BACKOFF_SECONDS", "1.0"))
+# Number of processes parsing PDFs in parallel
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Maximum number of embedded batches waiting to be upserted
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+# Records what has already been ingested, so re-runs only embed new or changed chunks
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "data/ingest_manifest.json")
+# Log of the running ingestion job, one line per stored batch; an interrupted run resumes from it
+INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", "data/ingest_checkpoint.jsonl")
+
+# --- Routing ---
+# The local classifier's answer is used when its confidence reaches this threshold;
+# otherwise the question falls through to the next tier and finally to the LLM decider
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.75"))
+# Adds a tier that compares the question's embedding with labeled prototype questions
+ROUTER_USE_PROTOTYPES = os.getenv("ROUTER_USE_PROTOTYPES", "false").lower() == "true"
+
+# --- Weather Cache ---
+# Reports are fresh for the TTL, then served stale for up to STALE seconds while refreshed
+WEATHER_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "600"))
+WEATHER_CACHE_STALE_SECONDS = float(os.getenv("WEATHER_CACHE_STALE_SECONDS", "1800"))
+
+# --- Semantic Answer Cache ---
+# Answers are cached in their own Qdrant collection, keyed by the question's embedding.
+# A paraphrase counts as a hit when its cosine similarity reaches the threshold.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_COLLECTION_NAME = "answer_cache"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+ANSWER_CACHE_WEATHER_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_WEATHER_TTL_SECONDS", "600"))
+ANSWER_CACHE_RAG_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_RAG_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# --- HTTP Server ---
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+# Requests answered at the same time, and how many more may wait before new ones get a 503
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "8"))
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "32"))
+# A request that takes longer than this gets a 504
+SERVER_REQUEST_TIMEOUT_SECONDS = float(os.getenv("SERVER_REQUEST_TIMEOUT_SECONDS", "30"))
+
+# --- Speculative Execution ---
+# When the routing rules are unsure, the weather lookup and the retrieval start while the decider
+# LLM runs; the branch it picks is kept and the other is cancelled or discarded.
+SPECULATIVE_EXECUTION_ENABLED = os.getenv("SPECULATIVE_EXECUTION_ENABLED", "false").lower() == "true"
+# Threads running speculative branches for the sync graph (two per question in flight)
+SPECULATIVE_WORKERS = int(os.getenv("SPECULATIVE_WORKERS", "16"))
+
+# --- Micro-Batching ---
+# Concurrent retrievals are grouped into one embedding call and one batched Qdrant search.
+# A batch is sent when it is full or when its first request has waited MAX_WAIT_MS.
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "true").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "16"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+
+# --- Hybrid Retrieval ---
+# Dense search is fused with a BM25 lexical index (built at ingestion) by reciprocal rank fusion,
+# so exact terms such as tool names, companies and years are not missed
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+# Candidates taken from each of the dense and lexical rankings before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+SPARSE_INDEX_PATH = os.getenv("SPARSE_INDEX_PATH", "data/sparse_index.json")
+
+# --- Context Assembly ---
+# Upper bound on the retrieved context passed to the processor LLM (estimated tokens).
+# Overlapping chunks are merged and passages this similar (word-shingle Jaccard) are dropped.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
 
 # --- Data ---
+# A single PDF, a directory of PDFs or a glob pattern such as "data/**/*.pdf"
 PDF_PATH = "data/sample.pdf"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
 
 # --- Vector Database (Qdrant) ---
-# Use a local, file-based Qdrant instance
+# Use a local, file-based Qdrant instance, or a Qdrant server when QDRANT_URL is set
 QDRANT_STORAGE_PATH = os.getenv("QDRANT_STORAGE_PATH", "data/qdrant_storage")
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# "qdrant" (local or server, as above) or "mmap": exact search over memory-mapped NumPy files
+# (src/mmap_store.py), which opens instantly and can be shared by several processes
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant")
+MMAP_STORE_PATH = os.getenv("MMAP_STORE_PATH", "data/mmap_store")
+# float16 halves the memory and disk used by vectors at a small cost in score precision
+MMAP_VECTOR_DTYPE = os.getenv("MMAP_VECTOR_DTYPE", "float32")
 QDRANT_COLLECTION_NAME = "pdf_document_collection"
+# Points per upsert call, and how many batches are written concurrently
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+QDRANT_UPSERT_PARALLEL = int(os.getenv("QDRANT_UPSERT_PARALLEL", "1"))
+
+# --- Collection Profiles ---
+# Storage and index settings for the document collection. Large corpora trade a little recall
+# for much less RAM with quantized vectors (the originals stay on disk and re-score the top
+# candidates) and tuned HNSW graphs. The local file-based mode always does exact search and
+# ignores these settings; they take effect on a Qdrant server (QDRANT_URL).
+#   quantization: None, "scalar" (int8, ~4x smaller) or "binary" (1 bit, ~32x smaller)
+#   oversampling: candidates fetched per requested hit before re-scoring with full vectors
+#   hnsw_m / hnsw_ef_construct: graph degree and build-time beam width; search_ef: query beam width
+#   on_disk: keep full vectors, the HNSW graph and payloads on disk instead of in RAM
+COLLECTION_PROFILES = {
+    "default": {},
+    "scalar": {"quantization": "scalar", "rescore": True, "oversampling": 2.0,
+               "hnsw_m": 16, "hnsw_ef_construct": 128, "search_ef": 128, "on_disk": True},
+    "binary": {"quantization": "binary", "rescore": True, "oversampling": 3.0,
+               "hnsw_m": 16, "hnsw_ef_construct": 128, "search_ef": 128, "on_disk": True},
+    "large": {"quantization": "scalar", "rescore": True, "oversampling": 1.5,
+              "hnsw_m": 32, "hnsw_ef_construct": 256, "search_ef": 256, "on_disk": True},
+}
+QDRANT_COLLECTION_PROFILE = os.getenv("QDRANT_COLLECTION_PROFILE", "default")
@@ -0,0 +1,135 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import List, Set
+
+from langchain_core.documents import Document
+
+from src import config
+from src import metrics
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+NO_CONTEXT_MESSAGE = "No relevant information found in the document for this question."
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximates the token count of English text for LLM tokenizers (about 4 characters per token)."""
+    return math.ceil(len(text) / 4)
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Returns the set of word n-grams of a text, used to spot near-duplicate passages."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+@dataclass
+class Passage:
+    """A span of one document, with the best (lowest) retrieval rank of the chunks it covers."""
+    text: str
+    rank: int
+    source: str = ""
+    start: int = -1
+    page: str = ""
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+
+def merge_adjacent(documents: List[Document], max_gap: int = 0) -> List[Passage]:
+    """
+    Merges chunks of the same document that overlap or touch into one passage.
+
+    Chunks are placed by their 'start_index' metadata, which is an offset within the chunk's
+    page (pages are split one at a time), so only chunks of the same page are merged. The
+    splitter's overlap (CHUNK_OVERLAP) means neighbouring chunks repeat text; the merged
+    passage contains it only once. Chunks without a position are kept as they are.
+    """
+    passages = [
+        Passage(doc.page_content, rank, str(doc.metadata.get("source", "")), doc.metadata.get("start_index", -1),
+                str(doc.metadata.get("page", "")))
+        for rank, doc in enumerate(documents)
+    ]
+    positioned = sorted((p for p in passages if p.start >= 0), key=lambda p: (p.source, p.page, p.start))
+    merged: List[Passage] = []
+    for passage in positioned:
+        last = merged[-1] if merged else None
+        if (last and (last.source, last.page) == (passage.source, passage.page)
+                and passage.start <= last.end + max_gap):
+            if passage.end > last.end:
+                joiner = " " if passage.start > last.end else ""
+                last.text = last.text + joiner + passage.text[max(0, last.end - passage.start):]
+            last.rank = min(last.rank, passage.rank)
+        else:
+            merged.append(Passage(passage.text, passage.rank, passage.source, passage.start, passage.page))
+    merged.extend(p for p in passages if p.start < 0)
+    return sorted(merged, key=lambda p: p.rank)
+
+
+def remove_near_duplicates(passages: List[Passage], threshold: float = None) -> List[Passage]:
+    """Drops passages whose word shingles overlap a better-ranked passage by at least `threshold`."""
+    threshold = config.CONTEXT_DEDUP_THRESHOLD if threshold is None else threshold
+    kept, kept_shingles = [], []
+    for passage in passages:
+        passage_shingles = shingles(passage.text)
+        if any(jaccard(passage_shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(passage_shingles)
+    return kept
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to roughly `max_tokens`, preferring a sentence end, else a word boundary."""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"))
+    if sentence_end > limit // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0] + " ..."
+
+
+def pack(passages: List[Passage], budget: int = None, min_tokens: int = 32) -> List[str]:
+    """
+    Takes passages in relevance order while they fit in the token budget. The first passage
+    that does not fit is truncated if at least `min_tokens` of budget are left.
+    """
+    budget = config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    separator_tokens = estimate_tokens(CONTEXT_SEPARATOR)
+    packed, used = [], 0
+    for passage in passages:
+        cost = estimate_tokens(passage.text) + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(passage.text)
+            used += cost
+            continue
+        remaining = budget - used - (separator_tokens if packed else 0)
+        if remaining >= min_tokens:
+            packed.append(truncate_to_tokens(passage.text, remaining))
+        break
+    return packed
+
+
+def build_context(documents: List[Document], budget: int = None) -> str:
+    """
+    Assembles the processor's context from retrieved chunks (best first): merges adjacent chunks,
+    removes near-duplicates and packs the most relevant passages into the token budget.
+    Records the 'context_tokens_raw' and 'context_tokens' metrics.
+    """
+    if not documents:
+        return NO_CONTEXT_MESSAGE
+    raw_tokens = estimate_tokens(CONTEXT_SEPARATOR.join(doc.page_content for doc in documents))
+    passages = remove_near_duplicates(merge_adjacent(documents))
+    context = CONTEXT_SEPARATOR.join(pack(passages, budget))
+    metrics.observe("context_tokens_raw", raw_tokens)
+    metrics.observe("context_tokens", estimate_tokens(context))
+    return context
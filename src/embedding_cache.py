@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src import config
+from src import metrics
+
+
+# Models whose tokenizer lowercases the input, so letter case never changes their vectors
+UNCASED_MODELS = {"all-minilm-l6-v2", "all-minilm-l12-v2", "paraphrase-minilm-l6-v2", "multi-qa-minilm-l6-cos-v1"}
+
+
+def normalize_text(text: str, lowercase: bool = True) -> str:
+    """
+    Normalizes text before it is used as a cache key, so trivially different inputs share an entry.
+    Case is only dropped when `lowercase` is set.
+    """
+    text = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+    return text.lower() if lowercase else text
+
+
+def is_uncased(model_name: str) -> bool:
+    """True if the model (optionally prefixed with its backend, e.g. 'remote:org/name') ignores case."""
+    name = model_name.rsplit(":", 1)[-1].rsplit("/", 1)[-1].lower()
+    return name in UNCASED_MODELS or "uncased" in name or name.startswith("fake-")
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """
+    Builds the cache key from the model name and the normalized text. The text is lowercased only
+    for uncased models; for any other model "Apple" and "apple" have different vectors.
+    """
+    text = normalize_text(text, lowercase=is_uncased(model_name))
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """A thread-safe in-memory LRU cache with a maximum size and a time-to-live."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            vector, created_at = entry
+            if time.time() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: List[float], created_at: float = None):
+        with self._lock:
+            self._entries[key] = (vector, created_at or time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """A persistent SQLite-backed store of float32 vectors with a maximum size and a time-to-live."""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, created_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON embeddings (created_at)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, tuple]:
+        """Returns {key: (vector, created_at)} for the keys that are stored and not expired."""
+        found = {}
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            # Stay well below SQLite's limit on the number of query parameters
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector, created_at FROM embeddings WHERE created_at >= ? "
+                    f"AND key IN ({','.join('?' * len(part))})",
+                    [cutoff, *part]
+                ).fetchall()
+                for key, blob, created_at in rows:
+                    found[key] = (array("f", blob).tolist(), created_at)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Deletes expired entries and the oldest entries beyond the size limit. Returns the count removed."""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY created_at LIMIT ?)",
+                    (count - self.max_entries,)
+                ).rowcount
+            self._conn.commit()
+            return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-memory LRU in front of an on-disk store.
+    Disk hits are promoted into memory. Hit and miss counters are kept per tier.
+    """
+
+    def __init__(self, path: str = None, max_memory_entries: int = None, max_disk_entries: int = None,
+                 ttl_seconds: float = None):
+        ttl_seconds = config.EMBEDDING_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.memory = MemoryCache(max_memory_entries or config.EMBEDDING_CACHE_MAX_MEMORY_ENTRIES, ttl_seconds)
+        self.disk = DiskCache(path or config.EMBEDDING_CACHE_PATH,
+                              max_disk_entries or config.EMBEDDING_CACHE_MAX_DISK_ENTRIES, ttl_seconds)
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+        self._writes_since_evict = 0
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Returns the cached vector for each key, or None where it is missing."""
+        results = [self.memory.get(key) for key in keys]
+        missing = [key for key, vector in zip(keys, results) if vector is None]
+        on_disk = self.disk.get_many(missing) if missing else {}
+        for i, key in enumerate(keys):
+            if results[i] is None and key in on_disk:
+                vector, created_at = on_disk[key]
+                self.memory.put(key, vector, created_at)
+                results[i] = vector
+
+        with self._stats_lock:
+            self.stats["memory_hits"] += len(keys) - len(missing)
+            self.stats["disk_hits"] += len(on_disk)
+            self.stats["misses"] += len(missing) - len(on_disk)
+        return results
+
+    def put_many(self, items: Dict[str, List[float]]):
+        for key, vector in items.items():
+            self.memory.put(key, vector)
+        self.disk.put_many(items)
+        # Size and TTL eviction on disk is amortized over writes
+        with self._stats_lock:
+            self._writes_since_evict += len(items)
+            should_evict = self._writes_since_evict >= 1000
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self.disk.evict()
+
+    @property
+    def hit_rate(self) -> float:
+        total = sum(self.stats.values())
+        return (self.stats["memory_hits"] + self.stats["disk_hits"]) / total if total else 0.0
+
+    def close(self):
+        self.disk.close()
+
+
+class CachedEmbeddings:
+    """
+    Wraps an embedding model so that repeated texts are served from the cache.
+    Exposes the same `embed_query` / `embed_documents` interface as the wrapped model.
+    """
+
+    def __init__(self, model, cache: EmbeddingCache, model_name: str = None):
+        self.model = model
+        self.cache = cache
+        self.model_name = model_name or config.EMBEDDING_MODEL_NAME
+
+    def _lookup(self, texts: List[str]):
+        """Returns the keys, the cached vectors (None where missing) and the distinct missing texts."""
+        keys = [cache_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        hits = sum(vector is not None for vector in vectors)
+        metrics.increment("cache_requests_total", hits, cache="embedding", result="hit")
+        metrics.increment("cache_requests_total", len(vectors) - hits, cache="embedding", result="miss")
+        # Embed each distinct missing text only once
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        return keys, vectors, missing
+
+    def _fill(self, keys: List[str], vectors: List, missing: Dict[str, str], new_vectors: List[List[float]]):
+        computed = dict(zip(missing.keys(), new_vectors))
+        self.cache.put_many(computed)
+        return [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        if not missing:
+            return vectors
+        return self._fill(keys, vectors, missing, self.model.embed_documents(list(missing.values())))
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, vectors, missing = self._lookup([text])
+        if not missing:
+            return vectors[0]
+        return self._fill(keys, vectors, missing, [self.model.embed_query(text)])[0]
+
+    # The async variants read and write the SQLite tier in a worker thread, off the event loop
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, texts)
+        if not missing:
+            return vectors
+        new_vectors = await self.model.aembed_documents(list(missing.values()))
+        return await asyncio.to_thread(self._fill, keys, vectors, missing, new_vectors)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, [text])
+        if not missing:
+            return vectors[0]
+        new_vectors = [await self.model.aembed_query(text)]
+        return (await asyncio.to_thread(self._fill, keys, vectors, missing, new_vectors))[0]
@@ -0,0 +1,188 @@
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src import config
+from src import metrics
+from src import registry
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class RemoteEmbeddings(Embeddings):
+    """Embeds text through the Hugging Face inference endpoint (one network round trip per call)."""
+
+    def __init__(self, model_name: str = None):
+        from langchain_huggingface import HuggingFaceEndpointEmbeddings
+
+        self.model_name = model_name or config.EMBEDDING_MODEL_NAME
+        self.client = HuggingFaceEndpointEmbeddings(
+            huggingfacehub_api_token=config.HUGGINGFACEHUB_API_TOKEN,
+            model=self.model_name
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.client.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.client.aembed_query(text)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Runs the sentence-transformers model in-process on CPU.
+    Texts are encoded in batches straight into a NumPy matrix and normalized in one vectorized step.
+    Requires the optional `sentence-transformers` package.
+    """
+
+    def __init__(self, model_name: str = None, batch_size: int = None, num_threads: int = None, device: str = None):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND='local' requires sentence-transformers: pip install sentence-transformers"
+            ) from e
+
+        num_threads = config.EMBEDDING_LOCAL_THREADS if num_threads is None else num_threads
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        self.model_name = model_name or config.EMBEDDING_MODEL_NAME
+        self.batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        self.model = SentenceTransformer(self.model_name, device=device or config.EMBEDDING_LOCAL_DEVICE)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encodes texts into an (n, dim) float32 matrix of unit-length rows."""
+        matrix = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+        return normalize_rows(matrix)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic, dependency-free embeddings for tests and offline benchmarks.
+    Words are hashed into buckets (feature hashing), so texts that share words get similar vectors.
+    """
+
+    def __init__(self, dimension: int = None):
+        self.dimension = dimension or config.EMBEDDING_MODEL_DIMENSION
+        self.model_name = f"fake-{self.dimension}"
+
+    def _bucket(self, token: str) -> int:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.dimension
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            tokens = re.findall(r"\w+", text.lower()) or [""]
+            rows.extend([row] * len(tokens))
+            cols.extend(self._bucket(token) for token in tokens)
+        # Accumulate all token counts in one vectorized scatter-add
+        np.add.at(matrix, (np.array(rows), np.array(cols)), 1.0)
+        return normalize_rows(matrix)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scales every row to unit length, leaving all-zero rows untouched."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Times every call to the wrapped model into 'embedding_seconds' and counts the texts embedded."""
+
+    def __init__(self, model: Embeddings):
+        self.model = model
+        self.model_name = model.model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        metrics.increment("embedded_texts_total", len(texts))
+        with metrics.timer("embedding_seconds", op="documents"):
+            return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        metrics.increment("embedded_texts_total")
+        with metrics.timer("embedding_seconds", op="query"):
+            return self.model.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        metrics.increment("embedded_texts_total", len(texts))
+        with metrics.timer("embedding_seconds", op="documents"):
+            return await self.model.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        metrics.increment("embedded_texts_total")
+        with metrics.timer("embedding_seconds", op="query"):
+            return await self.model.aembed_query(text)
+
+
+# Available embedding backends, selected with config.EMBEDDING_BACKEND
+BACKENDS = {
+    "remote": RemoteEmbeddings,
+    "local": LocalEmbeddings,
+    "fake": FakeEmbeddings,
+}
+
+
+def build_embeddings_model(backend: str = None) -> Embeddings:
+    """
+    Initializes and returns a new embedding model for the configured backend.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[backend]()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Returns the process-wide embedding cache, opening the on-disk store on first use."""
+    return registry.get_or_create("embedding_cache", EmbeddingCache, close=lambda cache: cache.close())
+
+
+def get_embeddings_model():
+    """
+    Returns the process-wide embedding model, creating it on first use.
+    When caching is enabled the model is wrapped so that queries and ingestion share one cache.
+    Only calls that reach the backend (cache misses) are timed.
+    """
+    def factory():
+        model = InstrumentedEmbeddings(build_embeddings_model())
+        if config.EMBEDDING_CACHE_ENABLED:
+            # The backend is part of the key, so e.g. fake vectors never leak into real lookups
+            return CachedEmbeddings(model, get_embedding_cache(), f"{config.EMBEDDING_BACKEND}:{model.model_name}")
+        return model
+
+    return registry.get_or_create("embeddings_model", factory)
@@ -1,16 +1,282 @@
-from langsmith import Client
-from langsmith.evaluation import run_evaluator
-from langsmith.schemas import Example, Run
-from langchain.smith import RunEvalConfig
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
 
-from src.agent import app
+from src import config
+from src import registry
+from src.metrics import percentile
 
-# Initialize the LangSmith client
-client = Client()
+# --- Offline Evaluation ---
+# Runs a local JSONL dataset through the agent graph (routing, retrieval, context, generation)
+# on a worker pool, with no LangSmith account needed. Each line of the dataset looks like:
+#   {"id": "exp-1", "question": "Where does Avdeep work?", "expected_route": "rag",
+#    "relevant_texts": ["TechWise Digital"], "relevant_ids": []}
+# A retrieved chunk is relevant if its point ID is listed or it contains one of the texts.
 
-# Define a simple custom evaluator that checks if the output is not empty
-@run_evaluator
-def must_not_be_empty(run: Run, example: Example) -> dict:
+DEFAULT_DATASET_PATH = "data/eval_set.jsonl"
+DEFAULT_CACHE_PATH = "data/eval_cache.jsonl"
+
+# Stages in the order they run, as reported in the latency breakdown
+STAGES = ("route", "retrieval", "weather", "context", "generation", "total")
+
+
+@dataclass
+class EvalCase:
+    """One question with its expected route and the chunks that should be retrieved for it."""
+    id: str
+    question: str
+    expected_route: Optional[str] = None
+    relevant_texts: List[str] = field(default_factory=list)
+    relevant_ids: List[str] = field(default_factory=list)
+
+    @property
+    def has_relevance(self) -> bool:
+        return bool(self.relevant_texts or self.relevant_ids)
+
+
+@dataclass
+class CaseResult:
+    """What the agent did for one case, its scores and how long each stage took."""
+    id: str
+    question: str
+    route: Optional[str] = None
+    route_correct: Optional[bool] = None
+    recall: Optional[float] = None
+    reciprocal_rank: Optional[float] = None
+    answer: str = ""
+    latencies_ms: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+    cached: bool = False
+
+    @property
+    def non_empty(self) -> bool:
+        return bool(self.answer.strip())
+
+
+def load_dataset(path: str) -> List[EvalCase]:
+    """
+    Reads evaluation cases from a JSONL file (blank lines are skipped).
+
+    Raises:
+        ValueError: If a line is not valid JSON or has no question.
+    """
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                cases.append(EvalCase(
+                    id=str(data.get("id", line_number)),
+                    question=data["question"],
+                    expected_route=data.get("expected_route"),
+                    relevant_texts=list(data.get("relevant_texts", [])),
+                    relevant_ids=[str(point_id) for point_id in data.get("relevant_ids", [])],
+                ))
+            except (json.JSONDecodeError, KeyError) as e:
+                raise ValueError(f"{path}:{line_number}: invalid evaluation case ({e})") from e
+    return cases
+
+
+def _normalize(text: str) -> str:
+    # PDF extraction scatters whitespace and line breaks inside phrases
+    return " ".join(text.lower().split())
+
+
+def retrieval_scores(documents: List, case: EvalCase) -> Tuple[float, float]:
+    """
+    Scores the retrieved chunks (best first) against the case's relevant items.
+
+    Returns:
+        Tuple[float, float]: recall@k (share of relevant IDs and texts found in the chunks) and
+            the reciprocal rank of the first relevant chunk (0 if none).
+    """
+    texts = [_normalize(doc.page_content) for doc in documents]
+    ids = [str(doc.metadata.get("point_id", "")) for doc in documents]
+    wanted_texts = [_normalize(text) for text in case.relevant_texts]
+
+    found = sum(point_id in ids for point_id in case.relevant_ids)
+    found += sum(any(wanted in text for text in texts) for wanted in wanted_texts)
+    recall = found / (len(case.relevant_ids) + len(wanted_texts))
+
+    reciprocal_rank = 0.0
+    for rank, (text, point_id) in enumerate(zip(texts, ids), start=1):
+        if point_id in case.relevant_ids or any(wanted in text for wanted in wanted_texts):
+            reciprocal_rank = 1.0 / rank
+            break
+    return recall, reciprocal_rank
+
+
+def run_case(case: EvalCase) -> CaseResult:
+    """
+    Runs one case through the agent graph and reads the route, the retrieved chunks and the time
+    of each stage from its final state. Retrieval is scored on what the graph retrieved, so a case
+    routed away from the document finds nothing. The answer cache is not consulted.
+    """
+    from src import agent
+
+    result = CaseResult(id=case.id, question=case.question)
+    start = time.perf_counter()
+    try:
+        state = agent.build_app().invoke({"question": case.question})
+        result.route = state.get("route")
+        if case.expected_route:
+            result.route_correct = result.route == case.expected_route
+        if case.has_relevance:
+            result.recall, result.reciprocal_rank = retrieval_scores(state.get("documents") or [], case)
+        result.answer = state.get("answer") or ""
+        result.latencies_ms.update(state.get("timings") or {})
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.latencies_ms["total"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+# --- Result Cache ---
+
+def fingerprint() -> str:
+    """
+    Identifies everything outside a case that changes its result: models, retrieval settings and
+    the ingested corpus (through the ingestion manifest). Cached results from another
+    configuration are not reused.
+    """
+    corpus = ""
+    if os.path.exists(config.INGEST_MANIFEST_PATH):
+        with open(config.INGEST_MANIFEST_PATH, "rb") as f:
+            corpus = hashlib.sha256(f.read()).hexdigest()
+    settings = [config.LLM_MODEL_NAME, config.EMBEDDING_BACKEND, config.EMBEDDING_MODEL_NAME,
+                config.QDRANT_COLLECTION_NAME, config.RETRIEVAL_TOP_K, config.HYBRID_SEARCH_ENABLED,
+                config.HYBRID_CANDIDATES, config.CONTEXT_TOKEN_BUDGET, config.ROUTER_CONFIDENCE_THRESHOLD,
+                config.ROUTER_USE_PROTOTYPES, corpus]
+    return hashlib.sha256(json.dumps(settings, default=str).encode("utf-8")).hexdigest()
+
+
+def case_key(case: EvalCase, settings_fingerprint: str) -> str:
+    return hashlib.sha256(json.dumps([asdict(case), settings_fingerprint]).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Results of earlier runs, appended to a JSONL file as each case finishes, so an interrupted
+    run keeps what it completed. Failed cases are not cached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry["result"]
+
+    def get(self, key: str) -> Optional[CaseResult]:
+        data = self._entries.get(key)
+        return CaseResult(**{**data, "cached": True}) if data else None
+
+    def put(self, key: str, result: CaseResult):
+        if result.error:
+            return
+        data = {name: value for name, value in asdict(result).items() if name != "cached"}
+        with self._lock:
+            self._entries[key] = data
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "result": data}) + "\n")
+
+
+# --- Runner ---
+
+@dataclass
+class EvaluationReport:
+    """Per-case results of a run and the aggregate metrics."""
+    results: List[CaseResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def summary(self) -> Dict:
+        results = self.results
+        routed = [r for r in results if r.route_correct is not None]
+        scored = [r for r in results if r.recall is not None]
+        completed = [r for r in results if not r.error]
+        latency = {}
+        for stage in STAGES:
+            values = [r.latencies_ms[stage] for r in completed if stage in r.latencies_ms]
+            if values:
+                latency[stage] = {"p50_ms": percentile(values, 50), "p95_ms": percentile(values, 95)}
+        return {
+            "cases": len(results),
+            "errors": len(results) - len(completed),
+            "cached": sum(r.cached for r in results),
+            "routing_accuracy": sum(r.route_correct for r in routed) / len(routed) if routed else None,
+            f"recall@{config.RETRIEVAL_TOP_K}": sum(r.recall for r in scored) / len(scored) if scored else None,
+            "mrr": sum(r.reciprocal_rank for r in scored) / len(scored) if scored else None,
+            # A failed case produced no answer, so it counts as empty
+            "non_empty_rate": sum(r.non_empty for r in results) / len(results) if results else None,
+            "latency": latency,
+            "elapsed_s": self.elapsed,
+            "cases_per_s": len(results) / self.elapsed if self.elapsed > 0 else 0.0,
+        }
+
+    def __str__(self) -> str:
+        s = self.summary()
+        lines = [f"{s['cases']} cases in {s['elapsed_s']:.2f} s ({s['cached']} cached, {s['errors']} errors)"]
+        for name in ("routing_accuracy", f"recall@{config.RETRIEVAL_TOP_K}", "mrr", "non_empty_rate"):
+            lines.append(f"  {name:<18} {'-' if s[name] is None else f'{s[name]:.3f}'}")
+        for stage, values in s["latency"].items():
+            lines.append(f"  {stage + ' latency':<18} p50 {values['p50_ms']:.1f} ms, p95 {values['p95_ms']:.1f} ms")
+        return "\n".join(lines)
+
+
+def evaluate(cases: List[EvalCase], workers: int = 8, cache_path: Optional[str] = None) -> EvaluationReport:
+    """
+    Runs every case on a pool of worker threads (the stages mostly wait on the network, and
+    concurrent retrievals share micro-batches). Cases found in the result cache are skipped.
+
+    Args:
+        cases (List[EvalCase]): The dataset.
+        workers (int): Cases evaluated at the same time.
+        cache_path (str, optional): JSONL file of cached results; None disables caching.
+
+    Returns:
+        EvaluationReport: Results in dataset order.
+    """
+    start = time.perf_counter()
+    cache = ResultCache(cache_path) if cache_path else None
+    settings_fingerprint = fingerprint()
+    results: List[Optional[CaseResult]] = [None] * len(cases)
+    pending = []
+    for i, case in enumerate(cases):
+        cached = cache.get(case_key(case, settings_fingerprint)) if cache else None
+        if cached:
+            results[i] = cached
+        else:
+            pending.append(i)
+    print(f"--- Evaluating {len(pending)} cases ({len(cases) - len(pending)} cached) with {workers} workers ---")
+
+    def run(i: int) -> CaseResult:
+        result = run_case(cases[i])
+        if cache:
+            cache.put(case_key(cases[i], settings_fingerprint), result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="eval") as executor:
+        for i, result in zip(pending, executor.map(run, pending)):
+            results[i] = result
+    return EvaluationReport(results=results, elapsed=time.perf_counter() - start)
+
+
+# --- LangSmith Evaluation ---
+
+def must_not_be_empty(run, example) -> dict:
     """
     A simple evaluator that checks if the agent's output is not empty.
     """
@@ -22,15 +288,24 @@ def evaluate_agent():
     """
     Runs a programmatic evaluation of the agent on a small dataset.
     """
+    from langsmith import Client
+    from langsmith.evaluation import run_evaluator
+    from langchain.smith import RunEvalConfig
+
+    from src.agent import build_app
+
     print("--- Starting Programmatic Evaluation ---")
-    
+
+    # Initialize the LangSmith client
+    client = Client()
+
     # Define a dataset of questions for evaluation
     dataset_name = "AgentTestDataset"
-    
+
     # Create the dataset if it doesn't exist
     if not client.has_dataset(dataset_name=dataset_name):
         client.create_dataset(dataset_name=dataset_name)
-        
+
         # Add examples to the dataset
         client.create_examples(
             inputs=[
@@ -43,19 +318,45 @@ def evaluate_agent():
         print(f"Dataset '{dataset_name}' created with 3 examples.")
     else:
         print(f"Using existing dataset '{dataset_name}'.")
-        
+
     evaluation_result = client.run_on_dataset(
         dataset_name=dataset_name,
-        llm_or_chain_factory=app,
+        llm_or_chain_factory=build_app(),
         evaluation=RunEvalConfig(
-            custom_evaluators=[must_not_be_empty]  # List of custom evaluator functions
+            custom_evaluators=[run_evaluator(must_not_be_empty)]  # List of custom evaluator functions
         ),
         project_name=None,
         concurrency_level=1,
     )
-    
+
     print("--- Evaluation Finished ---")
     print("You can view the results in your LangSmith project.")
 
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the agent on a local JSONL dataset.")
+    parser.add_argument("dataset", nargs="?", default=DEFAULT_DATASET_PATH)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--k", type=int, default=None, help="Chunks retrieved per question (RETRIEVAL_TOP_K)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Result cache file")
+    parser.add_argument("--no-cache", action="store_true", help="Re-run every case")
+    parser.add_argument("--output", help="Write the summary and per-case results to this JSON file")
+    parser.add_argument("--langsmith", action="store_true", help="Run the LangSmith dataset evaluation instead")
+    args = parser.parse_args()
+
+    if args.langsmith:
+        evaluate_agent()
+        return
+    if args.k:
+        config.RETRIEVAL_TOP_K = args.k
+    try:
+        report = evaluate(load_dataset(args.dataset), args.workers, None if args.no_cache else args.cache)
+    finally:
+        registry.shutdown()
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": report.summary(), "results": [asdict(r) for r in report.results]}, f, indent=2)
+        print(f"Results written to {args.output}")
+
 if __name__ == "__main__":
-    evaluate_agent()
\ No newline at end of file
+    main()
@@ -0,0 +1,254 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from src import config
+from src import vector_db
+
+
+@dataclass
+class IngestionProgress:
+    """Thread-safe progress counters for an ingestion run."""
+    total: Optional[int] = None
+    done: int = 0
+    batches: int = 0
+    retries: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_batch(self, size: int):
+        with self._lock:
+            self.done += size
+            self.batches += 1
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Chunks embedded per second so far."""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        total = f"/{self.total}" if self.total is not None else ""
+        return (f"Embedded {self.done}{total} chunks in {self.batches} batches "
+                f"({self.rate:.1f} chunks/s, {self.retries} retries)")
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Groups any iterable into lists of at most `batch_size` items without materializing it."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_with_retry(embeddings_model, texts: List[str], max_retries: int, backoff: float,
+                     progress: Optional[IngestionProgress] = None) -> List[List[float]]:
+    """
+    Embeds one batch, retrying with exponential backoff and jitter on failure.
+
+    Raises:
+        Exception: The last error once `max_retries` retries have been used up.
+    """
+    attempt = 0
+    while True:
+        try:
+            return embeddings_model.embed_documents(texts)
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Embedding batch failed ({e}); retrying in {delay:.2f}s...")
+            if progress is not None:
+                progress.add_retry()
+            time.sleep(delay)
+            attempt += 1
+
+
+def embed_batches(
+    embeddings_model,
+    batches: Iterable[List[str]],
+    max_in_flight: int = None,
+    max_retries: int = None,
+    backoff: float = None,
+    progress: Optional[IngestionProgress] = None,
+    on_batch: Optional[Callable[[IngestionProgress], None]] = None,
+) -> Iterator[List[List[float]]]:
+    """
+    Embeds batches of texts concurrently and yields their vectors in input order.
+
+    At most `max_in_flight` batches are being embedded at any time, and the input
+    iterable is only consumed as fast as results are yielded, so memory stays bounded.
+
+    Args:
+        embeddings_model: Any object with an `embed_documents(texts)` method.
+        batches (Iterable[List[str]]): Batches of texts to embed.
+        max_in_flight (int): Maximum number of concurrent embedding requests.
+        max_retries (int): Retries per batch before the error is raised.
+        backoff (float): Base delay in seconds for the exponential backoff.
+        progress (IngestionProgress, optional): Counters updated after every batch.
+        on_batch (Callable, optional): Called with the progress after every batch.
+
+    Yields:
+        List[List[float]]: The embeddings of each batch.
+    """
+    max_in_flight = max_in_flight or config.EMBEDDING_MAX_IN_FLIGHT
+    max_retries = config.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+    backoff = config.EMBEDDING_RETRY_BACKOFF_SECONDS if backoff is None else backoff
+    progress = progress or IngestionProgress()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embed") as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((len(batch), executor.submit(
+                embed_with_retry, embeddings_model, batch, max_retries, backoff, progress
+            )))
+            # Keep the number of in-flight requests bounded
+            if len(pending) >= max_in_flight:
+                yield _collect(pending.popleft(), progress, on_batch)
+        while pending:
+            yield _collect(pending.popleft(), progress, on_batch)
+
+
+def _collect(entry, progress: IngestionProgress, on_batch) -> List[List[float]]:
+    size, future = entry
+    vectors = future.result()
+    progress.add_batch(size)
+    if on_batch is not None:
+        on_batch(progress)
+    return vectors
+
+
+def embed_texts(embeddings_model, texts: List[str], batch_size: int = None, **kwargs) -> List[List[float]]:
+    """
+    Embeds a list of texts in batches and returns one vector per text, in order.
+    Accepts the same keyword arguments as `embed_batches`.
+    """
+    batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+    vectors = []
+    for batch_vectors in embed_batches(embeddings_model, iter_batches(texts, batch_size), **kwargs):
+        vectors.extend(batch_vectors)
+    return vectors
+
+
+def print_progress(progress: IngestionProgress):
+    """Default progress callback: prints a status line every few batches."""
+    if progress.batches % 10 == 0 or progress.done == progress.total:
+        print(progress)
+
+
+def plan_document_sync(client, chunks: List, previous_point_ids: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Works out which chunks of one document need embedding and which stored points are stale.
+
+    Args:
+        client: The Qdrant client.
+        chunks (List): The document's current chunks.
+        previous_point_ids (Iterable[str], optional): The point IDs recorded for this document
+            last time. None if the document has no record, e.g. points written before the
+            manifest existed (with random IDs); every stored point of the document's source
+            that is not a current chunk is then stale.
+
+    Returns:
+        Dict: The current point IDs, the chunks to embed and the stale point IDs to delete.
+    """
+    point_ids = vector_db.assign_point_ids(chunks)
+    existing = vector_db.get_existing_point_ids(client, point_ids)
+    new_chunks = [chunk for chunk in chunks if chunk.metadata["point_id"] not in existing]
+    if previous_point_ids is None:
+        sources = {str(chunk.metadata.get("source", "")) for chunk in chunks} - {""}
+        previous_point_ids = set()
+        for source in sources:
+            previous_point_ids |= vector_db.get_point_ids_by_source(client, source)
+    stale_ids = set(previous_point_ids) - set(point_ids)
+    return {"point_ids": point_ids, "new_chunks": new_chunks, "stale_ids": stale_ids}
+
+
+def embed_and_upsert(client, embeddings_model, chunks: Iterable, batch_size: int = None, queue_size: int = None,
+                     progress: Optional[IngestionProgress] = None,
+                     on_upsert: Optional[Callable[[List], None]] = None) -> vector_db.UpsertReport:
+    """
+    Streams chunks through the embed and upsert stages.
+
+    Chunks are embedded in concurrent batches on the calling thread, while a separate
+    thread upserts finished batches. The stages are connected by a bounded queue, so a
+    slow upsert stage pauses embedding instead of letting embedded batches pile up.
+
+    Args:
+        client: The Qdrant client.
+        embeddings_model: Any object with an `embed_documents(texts)` method.
+        chunks (Iterable): Chunks to embed and store; may be a generator.
+        batch_size (int): Chunks per embedding request.
+        queue_size (int): Maximum number of embedded batches waiting to be upserted.
+        progress (IngestionProgress, optional): Counters updated after every batch.
+        on_upsert (Callable, optional): Called on the upsert thread with the points of each stored batch.
+
+    Returns:
+        UpsertReport: Points stored, per-batch upsert latency and throughput.
+    """
+    batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+    upsert_queue = queue.Queue(maxsize=queue_size or config.INGEST_QUEUE_SIZE)
+    errors = []
+    reports = []
+    producer_done = threading.Event()
+
+    def queued_chunks():
+        while True:
+            batch = upsert_queue.get()
+            if batch is None:
+                producer_done.set()
+                return
+            yield from batch
+
+    def upsert_worker():
+        try:
+            reports.append(vector_db.upsert_stream(client, queued_chunks(), on_batch=on_upsert))
+        except Exception as e:
+            errors.append(e)
+            # Drain the queue so the producer never blocks forever
+            while not producer_done.is_set():
+                if upsert_queue.get() is None:
+                    producer_done.set()
+
+    worker = threading.Thread(target=upsert_worker, name="upsert", daemon=True)
+    worker.start()
+
+    # Embedding results come back in order, so pending chunk batches line up with them
+    chunk_batches = deque()
+
+    def text_batches():
+        for batch in iter_batches(chunks, batch_size):
+            chunk_batches.append(batch)
+            yield [chunk.page_content for chunk in batch]
+
+    try:
+        for vectors in embed_batches(embeddings_model, text_batches(), progress=progress, on_batch=print_progress):
+            batch = chunk_batches.popleft()
+            for chunk, vector in zip(batch, vectors):
+                chunk.metadata["embedding"] = vector
+            upsert_queue.put(batch)
+            if errors:
+                break
+    finally:
+        upsert_queue.put(None)
+        worker.join()
+
+    if errors:
+        raise errors[0]
+    print(reports[0])
+    return reports[0]
@@ -0,0 +1,488 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Optional
+
+import groq
+import httpx
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from src import config
+from src import metrics
+from src import registry
+from src.context import estimate_tokens
+
+# HTTP statuses worth another attempt: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = {408, 409, 429}
+
+# How often async callers check for a free concurrency slot, which they share with threads
+SLOT_POLL_SECONDS = 0.005
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an LLM call cannot finish before its deadline."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: holds up to `capacity` tokens and refills at `rate` tokens per second.
+    A rate of 0 or less disables the limit.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Takes `amount` tokens if they are available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds until they will be available.
+        """
+        if not self.enabled:
+            return 0.0
+        # A request larger than the bucket could never run; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount: float, deadline: Optional[float] = None) -> float:
+        """
+        Waits until `amount` tokens are available and takes them.
+
+        Args:
+            amount (float): Tokens to take.
+            deadline (float, optional): `time.monotonic()` value by which they must be taken.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            DeadlineExceeded: If the tokens would not be available before the deadline.
+                Nothing is taken in that case.
+        """
+        start = time.monotonic()
+        while True:
+            wait_seconds = self.try_acquire(amount)
+            if wait_seconds == 0:
+                return time.monotonic() - start
+            if deadline is not None and time.monotonic() + wait_seconds > deadline:
+                raise DeadlineExceeded(f"Rate limit leaves no room before the deadline ({wait_seconds:.2f}s wait).")
+            time.sleep(wait_seconds)
+
+    async def aacquire(self, amount: float, deadline: Optional[float] = None) -> float:
+        """Async version of `acquire`: waits on the event loop instead of blocking the thread."""
+        start = time.monotonic()
+        while True:
+            wait_seconds = self.try_acquire(amount)
+            if wait_seconds == 0:
+                return time.monotonic() - start
+            if deadline is not None and time.monotonic() + wait_seconds > deadline:
+                raise DeadlineExceeded(f"Rate limit leaves no room before the deadline ({wait_seconds:.2f}s wait).")
+            await asyncio.sleep(wait_seconds)
+
+    def refund(self, amount: float):
+        """Returns tokens to the bucket; a negative amount takes more (e.g. when usage was underestimated)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+def create_http_client() -> httpx.Client:
+    """Creates the pooled keep-alive HTTP client used for every LLM call."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=60.0,
+        ),
+        timeout=httpx.Timeout(config.LLM_REQUEST_TIMEOUT_SECONDS, connect=5.0),
+        follow_redirects=True,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """Returns the process-wide LLM HTTP client, creating it on first use."""
+    return registry.get_or_create("llm_http_client", create_http_client, close=lambda client: client.close())
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for errors another attempt may fix: timeouts, dropped connections, 429 and 5xx responses."""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, (groq.APIConnectionError, httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUSES or status >= 500)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Returns the delay the provider asked for in a `Retry-After` header, if any."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def prompt_text(prompt: Any) -> str:
+    """Flattens a prompt value, message list or string into text for token estimates."""
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return "\n".join(str(getattr(message, "content", message)) for message in prompt)
+    return str(prompt)
+
+
+def is_streamed(run_config: Optional[RunnableConfig]) -> bool:
+    """
+    True when a callback consumes the tokens as they arrive, e.g. LangGraph's "messages" stream mode.
+    Such handlers tap the model's output stream, which is what chat models check for as well.
+    """
+    callbacks = (run_config or {}).get("callbacks")
+    handlers = getattr(callbacks, "handlers", None) or callbacks or []
+    return any(callable(getattr(handler, "tap_output_iter", None)) for handler in handlers)
+
+
+def without_callbacks(run_config: Optional[RunnableConfig]) -> RunnableConfig:
+    """A copy of the run config that reports to no callbacks, for a duplicate of a call."""
+    return {**(run_config or {}), "callbacks": None}
+
+
+class LLMScheduler(Runnable):
+    """
+    Wraps a chat model so every call is admitted, retried and hedged by one shared policy.
+
+    - Admission: at most `max_concurrency` calls run at once, and each call takes one request and
+      its estimated tokens (prompt plus `max_output_tokens`) from per-minute token buckets. The
+      reservation is corrected with the provider's reported usage afterwards.
+    - Deadline: each call has `deadline_seconds` in total. Waiting for a slot, a rate limit or a
+      retry that cannot finish in time raises `DeadlineExceeded` instead of waiting in vain. A
+      threaded attempt abandoned at the deadline keeps its slot until it returns.
+    - Retries: timeouts, dropped connections, 429 and 5xx responses are retried with exponential
+      backoff and jitter, or after the provider's `Retry-After` delay.
+    - Hedging: if an attempt has not answered after `hedge_after_seconds`, a second copy is sent
+      when the rate limits have room for it, and the first answer wins. The copy reports to no
+      callbacks, and streamed calls are never hedged: their tokens already went to the caller.
+
+    The scheduler is a Runnable, so it composes into chains like the model it wraps. `ainvoke`
+    runs on the event loop and calls the model's `ainvoke`, under the same limits.
+    """
+
+    def __init__(
+        self,
+        llm: Runnable,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        max_concurrency: int = None,
+        max_output_tokens: int = None,
+        deadline_seconds: float = None,
+        max_retries: int = None,
+        backoff: float = None,
+        hedge_after_seconds: float = None,
+    ):
+        requests_per_minute = config.LLM_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+        tokens_per_minute = config.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        max_concurrency = config.LLM_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self.llm = llm
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.max_output_tokens = config.LLM_MAX_OUTPUT_TOKENS if max_output_tokens is None else max_output_tokens
+        self.deadline_seconds = config.LLM_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+        self.max_retries = config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = config.LLM_RETRY_BACKOFF_SECONDS if backoff is None else backoff
+        self.hedge_after_seconds = config.LLM_HEDGE_AFTER_SECONDS if hedge_after_seconds is None else hedge_after_seconds
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Room for a hedge per call, plus attempts abandoned at their deadline that are still finishing
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 3, thread_name_prefix="llm-call")
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, metric: str = None):
+        with self._stats_lock:
+            self.stats[key] += 1
+        if metric:
+            metrics.increment(metric)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        """
+        Runs one LLM call under the scheduler's limits.
+
+        Args:
+            input: The prompt, as accepted by the wrapped model.
+            config (RunnableConfig, optional): Passed through to the wrapped model.
+
+        Returns:
+            The wrapped model's response.
+
+        Raises:
+            DeadlineExceeded: If the call could not finish before its deadline.
+            Exception: The model's error, when it is not retryable or the retries are used up.
+        """
+        deadline, estimated = self._begin(input)
+        with self._counting_deadlines():
+            self._admit(estimated, deadline)
+            sent = []
+            try:
+                response = self._call_with_retries(input, config, kwargs, estimated, deadline, sent)
+            finally:
+                self._release_after(sent)
+        self._settle(response, estimated)
+        return response
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        """
+        Async version of `invoke`. Admission waits on the event loop, the concurrency limit and
+        rate limits are shared with threaded callers, and attempts use the model's `ainvoke`.
+        """
+        deadline, estimated = self._begin(input)
+        with self._counting_deadlines():
+            await self._aadmit(estimated, deadline)
+            try:
+                response = await self._acall_with_retries(input, config, kwargs, estimated, deadline)
+            finally:
+                # Async attempts are cancelled on the way out, so none outlives the call
+                self._slots.release()
+        self._settle(response, estimated)
+        return response
+
+    # --- Shared by the sync and async paths ---
+
+    def _begin(self, input: Any) -> tuple:
+        """Counts a call and returns its deadline and the tokens it reserves."""
+        self._count("calls")
+        return time.monotonic() + self.deadline_seconds, estimate_tokens(prompt_text(input)) + self.max_output_tokens
+
+    @contextmanager
+    def _counting_deadlines(self):
+        try:
+            yield
+        except DeadlineExceeded:
+            self._count("deadline_exceeded", "llm_deadline_exceeded_total")
+            raise
+
+    def _settle(self, response: Any, estimated: int):
+        """Corrects the token reservation with the usage the provider reported."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            self.tokens.refund(estimated - usage["total_tokens"])
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """
+        Returns how long to wait before retrying after `error`, or None if it should be raised.
+
+        Raises:
+            DeadlineExceeded: If the retry could not start before the deadline.
+        """
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = retry_after(error)
+        if delay is None:
+            delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if time.monotonic() + delay >= deadline:
+            raise DeadlineExceeded(f"No time left to retry the LLM call after: {error}") from error
+        print(f"LLM call failed ({error}); retrying in {delay:.2f}s...")
+        self._count("retries", "llm_retries_total")
+        return delay
+
+    def _start_attempt(self, deadline: float) -> float:
+        """Counts an attempt and returns the seconds left for it."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("The LLM call ran out of time.")
+        self._count("attempts")
+        return remaining
+
+    def _may_hedge(self, run_config: Optional[RunnableConfig], remaining: float) -> bool:
+        return 0 < self.hedge_after_seconds < remaining and not is_streamed(run_config)
+
+    def _try_admit_hedge(self, estimated: int) -> bool:
+        """Hedges only when the rate limits have room right now; a hedge never waits."""
+        if self.requests.try_acquire(1) > 0:
+            return False
+        if self.tokens.try_acquire(estimated) > 0:
+            self.requests.refund(1)
+            return False
+        self._count("hedges", "llm_hedges_total")
+        return True
+
+    def _winner(self, done: set, primary: Any) -> Optional[Any]:
+        """Returns the first successful attempt among the finished ones, if any."""
+        for attempt in done:
+            if attempt.exception() is None:
+                if attempt is not primary:
+                    self._count("hedge_wins", "llm_hedge_wins_total")
+                return attempt
+        return None
+
+    # --- Sync path: attempts run on the executor ---
+
+    def _admit(self, estimated: int, deadline: float):
+        """Takes a concurrency slot, then one request and the estimated tokens from the buckets."""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=max(0.0, deadline - start)):
+            raise DeadlineExceeded("No LLM slot became free before the deadline.")
+        try:
+            self.requests.acquire(1, deadline)
+            self.tokens.acquire(estimated, deadline)
+        except DeadlineExceeded:
+            self._slots.release()
+            raise
+        metrics.observe("llm_queue_seconds", time.monotonic() - start)
+
+    def _release_after(self, sent: list):
+        """
+        Frees the call's slot once every attempt it sent has finished. Threads cannot be stopped,
+        so an attempt abandoned at the deadline keeps holding the slot until it returns.
+        """
+        remaining = [len(sent)]
+        lock = threading.Lock()
+
+        def finished(_future=None):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] <= 0
+            if last:
+                self._slots.release()
+
+        if not sent:
+            finished()
+        for future in sent:
+            future.add_done_callback(finished)
+
+    def _call_with_retries(self, input: Any, run_config: Optional[RunnableConfig], kwargs: dict,
+                           estimated: int, deadline: float, sent: list) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(input, run_config, kwargs, estimated, deadline, sent)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                # A retry is a new request as far as the provider's limits are concerned
+                self.requests.acquire(1, deadline)
+                self.tokens.acquire(estimated, deadline)
+                attempt += 1
+
+    def _attempt(self, input: Any, run_config: Optional[RunnableConfig], kwargs: dict,
+                 estimated: int, deadline: float, sent: list) -> Any:
+        """Sends the call, plus a hedged copy if it is slow, and returns the first successful answer."""
+        remaining = self._start_attempt(deadline)
+        primary = self._executor.submit(self.llm.invoke, input, run_config, **kwargs)
+        sent.append(primary)
+        pending = {primary}
+
+        if self._may_hedge(run_config, remaining):
+            done, _ = wait(pending, timeout=self.hedge_after_seconds)
+            if not done and self._try_admit_hedge(estimated):
+                hedge = self._executor.submit(self.llm.invoke, input, without_callbacks(run_config), **kwargs)
+                sent.append(hedge)
+                pending.add(hedge)
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"The LLM did not answer within {self.deadline_seconds:.1f}s.")
+            winner = self._winner(done, primary)
+            if winner is not None:
+                self._cancel(pending)
+                return winner.result()
+            error = next(iter(done)).exception()
+        raise error
+
+    # --- Async path: attempts are tasks on the event loop ---
+
+    async def _aadmit(self, estimated: int, deadline: float):
+        """Async version of `_admit`."""
+        start = time.monotonic()
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() + SLOT_POLL_SECONDS > deadline:
+                raise DeadlineExceeded("No LLM slot became free before the deadline.")
+            await asyncio.sleep(SLOT_POLL_SECONDS)
+        try:
+            await self.requests.aacquire(1, deadline)
+            await self.tokens.aacquire(estimated, deadline)
+        except BaseException:  # cancellation included, so the slot is never lost
+            self._slots.release()
+            raise
+        metrics.observe("llm_queue_seconds", time.monotonic() - start)
+
+    async def _acall_with_retries(self, input: Any, run_config: Optional[RunnableConfig], kwargs: dict,
+                                  estimated: int, deadline: float) -> Any:
+        """Async version of `_call_with_retries`."""
+        attempt = 0
+        while True:
+            try:
+                return await self._aattempt(input, run_config, kwargs, estimated, deadline)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                await self.requests.aacquire(1, deadline)
+                await self.tokens.aacquire(estimated, deadline)
+                attempt += 1
+
+    async def _aattempt(self, input: Any, run_config: Optional[RunnableConfig], kwargs: dict,
+                        estimated: int, deadline: float) -> Any:
+        """Async version of `_attempt`. Unlike threads, the losing tasks are really cancelled."""
+        remaining = self._start_attempt(deadline)
+        primary = asyncio.ensure_future(self.llm.ainvoke(input, run_config, **kwargs))
+        pending = {primary}
+        try:
+            if self._may_hedge(run_config, remaining):
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_after_seconds)
+                if not done and self._try_admit_hedge(estimated):
+                    pending.add(asyncio.ensure_future(
+                        self.llm.ainvoke(input, without_callbacks(run_config), **kwargs)
+                    ))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(f"The LLM did not answer within {self.deadline_seconds:.1f}s.")
+                winner = self._winner(done, primary)
+                if winner is not None:
+                    return winner.result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _cancel(futures: set):
+        # Attempts already sent cannot be recalled; their results are simply dropped
+        for future in futures:
+            future.cancel()
+
+    def close(self):
+        """Stops accepting calls; attempts still in flight finish in the background."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
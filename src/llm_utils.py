@@ -3,21 +3,57 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_groq import ChatGroq
 
 from src import config
+from src import llm_scheduler
+from src import metrics
+from src import registry
+from src.context import estimate_tokens
 
-def get_llm():
-    """Initializes and returns the ChatGroq LLM."""
+def get_chat_model():
+    """
+    Initializes the ChatGroq model on the shared keep-alive HTTP client.
+    Retries are left to the scheduler, which knows the call's deadline.
+    """
     return ChatGroq(
         temperature=0.2,
         model_name=config.LLM_MODEL_NAME,
-        api_key=config.GROQ_API_KEY
+        api_key=config.GROQ_API_KEY,
+        base_url=config.GROQ_API_BASE,
+        max_tokens=config.LLM_MAX_OUTPUT_TOKENS,
+        request_timeout=config.LLM_REQUEST_TIMEOUT_SECONDS,
+        max_retries=0,
+        http_client=llm_scheduler.get_http_client(),
     )
 
+def get_llm():
+    """Initializes and returns the ChatGroq LLM behind the rate-limit-aware call scheduler."""
+    return llm_scheduler.LLMScheduler(get_chat_model())
+
+def get_shared_llm():
+    """Returns the process-wide scheduled LLM, creating it on first use."""
+    return registry.get_or_create("llm", get_llm, close=llm_scheduler.LLMScheduler.close)
+
 def get_decider_chain():
+    """Returns the shared decider chain, creating it on first use."""
+    return registry.get_or_create("decider_chain", build_decider_chain)
+
+def get_processing_chain():
+    """Returns the shared processing chain, creating it on first use."""
+    return registry.get_or_create("processing_chain", build_processing_chain)
+
+def count_tokens(chain: str, prompt_text: str, completion: str):
+    """
+    Adds the estimated prompt and completion tokens of one LLM call to the token counters.
+    The chains end in a string parser, so provider usage data is not available here.
+    """
+    metrics.increment("llm_prompt_tokens_total", estimate_tokens(prompt_text), chain=chain)
+    metrics.increment("llm_completion_tokens_total", estimate_tokens(completion or ""), chain=chain)
+
+def build_decider_chain():
     """
     Creates a chain that decides which tool to use based on the user's question.
     Returns 'weather' or 'rag'.
     """
-    llm = get_llm()
+    llm = get_shared_llm()
     
     prompt_template = """
     Given the user's question, classify it as either 'weather' or 'rag'.
@@ -34,11 +70,11 @@ def get_decider_chain():
     
     return prompt | llm | StrOutputParser()
 
-def get_processing_chain():
+def build_processing_chain():
     """
     Creates a chain that generates a final answer based on the context from a tool and the original question.
     """
-    llm = get_llm()
+    llm = get_shared_llm()
     
     prompt_template = """
     You are a helpful assistant. Based on the following context, answer the user's question concisely.
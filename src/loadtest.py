@@ -0,0 +1,124 @@
+import argparse
+import itertools
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from src import config
+from src.metrics import percentile
+
+# Mix of weather and document questions sent when none are given
+DEFAULT_QUESTIONS = [
+    "What's the weather in Delhi?",
+    "Tell me about Avdeep's experience",
+    "Will it rain in Mumbai today?",
+    "What skills does Avdeep have?",
+    "Summarize the resume in two lines",
+    "Temperature in London",
+]
+
+
+@dataclass
+class LoadTestReport:
+    """Latencies of successful requests, status code counts and overall throughput."""
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    elapsed: float = 0.0
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def qps(self) -> float:
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "statuses": dict(self.statuses),
+            "qps": self.qps,
+            "p50_ms": percentile(self.latencies, 50) * 1000,
+            "p95_ms": percentile(self.latencies, 95) * 1000,
+            "p99_ms": percentile(self.latencies, 99) * 1000,
+        }
+
+    def __str__(self) -> str:
+        s = self.summary()
+        statuses = ", ".join(f"{code}: {count}" for code, count in sorted(s["statuses"].items()))
+        return (f"{s['requests']} requests in {self.elapsed:.2f} s ({s['qps']:.1f} QPS) | "
+                f"p50 {s['p50_ms']:.1f} ms, p95 {s['p95_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms | "
+                f"status {statuses}")
+
+
+def send_question(url: str, question: str, timeout: float = 60.0) -> Tuple[int, float]:
+    """POSTs one question to the server's /ask endpoint and returns the status code and latency."""
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/ask",
+        data=json.dumps({"question": question}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, TimeoutError):
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def run_load_test(url: str, questions: List[str] = None, requests: int = 100,
+                  concurrency: int = 8) -> LoadTestReport:
+    """
+    Sends `requests` questions to the server from `concurrency` client threads.
+
+    Args:
+        url (str): Base URL of the server, e.g. 'http://127.0.0.1:8000'.
+        questions (List[str], optional): Questions to cycle through.
+        requests (int): Total number of requests.
+        concurrency (int): Number of requests in flight at once.
+
+    Returns:
+        LoadTestReport: Latency percentiles (of 200 responses), status counts and QPS.
+    """
+    questions = list(itertools.islice(itertools.cycle(questions or DEFAULT_QUESTIONS), requests))
+    report = LoadTestReport()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadtest") as executor:
+        for status, latency in executor.map(lambda q: send_question(url, q), questions):
+            report.statuses[status] += 1
+            if status == 200:
+                report.latencies.append(latency)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running agent server.")
+    parser.add_argument("--url", default=f"http://{config.SERVER_HOST}:{config.SERVER_PORT}")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--questions", help="File with one question per line")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    questions = None
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    report = run_load_test(args.url, questions, args.requests, args.concurrency)
+    print(json.dumps(report.summary(), indent=2) if args.json else report)
+
+
+if __name__ == "__main__":
+    main()
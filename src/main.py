@@ -1,5 +1,9 @@
+import argparse
+import asyncio
+
 from src import config
-from src.agent import app
+from src import registry
+from src.agent import abatch
 
 
 def test_config():
@@ -18,36 +22,56 @@ def test_config():
 def run_agent():
     """
     Runs the LangGraph agent with sample queries to test both paths.
+    Both queries run concurrently on one event loop through the async graph.
     """
-    print("\n--- Testing Weather Path ---")
-    weather_query = "Delhi"
-    print(f"Query: {weather_query}")
+    queries = [
+        ("Weather", "Delhi"),
+        ("RAG", "tell me about avdeep's experience? in 2 lines"),
+    ]
     
     # The input to the graph is a dictionary with keys matching the AgentState
-    final_state = app.invoke({"question": weather_query})
-    
-    print("\n--- Final Answer ---")
-    print(final_state['answer'])
-    print("----------------------\n")
-
-    print("\n--- Testing RAG Path ---")
-    rag_query = "tell me about avdeep's experience? in 2 lines"
-    print(f"Query: {rag_query}")
-    
-    final_state = app.invoke({"question": rag_query})
+    final_states = asyncio.run(abatch([query for _, query in queries]))
     
-    print("\n--- Final Answer ---")
-    print(final_state['answer'])
-    print("--------------------")
+    for (path, query), final_state in zip(queries, final_states):
+        print(f"\n--- Testing {path} Path ---")
+        print(f"Query: {query}")
+        print("\n--- Final Answer ---")
+        print(final_state['answer'])
+        print("--------------------")
     
 
+def run_ingestion(path: str, force: bool = False, fresh: bool = False, workers: int = None):
+    """
+    Ingests PDFs into the vector store as a resumable job.
+    An interrupted run picks up from its checkpoint the next time, unless `fresh` is set.
+    """
+    from src import pdf_processor
+
+    try:
+        pdf_processor.process_and_store_pdfs(path, force=force, workers=workers, resume=not fresh)
+    finally:
+        registry.shutdown()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the agent on sample queries, or ingests PDFs.")
+    parser.add_argument("--ingest", nargs="?", const=config.PDF_PATH, default=None, metavar="PATH",
+                        help=f"Ingest a PDF, a directory of PDFs or a glob (default: {config.PDF_PATH}) and exit")
+    parser.add_argument("--force", action="store_true", help="Re-check every chunk even if a file is unchanged")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore the checkpoint of an interrupted ingestion and start over")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes")
+    args = parser.parse_args()
+
     # First, verify the configuration
     #test_config()
-    
-    # from src import pdf_processor
-    # pdf_processor.process_and_store_pdf() # Run this once to create the DB
-    
-    
-    # Finally, run the agent
-    run_agent()
\ No newline at end of file
+
+    if args.ingest:
+        run_ingestion(args.ingest, force=args.force, fresh=args.fresh, workers=args.workers)
+    else:
+        # Run the agent with the shared clients built up front
+        registry.warmup()
+        try:
+            run_agent()
+        finally:
+            registry.shutdown()
\ No newline at end of file
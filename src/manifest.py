@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from src import config
+
+
+def content_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest of a piece of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_source(source: str) -> str:
+    """
+    Returns one spelling per document path, so './data/x.pdf', 'data/x.pdf' and the absolute
+    path of the same file share point IDs and a manifest entry. Paths under the working
+    directory stay relative, matching what earlier runs stored.
+    """
+    if not source:
+        return source
+    path = os.path.normpath(source)
+    if os.path.isabs(path):
+        try:
+            relative = os.path.relpath(path)
+        except ValueError:  # another drive on Windows
+            return path
+        if not relative.startswith(os.pardir):
+            return relative
+    return path
+
+
+def file_hash(file_path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str = None) -> Dict:
+    """
+    Loads the ingestion manifest, which records what has already been ingested per document.
+
+    Returns:
+        Dict: The manifest, or an empty one if the file does not exist yet.
+    """
+    path = path or config.INGEST_MANIFEST_PATH
+    if not os.path.exists(path):
+        return {"documents": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict, path: str = None):
+    """Writes the manifest atomically so an interrupted run never leaves a corrupt file."""
+    path = path or config.INGEST_MANIFEST_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def get_document_entry(manifest: Dict, source: str) -> Optional[Dict]:
+    """Returns the manifest entry of a document, or None if it was never ingested."""
+    return manifest["documents"].get(source)
+
+
+def set_document_entry(manifest: Dict, source: str, document_hash: str, point_ids: List[str]):
+    """Records the current state of an ingested document in the manifest."""
+    manifest["documents"][source] = {
+        "document_hash": document_hash,
+        "point_ids": sorted(point_ids),
+        "ingested_at": time.time(),
+    }
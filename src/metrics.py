@@ -0,0 +1,208 @@
+import asyncio
+import functools
+import json
+import math
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from src import config
+
+# In-process latency samples per metric name. Only the most recent samples are kept,
+# so percentiles reflect current behaviour and memory stays bounded.
+MAX_SAMPLES = 10000
+
+# A series is a metric name plus its labels, e.g. ("node_seconds", (("node", "rag"),))
+Series = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_lock = threading.Lock()
+_samples: Dict[Series, deque] = {}
+_counts: Dict[Series, int] = {}
+_sums: Dict[Series, float] = {}
+_counters: Dict[Series, float] = {}
+
+_log_lock = threading.Lock()
+_log_file = None
+
+
+def _series(name: str, labels: Dict[str, str]) -> Series:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def observe(name: str, value: float, **labels):
+    """Records one sample (e.g. a latency in seconds) for the given metric."""
+    series = _series(name, labels)
+    with _lock:
+        _samples.setdefault(series, deque(maxlen=MAX_SAMPLES)).append(value)
+        _counts[series] = _counts.get(series, 0) + 1
+        _sums[series] = _sums.get(series, 0.0) + value
+
+
+def increment(name: str, value: float = 1, **labels):
+    """Adds to a counter, e.g. cache hits, tokens or errors."""
+    series = _series(name, labels)
+    with _lock:
+        _counters[series] = _counters.get(series, 0) + value
+
+
+def counter(name: str, **labels) -> float:
+    """Returns the current value of a counter."""
+    with _lock:
+        return _counters.get(_series(name, labels), 0)
+
+
+def percentile(values, q: float) -> float:
+    """Returns the q-th percentile (0-100) of the values using the nearest-rank method."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Rank ceil(q/100 * n), multiplied first so that e.g. p95 of 20 values is exactly rank 19
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+def summary(name: str, **labels) -> Dict[str, float]:
+    """Returns the count, mean and p50/p95/p99 of a metric."""
+    series = _series(name, labels)
+    with _lock:
+        values = list(_samples.get(series, ()))
+        count = _counts.get(series, 0)
+    if not values:
+        return {"count": count, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    return {
+        "count": count,
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+# --- Timers ---
+
+@contextmanager
+def timer(name: str, **labels):
+    """
+    Times the enclosed block into the metric `name` (in seconds) and logs a JSON event.
+    An exception is counted in 'errors_total' with the same labels and re-raised.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(name, elapsed, **labels)
+        if error is not None and not isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+            increment("errors_total", metric=name, **labels)
+        log_event(name, duration_ms=round(elapsed * 1000, 3), error=repr(error) if error else None, **labels)
+
+
+def timed(name: str, **labels):
+    """Decorator form of `timer` for sync and async functions."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(name, **labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- Export ---
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Dict[str, str] = None) -> str:
+    pairs = list(labels) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def export_prometheus() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format: sampled metrics as summaries
+    (p50/p95/p99 quantiles, _sum and _count) and counters as counters.
+    """
+    with _lock:
+        sampled = {series: (list(values), _counts[series], _sums[series]) for series, values in _samples.items()}
+        counters = dict(_counters)
+
+    lines = []
+    declared = set()
+    for (name, labels), (values, count, total) in sorted(sampled.items()):
+        if name not in declared:
+            lines.append(f"# TYPE {name} summary")
+            declared.add(name)
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f"{name}{_format_labels(labels, {'quantile': str(q)})} {percentile(values, q * 100):.6g}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6g}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in declared:
+            lines.append(f"# TYPE {name} counter")
+            declared.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:.6g}")
+    return "\n".join(lines) + "\n"
+
+
+def log_event(event: str, **fields):
+    """
+    Writes one structured JSON log line to `config.METRICS_LOG_PATH` ('stdout', 'stderr' or a
+    file path). Does nothing when no path is configured.
+    """
+    global _log_file
+    path = config.METRICS_LOG_PATH
+    if not path:
+        return
+    record = {"ts": round(time.time(), 6), "event": event,
+              **{key: value for key, value in fields.items() if value is not None}}
+    line = json.dumps(record, default=str)
+    with _log_lock:
+        if path == "stdout":
+            stream = sys.stdout
+        elif path == "stderr":
+            stream = sys.stderr
+        else:
+            if _log_file is None or _log_file.name != path:
+                if _log_file is not None:
+                    _log_file.close()
+                _log_file = open(path, "a", encoding="utf-8")
+            stream = _log_file
+        stream.write(line + "\n")
+        stream.flush()
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Returns every summary and counter as plain data, keyed by the Prometheus series name."""
+    with _lock:
+        sampled = list(_samples)
+        counters = dict(_counters)
+    result = {"summaries": {}, "counters": {}}
+    for name, labels in sampled:
+        result["summaries"][name + _format_labels(labels)] = summary(name, **dict(labels))
+    for (name, labels), value in counters.items():
+        result["counters"][name + _format_labels(labels)] = value
+    return result
+
+
+def reset():
+    """Clears all recorded samples."""
+    with _lock:
+        _samples.clear()
+        _counts.clear()
+        _sums.clear()
+        _counters.clear()
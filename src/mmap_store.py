@@ -0,0 +1,469 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from qdrant_client.http import models
+
+# Rows scored per matrix product, so a float16 store is only upcast one block at a time
+SEARCH_BLOCK_ROWS = 65536
+
+# Slots added whenever the vector file has to grow (at least doubling it)
+MIN_CAPACITY = 1024
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _point_id(stored: str) -> Union[int, str]:
+    """Point IDs are stored as text; Qdrant IDs are unsigned integers or UUIDs, so digits mean an integer."""
+    return int(stored) if stored.isdigit() else stored
+
+
+def _project(payload: Dict[str, Any], with_payload) -> Optional[Dict[str, Any]]:
+    """Applies a Qdrant `with_payload` argument (bool, field list or include selector) to a payload."""
+    if with_payload is None or with_payload is False:
+        return None
+    if with_payload is True:
+        return payload
+    fields = with_payload.include if isinstance(with_payload, models.PayloadSelectorInclude) else with_payload
+    projected: Dict[str, Any] = {}
+    for field in fields:
+        source, target = payload, projected
+        *parents, leaf = field.split(".")
+        for key in parents:
+            if not isinstance(source.get(key), dict):
+                break
+            source = source[key]
+            target = target.setdefault(key, {})
+        else:
+            if leaf in source:
+                target[leaf] = source[leaf]
+    return projected
+
+
+class _Collection:
+    """
+    One collection on disk:
+        vectors.bin   - unit-length vectors, one row per slot (float32 or float16), memory-mapped
+        alive.bin     - one byte per slot, 0 once the point is deleted or rewritten
+        points.sqlite - point ID -> slot and JSON payload, the collection's metadata, and the
+                        slots retired by committed writes whose alive bytes are not cleared yet
+    Writes only ever fill slots past the committed slot count and commit the new count with the
+    rows, so readers in other processes never see a slot whose vector is not written yet, and a
+    rolled-back write leaves every committed slot as it was. Updated and deleted points release
+    their old slots only after the commit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(os.path.join(path, "points.sqlite"), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS retired (slot INTEGER PRIMARY KEY)")
+        meta = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        self.dimension = int(meta["dimension"])
+        self.dtype = DTYPES[meta["dtype"]]
+        self.vectors: Optional[np.memmap] = None
+        self.alive: Optional[np.memmap] = None
+        self.capacity = 0
+        self._map()
+        # A writer that stopped between its commit and clearing the alive bytes left them here
+        self._clear_retired()
+
+    @classmethod
+    def create(cls, path: str, dimension: int, dtype: str) -> "_Collection":
+        os.makedirs(path, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(path, "points.sqlite"))
+        with conn:
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE points (id TEXT PRIMARY KEY, slot INTEGER UNIQUE, payload TEXT)")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                             [("dimension", str(dimension)), ("dtype", dtype), ("slots", "0")])
+        conn.close()
+        for name in ("vectors.bin", "alive.bin"):
+            open(os.path.join(path, name), "wb").close()
+        return cls(path)
+
+    # --- Memory Maps ---
+
+    def _map(self):
+        """(Re)maps the vector and liveness files at their current size."""
+        row_bytes = self.dimension * np.dtype(self.dtype).itemsize
+        self.capacity = os.path.getsize(os.path.join(self.path, "vectors.bin")) // row_bytes
+        if self.capacity == 0:
+            self.vectors, self.alive = None, None
+            return
+        self.vectors = np.memmap(os.path.join(self.path, "vectors.bin"), dtype=self.dtype, mode="r+",
+                                 shape=(self.capacity, self.dimension))
+        self.alive = np.memmap(os.path.join(self.path, "alive.bin"), dtype=np.uint8, mode="r+",
+                               shape=(self.capacity,))
+
+    def _grow(self, slots: int):
+        if slots <= self.capacity:
+            return
+        capacity = max(slots, 2 * self.capacity, MIN_CAPACITY)
+        self.vectors, self.alive = None, None
+        with open(os.path.join(self.path, "vectors.bin"), "r+b") as f:
+            f.truncate(capacity * self.dimension * np.dtype(self.dtype).itemsize)
+        with open(os.path.join(self.path, "alive.bin"), "r+b") as f:
+            f.truncate(capacity)
+        self._map()
+
+    def slots(self) -> int:
+        """Slots in use, as committed; remaps the files if another process has grown them."""
+        slots = int(self.conn.execute("SELECT value FROM meta WHERE key = 'slots'").fetchone()[0])
+        if slots > self.capacity:
+            self._map()
+        return slots
+
+    # --- Writes ---
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]):
+        """Writes every point, new or updated, to a fresh slot; updated points retire their old one."""
+        latest = {point_id: i for i, point_id in enumerate(ids)}  # the last copy of a repeated ID wins
+        ids = list(latest)
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32)[list(latest.values())])
+        payloads = [payloads[i] for i in latest.values()]
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            start = self.slots()
+            replaced = [slot for slot, in self.conn.execute(
+                f"SELECT slot FROM points WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()]
+            assigned = list(range(start, start + len(ids)))
+            self._grow(start + len(ids))
+            self.vectors[assigned] = vectors.astype(self.dtype)
+            self.alive[assigned] = 1
+            self.vectors.flush()
+            self.alive.flush()
+            self.conn.executemany(
+                "INSERT INTO points (id, slot, payload) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET slot = excluded.slot, payload = excluded.payload",
+                [(point_id, slot, json.dumps(payload)) for point_id, slot, payload in zip(ids, assigned, payloads)]
+            )
+            self.conn.executemany("INSERT OR IGNORE INTO retired VALUES (?)", [(slot,) for slot in replaced])
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'slots'", (str(start + len(ids)),))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self._clear_retired()
+
+    def delete(self, slots: List[int]):
+        """Removes the points in these slots; the rows stay allocated until the collection is rebuilt."""
+        if not slots:
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany("DELETE FROM points WHERE slot = ?", [(slot,) for slot in slots])
+            self.conn.executemany("INSERT OR IGNORE INTO retired VALUES (?)", [(slot,) for slot in slots])
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self._clear_retired()
+
+    def _clear_retired(self):
+        """Marks committed retired slots dead. Until then searches skip them, as they have no point row."""
+        retired = [slot for slot, in self.conn.execute("SELECT slot FROM retired").fetchall()]
+        if not retired:
+            return
+        self.slots()
+        self.alive[retired] = 0
+        self.alive.flush()
+        self.conn.executemany("DELETE FROM retired WHERE slot = ?", [(slot,) for slot in retired])
+
+    # --- Reads ---
+
+    def filter_clause(self, query_filter: Optional[models.Filter]) -> Tuple[str, List[Any]]:
+        """
+        Translates a filter into an SQL condition on the payload, or ("", []) when every point matches.
+        Supports `must` conditions with MatchValue / MatchAny on (nested) payload keys.
+        """
+        if query_filter is None or not (query_filter.must or query_filter.should or query_filter.must_not):
+            return "", []
+        if query_filter.should or query_filter.must_not:
+            raise ValueError("The mmap store only supports 'must' filter conditions.")
+        conditions = query_filter.must if isinstance(query_filter.must, list) else [query_filter.must]
+        clauses, params = [], []
+        for condition in conditions:
+            if not isinstance(condition, models.FieldCondition) or condition.match is None:
+                raise ValueError(f"Unsupported filter condition for the mmap store: {condition!r}")
+            path = "$." + condition.key
+            if isinstance(condition.match, models.MatchValue):
+                clauses.append("json_extract(payload, ?) = ?")
+                params.extend([path, condition.match.value])
+            elif isinstance(condition.match, models.MatchAny):
+                clauses.append(f"json_extract(payload, ?) IN ({','.join('?' * len(condition.match.any))})")
+                params.extend([path, *condition.match.any])
+            else:
+                raise ValueError(f"Unsupported match for the mmap store: {condition.match!r}")
+        return " AND ".join(clauses), params
+
+    def filter_slots(self, query_filter: Optional[models.Filter]) -> Optional[np.ndarray]:
+        """Returns the slots matching a filter, or None when every point matches."""
+        clause, params = self.filter_clause(query_filter)
+        if not clause:
+            return None
+        rows = self.conn.execute(f"SELECT slot FROM points WHERE {clause}", params).fetchall()
+        return np.fromiter((slot for slot, in rows), dtype=np.int64, count=len(rows))
+
+    def top_k(self, queries: np.ndarray, k: int, candidates: Optional[np.ndarray] = None
+              ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact cosine top-k for every query row, scanning the vectors in blocks.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (slots, scores), each (n_queries, <=k), best first.
+                Padding where fewer than k points qualify has score -inf.
+        """
+        slots = self.slots()
+        n_queries = queries.shape[0]
+        best_slots = np.empty((n_queries, 0), dtype=np.int64)
+        best_scores = np.empty((n_queries, 0), dtype=np.float32)
+        if slots == 0 or k <= 0:
+            return best_slots, best_scores
+        queries = _normalize(queries.astype(np.float32))
+        allowed = None
+        if candidates is not None:
+            allowed = np.zeros(slots, dtype=bool)
+            allowed[candidates[candidates < slots]] = True
+
+        for start in range(0, slots, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, slots)
+            block = np.asarray(self.vectors[start:end], dtype=np.float32)
+            scores = queries @ block.T
+            dead = self.alive[start:end] == 0
+            if allowed is not None:
+                dead |= ~allowed[start:end]
+            scores[:, dead] = -np.inf
+            block_slots = np.broadcast_to(np.arange(start, end), scores.shape)
+
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_slots = np.concatenate([best_slots, block_slots], axis=1)
+            if merged_scores.shape[1] > k:
+                keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+                merged_scores = np.take_along_axis(merged_scores, keep, axis=1)
+                merged_slots = np.take_along_axis(merged_slots, keep, axis=1)
+            best_scores, best_slots = merged_scores, merged_slots
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_slots, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def points_by_slot(self, slots: Iterable[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        slots = [int(slot) for slot in slots]
+        if not slots:
+            return {}
+        rows = self.conn.execute(
+            f"SELECT slot, id, payload FROM points WHERE slot IN ({','.join('?' * len(slots))})", slots
+        ).fetchall()
+        return {slot: (_point_id(point_id), json.loads(payload)) for slot, point_id, payload in rows}
+
+    def close(self):
+        self.vectors, self.alive = None, None
+        self.conn.close()
+
+
+class MmapVectorStore:
+    """
+    An exact-search vector store that keeps each collection's vectors in one contiguous,
+    memory-mapped NumPy file and its payloads in SQLite.
+
+    Opening a collection maps the files instead of loading them, so start-up is near-instant
+    and several processes reading the same store share one copy in the OS page cache. Search
+    is a blocked matrix product with `argpartition` top-k, so a batch of queries costs one
+    pass over the vectors. Only cosine distance is supported.
+
+    It implements the subset of the `QdrantClient` API this project uses (and returns the same
+    model types), so `vector_db`, retrieval, ingestion and the answer cache work unchanged.
+    Writes from one process at a time are supported; any number of processes may read.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{dtype}'. Choose one of: {', '.join(DTYPES)}")
+        self.path = path
+        self.dtype = dtype
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, collection_name: str) -> str:
+        return os.path.join(self.path, collection_name)
+
+    def _get(self, collection_name: str) -> _Collection:
+        with self._lock:
+            if collection_name not in self._collections:
+                if not self.collection_exists(collection_name):
+                    raise ValueError(f"Collection {collection_name} not found")
+                self._collections[collection_name] = _Collection(self._dir(collection_name))
+            return self._collections[collection_name]
+
+    # --- Collections ---
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(self._dir(collection_name), "points.sqlite"))
+
+    def create_collection(self, collection_name: str, vectors_config: models.VectorParams, **kwargs) -> bool:
+        """Creates a collection. HNSW, quantization and on-disk settings do not apply and are ignored."""
+        if vectors_config.distance != models.Distance.COSINE:
+            raise ValueError("The mmap store only supports cosine distance.")
+        with self._lock:
+            if self.collection_exists(collection_name):
+                raise ValueError(f"Collection {collection_name} already exists")
+            self._collections[collection_name] = _Collection.create(
+                self._dir(collection_name), vectors_config.size, self.dtype
+            )
+        return True
+
+    def delete_collection(self, collection_name: str) -> bool:
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            if not os.path.exists(self._dir(collection_name)):
+                return False
+            shutil.rmtree(self._dir(collection_name))
+        return True
+
+    def get_aliases(self) -> models.CollectionsAliasesResponse:
+        return models.CollectionsAliasesResponse(aliases=[])
+
+    def count(self, collection_name: str, exact: bool = True, **kwargs) -> models.CountResult:
+        with self._lock:
+            collection = self._get(collection_name)
+            return models.CountResult(count=collection.conn.execute("SELECT COUNT(*) FROM points").fetchone()[0])
+
+    # --- Points ---
+
+    def upsert(self, collection_name: str, points: Union[List[models.PointStruct], models.Batch],
+               wait: bool = True, **kwargs) -> models.UpdateResult:
+        if isinstance(points, models.Batch):
+            ids, vectors = points.ids, points.vectors
+            payloads = points.payloads or [{} for _ in ids]
+        else:
+            ids = [point.id for point in points]
+            vectors = [point.vector for point in points]
+            payloads = [point.payload or {} for point in points]
+        if ids:
+            with self._lock:
+                self._get(collection_name).upsert([str(point_id) for point_id in ids], np.asarray(vectors), payloads)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs) -> models.UpdateResult:
+        with self._lock:
+            collection = self._get(collection_name)
+            if isinstance(points_selector, models.FilterSelector):
+                slots = collection.filter_slots(points_selector.filter)
+                if slots is None:
+                    slots = [slot for slot, in collection.conn.execute("SELECT slot FROM points").fetchall()]
+            else:
+                ids = [str(point_id) for point_id in points_selector.points]
+                slots = [slot for slot, in collection.conn.execute(
+                    f"SELECT slot FROM points WHERE id IN ({','.join('?' * len(ids))})", ids
+                ).fetchall()] if ids else []
+            collection.delete([int(slot) for slot in slots])
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def _records(self, collection: _Collection, rows, with_payload, with_vectors) -> List[models.Record]:
+        return [
+            models.Record(id=_point_id(point_id), payload=_project(json.loads(payload), with_payload),
+                          vector=collection.vectors[slot].astype(np.float32).tolist() if with_vectors else None)
+            for point_id, slot, payload in rows
+        ]
+
+    def retrieve(self, collection_name: str, ids: List[Union[str, int]], with_payload=True,
+                 with_vectors: bool = False, **kwargs) -> List[models.Record]:
+        ids = [str(point_id) for point_id in ids]
+        if not ids:
+            return []
+        with self._lock:
+            collection = self._get(collection_name)
+            collection.slots()
+            rows = collection.conn.execute(
+                f"SELECT id, slot, payload FROM points WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+            return self._records(collection, rows, with_payload, with_vectors)
+
+    def scroll(self, collection_name: str, scroll_filter: Optional[models.Filter] = None, limit: int = 10,
+               offset: Optional[int] = None, with_payload=True, with_vectors: bool = False,
+               **kwargs) -> Tuple[List[models.Record], Optional[int]]:
+        """Pages through points in slot order; the returned offset is the next page's first slot."""
+        with self._lock:
+            collection = self._get(collection_name)
+            collection.slots()
+            clause, params = collection.filter_clause(scroll_filter)
+            rows = collection.conn.execute(
+                f"SELECT id, slot, payload FROM points WHERE slot >= ? {'AND ' + clause if clause else ''} "
+                "ORDER BY slot LIMIT ?", (offset or 0, *params, limit + 1)
+            ).fetchall()
+            next_offset = rows[limit][1] if len(rows) > limit else None
+            return self._records(collection, rows[:limit], with_payload, with_vectors), next_offset
+
+    # --- Search ---
+
+    def _search(self, collection: _Collection, queries: List[List[float]], query_filter: Optional[models.Filter],
+                limit: int, offset: int, score_threshold: Optional[float], with_payload) -> List[models.QueryResponse]:
+        offset = offset or 0
+        candidates = collection.filter_slots(query_filter)
+        slots, scores = collection.top_k(np.asarray(queries, dtype=np.float32), limit + offset, candidates)
+        slots, scores = slots[:, offset:], scores[:, offset:]
+        points = collection.points_by_slot(np.unique(slots[np.isfinite(scores)]))
+        responses = []
+        for row_slots, row_scores in zip(slots, scores):
+            hits = []
+            for slot, score in zip(row_slots, row_scores):
+                if not np.isfinite(score) or (score_threshold is not None and score < score_threshold):
+                    break
+                if int(slot) not in points:
+                    continue
+                point_id, payload = points[int(slot)]
+                hits.append(models.ScoredPoint(id=point_id, version=0, score=float(score),
+                                               payload=_project(payload, with_payload)))
+            responses.append(models.QueryResponse(points=hits))
+        return responses
+
+    def query_points(self, collection_name: str, query: List[float], query_filter: Optional[models.Filter] = None,
+                     limit: int = 10, offset: Optional[int] = None, score_threshold: Optional[float] = None,
+                     with_payload=True, search_params=None, **kwargs) -> models.QueryResponse:
+        with self._lock:
+            collection = self._get(collection_name)
+            return self._search(collection, [query], query_filter, limit, offset, score_threshold, with_payload)[0]
+
+    def query_batch_points(self, collection_name: str, requests: List[models.QueryRequest],
+                           **kwargs) -> List[models.QueryResponse]:
+        """
+        Answers many queries. Requests that share a filter, limit, offset and threshold (the
+        common case for a micro-batch) are scored together in one pass over the vectors.
+        """
+        responses: List[Optional[models.QueryResponse]] = [None] * len(requests)
+        groups: Dict[Tuple, List[int]] = {}
+        for i, request in enumerate(requests):
+            key = (request.filter.model_dump_json() if request.filter else None, request.limit or 10,
+                   request.offset or 0, request.score_threshold, json.dumps(
+                       request.with_payload.model_dump() if isinstance(request.with_payload, models.PayloadSelectorInclude)
+                       else request.with_payload))
+            groups.setdefault(key, []).append(i)
+        with self._lock:
+            collection = self._get(collection_name)
+            for indices in groups.values():
+                first = requests[indices[0]]
+                group_responses = self._search(collection, [requests[i].query for i in indices], first.filter,
+                                               first.limit or 10, first.offset, first.score_threshold,
+                                               True if first.with_payload is None else first.with_payload)
+                for i, response in zip(indices, group_responses):
+                    responses[i] = response
+        return responses
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
@@ -1,78 +1,262 @@
+import glob
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-#from langchain_huggingface import HuggingFaceInferenceAPIEmbeddings
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Tuple
 
+from src import answer_cache
+from src import checkpoint
 from src import config
+from src import embeddings
+from src import ingestion
+from src import manifest
+from src import sparse_index
 from src import vector_db
 
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Returns the splitter used for every document, recording each chunk's offset in its page."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=config.CHUNK_SIZE,
+        chunk_overlap=config.CHUNK_OVERLAP,
+        add_start_index=True
+    )
+
+def iter_pdf_paths(path: str) -> List[str]:
+    """
+    Resolves a single file, a directory or a glob pattern into a sorted list of PDF paths,
+    normalized so that each document has one identity across runs.
+    """
+    if os.path.isdir(path):
+        paths = glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True)
+    elif glob.has_magic(path):
+        paths = [p for p in glob.glob(path, recursive=True) if p.lower().endswith(".pdf")]
+    else:
+        paths = [path]
+    return sorted({manifest.normalize_source(p) for p in paths})
+
+def extract_pages(file_path: str) -> List[Document]:
+    """
+    Parses one PDF into page documents. Runs inside a worker process.
+    """
+    return list(PyPDFLoader(file_path).lazy_load())
+
+def iter_loaded_pdfs(paths: Iterable[str], workers: int = None) -> Iterator[Tuple[str, List[Document]]]:
+    """
+    Parses PDFs in a process pool and yields (path, pages) in input order.
+    Only a bounded number of files is parsed ahead of the consumer, so memory stays flat.
+    """
+    workers = workers or config.INGEST_WORKERS
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(extract_pages, path)))
+            if len(pending) >= workers * 2:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+def iter_page_chunks(pages: Iterable[Document], text_splitter: RecursiveCharacterTextSplitter = None) -> Iterator[Document]:
+    """
+    Splits pages into chunks one page at a time, tagging each chunk with its source file,
+    page number and character offset within the page.
+    """
+    text_splitter = text_splitter or get_text_splitter()
+    for page in pages:
+        for chunk in text_splitter.split_documents([page]):
+            chunk.metadata["file_name"] = os.path.basename(str(chunk.metadata.get("source", "")))
+            chunk.metadata.setdefault("page", 0)
+            yield chunk
+
 def load_and_chunk_pdf(file_path: str) -> List:
     """
     Loads a PDF from the given path and splits it into chunks.
-    
+
     Args:
         file_path (str): The path to the PDF file.
-        
+
     Returns:
         List: A list of document chunks.
     """
     print(f"Loading and chunking PDF from: {file_path}")
     loader = PyPDFLoader(file_path)
-    pages = loader.load()
-    
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50
-    )
-    
-    chunks = text_splitter.split_documents(pages)
+
+    chunks = list(iter_page_chunks(loader.lazy_load()))
     print(f"PDF split into {len(chunks)} chunks.")
     return chunks
 
-def process_and_store_pdf():
+def process_and_store_pdfs(path: str = None, force: bool = False, workers: int = None, resume: bool = True) -> Dict:
     """
-    The main function to run the PDF processing and storage pipeline.
+    Ingests every PDF matched by a file path, directory or glob pattern.
+
+    Unchanged files are skipped using the manifest. The remaining files are parsed in a
+    process pool, and their new or changed chunks stream through the embed and upsert
+    stages as one continuous pipeline, so batches span documents and memory stays flat.
+
+    The run is a resumable job. Every stored batch and every completed document is logged to
+    a checkpoint (`config.INGEST_CHECKPOINT_PATH`) as it happens. If the run is interrupted,
+    running the same job again skips the completed documents and re-embeds none of the stored
+    chunks. The checkpoint is deleted once the manifest and the lexical index are saved.
+
+    Args:
+        path (str, optional): A PDF, a directory of PDFs or a glob. Defaults to `config.PDF_PATH`.
+        force (bool): Re-check every chunk even if the file hash is unchanged.
+        workers (int, optional): Number of PDF parsing processes.
+        resume (bool): Continue from the checkpoint of an interrupted run of the same job.
+            If False, the job starts over.
+
+    Returns:
+        Dict: Counts of documents and of added, unchanged and deleted chunks, and the run's throughput.
     """
     print("--- Starting PDF Ingestion Pipeline ---")
-    
+    started_at = time.perf_counter()
+    paths = iter_pdf_paths(path or config.PDF_PATH)
+    print(f"Found {len(paths)} PDF file(s).")
+
     # 1. Initialize Qdrant Client and create collection
-    qdrant_client = vector_db.get_qdrant_client()
+    qdrant_client = vector_db.get_shared_client()
     vector_db.create_collection_if_not_exists(qdrant_client)
-    
-    # 2. Load and chunk the PDF document
-    doc_chunks = load_and_chunk_pdf(config.PDF_PATH)
-    
-    # 3. Initialize the embedding model
-    embeddings_model = HuggingFaceEndpointEmbeddings(
-        huggingfacehub_api_token=config.HUGGINGFACEHUB_API_TOKEN,
-        model=config.EMBEDDING_MODEL_NAME
-    )
-    
-    # 4. Generate embeddings for each chunk and store them in the document metadata
-    print("Generating embeddings for document chunks...")
-    for chunk in doc_chunks:
-        # The embedding is stored in metadata to be easily passed to Qdrant
-        chunk.metadata['embedding'] = embeddings_model.embed_query(chunk.page_content)
-    
-    # 5. Upsert the documents with their embeddings into Qdrant
-    vector_db.upsert_documents(qdrant_client, doc_chunks)
-    
+
+    # 2. Open the job's checkpoint and re-apply what an interrupted run already committed.
+    #    The lexical index is updated alongside the collection, keyed by the same point IDs.
+    ingest_manifest = manifest.load_manifest()
+    document_hashes = {file_path: manifest.file_hash(file_path) for file_path in paths}
+    job = checkpoint.IngestCheckpoint.open(checkpoint.job_id(document_hashes, force), resume=resume)
+    lexical_index = sparse_index.get_sparse_index()
+    resumed = job.resumed
+    if resumed:
+        restored = checkpoint.restore_documents(job, qdrant_client, ingest_manifest, lexical_index)
+        print(f"Resuming an interrupted ingestion. {job}; {restored} chunks restored to the lexical index.")
+
+    # 3. Skip documents that have not changed since the last run, or that the job already completed
+    changed_paths = []
+    stats = {"documents": len(paths), "skipped_documents": 0, "resumed_documents": 0,
+             "added": 0, "unchanged": 0, "deleted": 0}
+    for file_path in paths:
+        entry = manifest.get_document_entry(ingest_manifest, file_path) or {}
+        if job.is_complete(file_path):
+            stats["resumed_documents"] += 1
+            stats["unchanged"] += len(entry["point_ids"])
+        elif not force and entry.get("document_hash") == document_hashes[file_path]:
+            stats["skipped_documents"] += 1
+            stats["unchanged"] += len(entry["point_ids"])
+        else:
+            changed_paths.append(file_path)
+    print(f"{stats['skipped_documents']} unchanged file(s) skipped, {stats['resumed_documents']} completed "
+          f"before the interruption, {len(changed_paths)} to process.")
+
+    # A document is complete once all of its new chunks are stored; these track what is still pending
+    lock = threading.Lock()
+    pending: Dict[str, set] = {}
+    owners: Dict[str, str] = {}
+    completions: Dict[str, Tuple[Dict, set]] = {}
+    stored = {"chunks": 0, "documents": 0}
+
+    def complete(file_path: str, entry: Dict, stale_ids: set):
+        # The old content is only dropped once the new content is stored, so a failure part-way
+        # through leaves the previous version searchable
+        with vector_db.serialized(qdrant_client):
+            vector_db.delete_points(qdrant_client, stale_ids)
+        lexical_index.remove(stale_ids)
+        job.record_document(file_path, entry, stale_ids)
+        with lock:
+            stored["documents"] += 1
+
+    def on_upsert(points):
+        point_ids = [str(point.id) for point in points]
+        job.record_batch(point_ids)
+        finished = []
+        with lock:
+            stored["chunks"] += len(point_ids)
+            for point_id in point_ids:
+                file_path = owners.pop(point_id, None)
+                if file_path is not None:
+                    pending[file_path].discard(point_id)
+                    if not pending[file_path]:
+                        del pending[file_path]
+                        finished.append(file_path)
+        for file_path in finished:
+            complete(file_path, *completions.pop(file_path))
+        if job.batches % 10 == 0:
+            elapsed = time.perf_counter() - started_at
+            print(f"{job}. This run: {stored['chunks']} chunks in {elapsed:.1f}s "
+                  f"({stored['chunks'] / elapsed:.1f} chunks/s), {stored['documents']}/{len(changed_paths)} documents.")
+
+    # 4. Parse, chunk and diff each changed document, streaming its new chunks onward
+    def new_chunks():
+        for file_path, pages in iter_loaded_pdfs(changed_paths, workers):
+            entry = manifest.get_document_entry(ingest_manifest, file_path) or {}
+            chunks = list(iter_page_chunks(pages))
+            plan = ingestion.plan_document_sync(qdrant_client, chunks, entry.get("point_ids"))
+            print(f"'{file_path}': {len(plan['new_chunks'])} new or changed of {len(chunks)} chunks, "
+                  f"{len(plan['stale_ids'])} stale.")
+            # Not only the new chunks: stored ones may be missing too, e.g. from an interrupted
+            # run whose checkpoint belonged to another job
+            for chunk in chunks:
+                if chunk.metadata["point_id"] not in lexical_index:
+                    lexical_index.add(chunk.metadata["point_id"], chunk.page_content)
+            manifest.set_document_entry(ingest_manifest, file_path, document_hashes[file_path], plan["point_ids"])
+            stats["added"] += len(plan["new_chunks"])
+            stats["unchanged"] += len(chunks) - len(plan["new_chunks"])
+            stats["deleted"] += len(plan["stale_ids"])
+
+            new_ids = {chunk.metadata["point_id"] for chunk in plan["new_chunks"]}
+            entry = manifest.get_document_entry(ingest_manifest, file_path)
+            if new_ids:
+                with lock:
+                    pending[file_path] = new_ids
+                    owners.update((point_id, file_path) for point_id in new_ids)
+                    completions[file_path] = (entry, plan["stale_ids"])
+            else:
+                complete(file_path, entry, plan["stale_ids"])
+            yield from plan["new_chunks"]
+
+    # 5. Embed and upsert through bounded queues, checkpointing every stored batch
+    embeddings_model = embeddings.get_embeddings_model()
+    try:
+        ingestion.embed_and_upsert(qdrant_client, embeddings_model, new_chunks(),
+                                   progress=ingestion.IngestionProgress(), on_upsert=on_upsert)
+    except BaseException as e:
+        job.close()
+        print(f"Ingestion stopped ({e!r}). {job}; run it again to resume.")
+        if stored["chunks"] or stored["documents"]:
+            answer_cache.invalidate(route="rag")
+        raise
+
+    # 6. Record what is now stored, only once every chunk has been written
+    manifest.save_manifest(ingest_manifest)
+    lexical_index.save()
+    job.finish()
+
+    # 7. Answers built from the old document content are no longer trustworthy
+    if stats["added"] or stats["deleted"] or resumed:
+        answer_cache.invalidate(route="rag")
+
+    stats["elapsed_s"] = time.perf_counter() - started_at
+    stats["chunks_per_s"] = stored["chunks"] / stats["elapsed_s"] if stats["elapsed_s"] > 0 else 0.0
+    print(f"Added {stats['added']}, unchanged {stats['unchanged']}, deleted {stats['deleted']} chunks "
+          f"in {stats['elapsed_s']:.1f}s ({stats['chunks_per_s']:.1f} chunks/s).")
     print("--- PDF Ingestion Pipeline Finished ---")
+    return stats
+
+def process_and_store_pdf(file_path: str = None, force: bool = False, resume: bool = True) -> Dict:
+    """
+    The main function to run the PDF processing and storage pipeline for a single PDF.
+    Re-runs are incremental: an unchanged file is skipped entirely, and for a changed
+    file only new or edited chunks are embedded while stale points are deleted.
+
+    Args:
+        file_path (str, optional): The PDF to ingest. Defaults to `config.PDF_PATH`.
+        force (bool): Re-check every chunk even if the file hash is unchanged.
+        resume (bool): Continue from the checkpoint of an interrupted run.
 
-    ## 4. Generate embeddings for each chunk and store them in the document metadata
-    #print("Generating embeddings for document chunks...")
-    ## Get all page contents at once for efficiency
-    #all_page_contents = [chunk.page_content for chunk in doc_chunks]
-    #
-    ## Embed all chunks in a single batch call
-    #all_embeddings = embeddings_model.embed_documents(all_page_contents)
-    #
-    ## Assign the generated embeddings back to each chunk
-    #for i, chunk in enumerate(doc_chunks):
-    #    chunk.metadata['embedding'] = all_embeddings[i]
-    #
-    ## 5. Upsert the documents with their embeddings into Qdrant
-    #vector_db.upsert_documents(qdrant_client, doc_chunks)
-    #
-    #print("--- PDF Ingestion Pipeline Finished ---")
\ No newline at end of file
+    Returns:
+        Dict: Counts of added, unchanged and deleted chunks.
+    """
+    return process_and_store_pdfs(file_path or config.PDF_PATH, force=force, workers=1, resume=resume)
@@ -0,0 +1,149 @@
+import argparse
+import json
+import math
+import time
+from typing import Dict, List
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from src import config
+from src import vector_db
+from src.embeddings import normalize_rows
+from src.metrics import percentile
+
+
+def estimate_memory(profile: str, points: int, dimension: int = None) -> Dict[str, int]:
+    """
+    Estimates the RAM and disk a profile needs for `points` vectors (payloads not included).
+
+    Full vectors take 4 bytes per dimension, scalar-quantized ones 1 byte and binary ones 1 bit.
+    The HNSW graph keeps about 2 * m links of 4 bytes per point on its bottom layer. Whatever a
+    profile puts on disk is counted as disk instead of RAM; quantized vectors always stay in RAM.
+    """
+    settings = vector_db.get_profile(profile)
+    dimension = dimension or config.EMBEDDING_MODEL_DIMENSION
+    on_disk = settings.get("on_disk", False)
+    full = points * dimension * 4
+    graph = points * 2 * settings.get("hnsw_m", 16) * 4
+    quantized = {"scalar": points * dimension, "binary": points * math.ceil(dimension / 8)}.get(
+        settings.get("quantization"), 0
+    )
+    ram = quantized + (0 if on_disk else full + graph)
+    disk = full + graph + quantized
+    return {"ram_bytes": ram, "disk_bytes": disk}
+
+
+def make_dataset(points: int, queries: int, dimension: int, clusters: int = 64, seed: int = 0):
+    """Builds clustered unit vectors, which resemble real embeddings more than uniform noise does."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+
+    def sample(n):
+        vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dimension)).astype(np.float32)
+        return normalize_rows(vectors)
+
+    return sample(points), sample(queries)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """Brute-force ground truth: the IDs of the k most similar corpus vectors for each query."""
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def wait_until_indexed(client: QdrantClient, collection_name: str, timeout: float = 600.0):
+    """Waits for a server to finish building indexes, so latencies reflect the final layout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    print(f"Warning: '{collection_name}' was still optimizing after {timeout:.0f} s.")
+
+
+def benchmark_profile(client: QdrantClient, profile: str, corpus: np.ndarray, queries: np.ndarray,
+                      truth: List[set], k: int = 10, batch_size: int = 1024) -> Dict:
+    """
+    Loads the corpus into a scratch collection with the given profile and measures recall@k
+    and per-query latency against the exact ground truth.
+    """
+    collection_name = f"profile_benchmark__{profile}"
+    if client.collection_exists(collection_name=collection_name):
+        client.delete_collection(collection_name=collection_name)
+    client.create_collection(collection_name=collection_name,
+                             **vector_db.collection_settings(profile, dimension=corpus.shape[1]))
+
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), batch_size):
+        batch = corpus[offset:offset + batch_size]
+        client.upsert(collection_name=collection_name, wait=True, points=models.Batch(
+            ids=list(range(offset, offset + len(batch))), vectors=batch.tolist()
+        ))
+    if not vector_db.is_local_client(client):
+        wait_until_indexed(client, collection_name)
+    load_seconds = time.perf_counter() - start
+
+    params = vector_db.search_params(client, profile)
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        points = client.query_points(collection_name=collection_name, query=query.tolist(), limit=k,
+                                     search_params=params).points
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({point.id for point in points} & expected) / k)
+
+    client.delete_collection(collection_name=collection_name)
+    memory = estimate_memory(profile, len(corpus), corpus.shape[1])
+    return {
+        "profile": profile,
+        f"recall@{k}": float(np.mean(recalls)),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "load_seconds": load_seconds,
+        "ram_mb": memory["ram_bytes"] / 2**20,
+        "disk_mb": memory["disk_bytes"] / 2**20,
+    }
+
+
+def run_benchmark(client: QdrantClient, profiles: List[str] = None, points: int = 20000, queries: int = 200,
+                  dimension: int = None, k: int = 10) -> List[Dict]:
+    """Benchmarks every profile on the same synthetic dataset."""
+    profiles = profiles or list(config.COLLECTION_PROFILES)
+    dimension = dimension or config.EMBEDDING_MODEL_DIMENSION
+    if vector_db.is_local_client(client):
+        print("Note: local mode always searches exactly, so every profile reports the same recall. "
+              "Set QDRANT_URL to benchmark the profiles on a Qdrant server.")
+    corpus, query_vectors = make_dataset(points, queries, dimension)
+    truth = exact_top_k(corpus, query_vectors, k)
+    return [benchmark_profile(client, profile, corpus, query_vectors, truth, k) for profile in profiles]
+
+
+def format_results(results: List[Dict]) -> str:
+    recall_key = next(key for key in results[0] if key.startswith("recall@"))
+    lines = [f"{'profile':<10} {recall_key:>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RAM MB':>9} {'disk MB':>9}"]
+    for r in results:
+        lines.append(f"{r['profile']:<10} {r[recall_key]:>10.3f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                     f"{r['p99_ms']:>8.2f} {r['ram_mb']:>9.1f} {r['disk_mb']:>9.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall@k, latency and memory of collection profiles.")
+    parser.add_argument("--profiles", nargs="*", default=None)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=config.QDRANT_URL, api_key=config.QDRANT_API_KEY) if config.QDRANT_URL \
+        else QdrantClient(":memory:")
+    results = run_benchmark(client, args.profiles, args.points, args.queries, k=args.k)
+    print(json.dumps(results, indent=2) if args.json else format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+# Process-wide store of heavy, reusable objects (clients, models, chains).
+# Each object is built lazily on first use and then shared by every caller.
+_lock = threading.RLock()
+_instances: Dict[str, Any] = {}
+_closers: Dict[str, Callable[[Any], None]] = {}
+
+
+def get_or_create(name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], None]] = None) -> Any:
+    """
+    Returns the shared object registered under `name`, building it with `factory` on first use.
+
+    Args:
+        name (str): The registry key of the object.
+        factory (Callable): Builds the object. Called at most once per key until `shutdown`.
+        close (Callable, optional): Releases the object's resources on `shutdown`.
+
+    Returns:
+        Any: The shared instance.
+    """
+    # Fast path without taking the lock once the object exists
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            instance = factory()
+            _instances[name] = instance
+            if close is not None:
+                _closers[name] = close
+        return instance
+
+
+def override(name: str, instance: Any):
+    """
+    Replaces the shared object under `name`, e.g. with a fake in tests or benchmarks.
+    """
+    with _lock:
+        _instances[name] = instance
+        _closers.pop(name, None)
+
+
+def is_initialized(name: str) -> bool:
+    """Returns True if the object under `name` has already been built."""
+    return name in _instances
+
+
+def warmup():
+    """
+    Builds all heavy objects up front so the first request does not pay their setup cost.
+    """
+    # Imported here to avoid circular imports: these modules use the registry themselves
+    from src import agent, embeddings, llm_utils, tool, vector_db
+
+    print("--- Warming up shared clients ---")
+    vector_db.get_shared_client()
+    embeddings.get_embeddings_model()
+    tool.get_weather_wrapper()
+    llm_utils.get_decider_chain()
+    llm_utils.get_processing_chain()
+    agent.build_app()
+    agent.build_async_app()
+    print(f"Shared clients ready: {sorted(_instances)}")
+
+
+def shutdown():
+    """
+    Closes every shared object that registered a close hook and empties the registry.
+    Objects are closed newest first, so e.g. a batcher drains before the client it uses closes.
+    The next `get_or_create` call rebuilds the object from scratch.
+    """
+    with _lock:
+        for name, close in reversed(list(_closers.items())):
+            try:
+                close(_instances[name])
+            except Exception as e:
+                print(f"Error closing '{name}': {e}")
+        _instances.clear()
+        _closers.clear()
@@ -0,0 +1,232 @@
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src import config
+from src import embeddings
+from src import llm_utils
+from src import metrics
+from src import registry
+
+# --- Rule Tier: keywords and a city gazetteer ---
+
+WEATHER_KEYWORDS = {
+    "weather", "temperature", "temp", "forecast", "climate", "rain", "raining", "rainy", "sunny",
+    "cloudy", "humidity", "humid", "wind", "windy", "snow", "storm", "hot", "cold", "degrees",
+    "celsius", "fahrenheit", "umbrella", "monsoon", "heat", "precipitation",
+}
+
+RAG_KEYWORDS = {
+    "avdeep", "resume", "cv", "experience", "experiences", "skill", "skills", "project", "projects",
+    "education", "degree", "university", "college", "job", "role", "roles", "work", "worked",
+    "company", "companies", "internship", "certification", "certifications", "achievements",
+    "background", "qualification", "qualifications", "he", "his", "him", "candidate", "profile",
+}
+
+CITY_GAZETTEER = {
+    "delhi", "new delhi", "mumbai", "bangalore", "bengaluru", "chennai", "kolkata", "hyderabad",
+    "pune", "ahmedabad", "jaipur", "lucknow", "chandigarh", "noida", "gurgaon", "gurugram",
+    "amritsar", "ludhiana", "indore", "bhopal", "surat", "nagpur", "kochi", "goa", "patna",
+    "london", "paris", "new york", "tokyo", "berlin", "sydney", "dubai", "singapore", "toronto",
+    "san francisco", "los angeles", "chicago", "moscow", "beijing", "shanghai", "hong kong",
+    "madrid", "rome", "amsterdam", "bangkok", "seoul", "istanbul", "cairo", "nairobi", "lagos",
+}
+
+# Labeled example questions for the optional embedding-similarity tier
+PROTOTYPES = {
+    "weather": [
+        "What is the weather in Delhi?",
+        "Will it rain in London tomorrow?",
+        "Current temperature in Mumbai",
+        "How hot is it in Dubai right now?",
+    ],
+    "rag": [
+        "Tell me about Avdeep's experience",
+        "What skills does Avdeep have?",
+        "Summarize the resume in two lines",
+        "Which projects has he worked on?",
+    ],
+}
+
+
+@dataclass
+class RoutingDecision:
+    """The chosen route, how confident the deciding tier was, and the latency of every tier tried."""
+    route: str
+    confidence: float
+    tier: str
+    latencies_ms: Dict[str, float] = field(default_factory=dict)
+
+
+# Per-tier counters of decisions and total latency, reported by `get_stats`
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _record(decision: RoutingDecision):
+    with _stats_lock:
+        for tier, latency in decision.latencies_ms.items():
+            tier_stats = _stats.setdefault(tier, {"calls": 0, "decisions": 0, "total_ms": 0.0})
+            tier_stats["calls"] += 1
+            tier_stats["total_ms"] += latency
+        _stats[decision.tier]["decisions"] += 1
+    metrics.increment("route_decisions_total", tier=decision.tier, route=decision.route)
+    print(f"Routing decision: '{decision.route}' by {decision.tier} tier "
+          f"(confidence {decision.confidence:.2f}, latency "
+          + ", ".join(f"{tier} {ms:.2f} ms" for tier, ms in decision.latencies_ms.items()) + ")")
+
+
+def get_stats() -> Dict[str, Dict[str, float]]:
+    """Returns, per tier, how often it ran, how often it decided and its mean latency."""
+    with _stats_lock:
+        return {
+            tier: {**s, "mean_ms": s["total_ms"] / s["calls"] if s["calls"] else 0.0}
+            for tier, s in _stats.items()
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def classify_with_rules(question: str) -> Tuple[Optional[str], float]:
+    """
+    Classifies a question with keyword and gazetteer rules.
+
+    Returns:
+        Tuple[Optional[str], float]: The route ('weather' or 'rag'), or None if no rule matched,
+        and a confidence between 0 and 1.
+    """
+    text = re.sub(r"[^\w\s']", " ", question.lower())
+    text = re.sub(r"'s\b", "", text)
+    normalized = " ".join(text.split())
+    words = normalized.split()
+
+    # A bare city name (the UI suggests typing e.g. 'Delhi') is a weather request
+    if normalized in CITY_GAZETTEER:
+        return "weather", 0.95
+
+    weather_hits = sum(word in WEATHER_KEYWORDS for word in words)
+    rag_hits = sum(word in RAG_KEYWORDS for word in words)
+    padded = f" {normalized} "
+    if any(f" {city} " in padded for city in CITY_GAZETTEER):
+        weather_hits += 1
+
+    if weather_hits == rag_hits:
+        return None, 0.0
+    route = "weather" if weather_hits > rag_hits else "rag"
+    winner, loser = max(weather_hits, rag_hits), min(weather_hits, rag_hits)
+    if loser == 0:
+        return route, 0.9 if winner >= 2 else 0.8
+    return route, 0.5 + 0.4 * (winner - loser) / (winner + loser)
+
+
+def _get_prototype_matrix() -> Tuple[List[str], np.ndarray]:
+    """Embeds the labeled prototypes once and returns their labels and unit-length matrix."""
+    def build():
+        labels, texts = [], []
+        for label, examples in PROTOTYPES.items():
+            labels.extend([label] * len(examples))
+            texts.extend(examples)
+        matrix = np.array(embeddings.get_embeddings_model().embed_documents(texts), dtype=np.float32)
+        return labels, matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    return registry.get_or_create("router_prototypes", build)
+
+
+def classify_with_prototypes(query_embedding: List[float]) -> Tuple[str, float]:
+    """
+    Classifies a question by cosine similarity of its embedding to the labeled prototypes.
+    Confidence grows with the margin between the best match of each route.
+    """
+    labels, matrix = _get_prototype_matrix()
+    query = np.asarray(query_embedding, dtype=np.float32)
+    scores = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+    best = {label: max(s for l, s in zip(labels, scores) if l == label) for label in PROTOTYPES}
+    route = max(best, key=best.get)
+    runner_up = min(best.values())
+    return route, float(min(1.0, 0.5 + 2.0 * (best[route] - runner_up)))
+
+
+def parse_llm_decision(result: str) -> str:
+    """Maps the decider LLM's free-text answer onto a route."""
+    return "weather" if "weather" in result.lower() else "rag"
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def needs_decider(question: str, threshold: float = None) -> bool:
+    """True when the rules are not confident, i.e. routing will fall through to a slower tier."""
+    threshold = config.ROUTER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    label, confidence = classify_with_rules(question)
+    return label is None or confidence < threshold
+
+
+def _rules_decision(question: str, threshold: float, latencies: Dict[str, float]) -> Optional[RoutingDecision]:
+    (label, confidence), latencies["rules"] = _timed(classify_with_rules, question)
+    if label is not None and confidence >= threshold:
+        return RoutingDecision(label, confidence, "rules", latencies)
+    return None
+
+def _prototypes_decision(query_embedding: List[float], threshold: float, latencies: Dict[str, float],
+                         start: float) -> Optional[RoutingDecision]:
+    label, confidence = classify_with_prototypes(query_embedding)
+    latencies["prototypes"] = (time.perf_counter() - start) * 1000
+    if confidence >= threshold:
+        return RoutingDecision(label, confidence, "prototypes", latencies)
+    return None
+
+def _llm_decision(question: str, result: str, latencies: Dict[str, float], start: float) -> RoutingDecision:
+    latencies["llm"] = (time.perf_counter() - start) * 1000
+    llm_utils.count_tokens("decider", question, result)
+    return RoutingDecision(parse_llm_decision(result), 1.0, "llm", latencies)
+
+
+def route(question: str, threshold: float = None) -> RoutingDecision:
+    """
+    Routes a question through the tiers, cheapest first, stopping at the first confident answer:
+    rules, then (if enabled) embedding similarity to prototypes, then the LLM decider.
+    """
+    threshold = config.ROUTER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    latencies = {}
+
+    decision = _rules_decision(question, threshold, latencies)
+    if decision is None and config.ROUTER_USE_PROTOTYPES:
+        start = time.perf_counter()
+        query_embedding = embeddings.get_embeddings_model().embed_query(question)
+        decision = _prototypes_decision(query_embedding, threshold, latencies, start)
+    if decision is None:
+        start = time.perf_counter()
+        with metrics.timer("llm_seconds", chain="decider"):
+            result = llm_utils.get_decider_chain().invoke({"question": question})
+        decision = _llm_decision(question, result, latencies, start)
+    _record(decision)
+    return decision
+
+
+async def aroute(question: str, threshold: float = None) -> RoutingDecision:
+    """Async version of `route`; only the embedding and LLM tiers actually await."""
+    threshold = config.ROUTER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    latencies = {}
+
+    decision = _rules_decision(question, threshold, latencies)
+    if decision is None and config.ROUTER_USE_PROTOTYPES:
+        start = time.perf_counter()
+        query_embedding = await embeddings.get_embeddings_model().aembed_query(question)
+        decision = _prototypes_decision(query_embedding, threshold, latencies, start)
+    if decision is None:
+        start = time.perf_counter()
+        with metrics.timer("llm_seconds", chain="decider"):
+            result = await llm_utils.get_decider_chain().ainvoke({"question": question})
+        decision = _llm_decision(question, result, latencies, start)
+    _record(decision)
+    return decision
@@ -0,0 +1,163 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+from src import agent
+from src import config
+from src import metrics
+from src import registry
+from src import tool
+
+
+class AgentServer(ThreadingHTTPServer):
+    """
+    Serves the agent over HTTP.
+
+    Each connection gets a lightweight handler thread; the agent itself runs on a fixed pool of
+    `workers`. At most `workers + queue_size` requests are admitted at once, and anything beyond
+    that is rejected with 503 straight away instead of piling up (backpressure). A request that
+    does not finish within `timeout` seconds is answered with 504.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], workers: int = None, queue_size: int = None,
+                 timeout: float = None):
+        super().__init__(address, AgentRequestHandler)
+        self.workers = workers or config.SERVER_WORKERS
+        self.capacity = self.workers + (config.SERVER_QUEUE_SIZE if queue_size is None else queue_size)
+        self.request_timeout = config.SERVER_REQUEST_TIMEOUT_SECONDS if timeout is None else timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent")
+        self.stats = {"requests": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def health(self) -> Dict:
+        with self._lock:
+            return {"status": "ok", "in_flight": self._in_flight, "capacity": self.capacity,
+                    "workers": self.workers, **self.stats}
+
+    def answer(self, question: str) -> Tuple[int, Dict]:
+        """Runs the agent on one question and returns the HTTP status and response body."""
+        if not self._slots.acquire(blocking=False):
+            self.count("rejected")
+            return 503, {"error": "Server is at capacity, retry later."}
+        with self._lock:
+            self._in_flight += 1
+        start = time.perf_counter()
+        future = None
+        try:
+            future = self.executor.submit(agent.ask, question)
+            final_state = future.result(timeout=self.request_timeout)
+            return 200, {
+                "answer": final_state["answer"],
+                "route": final_state.get("route"),
+                "cached": final_state.get("cached", False),
+                "latency_ms": (time.perf_counter() - start) * 1000,
+            }
+        except TimeoutError:
+            # The worker keeps running to completion; only the response is abandoned
+            self.count("timeouts")
+            return 504, {"error": f"Request timed out after {self.request_timeout:.1f} s."}
+        except Exception as e:
+            self.count("errors")
+            return 500, {"error": str(e)}
+        finally:
+            metrics.observe("server_request_seconds", time.perf_counter() - start)
+            with self._lock:
+                self._in_flight -= 1
+            if future is None:
+                self._slots.release()  # e.g. the executor was shut down; nothing runs
+            else:
+                # The slot is held until the agent really finishes, so timed-out work still counts
+                future.add_done_callback(lambda _: self._slots.release())
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health -> server status and counters
+    GET  /metrics -> every local metric in the Prometheus text format
+    POST /ask    -> {"question": "..."} answered with {"answer", "route", "cached", "latency_ms"}
+    """
+    server: AgentServer
+
+    def _send_json(self, status: int, body: Dict):
+        self._send(status, json.dumps(body).encode("utf-8"), "application/json")
+
+    def _send(self, status: int, payload: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.server.health())
+        elif self.path == "/metrics":
+            self._send(200, metrics.export_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "Not found."})
+
+    def do_POST(self):
+        if self.path != "/ask":
+            self._send_json(404, {"error": "Not found."})
+            return
+        self.server.count("requests")
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            question = json.loads(self.rfile.read(length) or b"{}").get("question", "").strip()
+        except (ValueError, AttributeError):
+            self._send_json(400, {"error": "Body must be a JSON object."})
+            return
+        if not question:
+            self._send_json(400, {"error": "Missing 'question'."})
+            return
+        status, body = self.server.answer(question)
+        metrics.increment("server_responses_total", status=status)
+        self._send_json(status, body)
+
+    def log_message(self, format, *args):
+        # One line per request is too noisy under load; errors are still counted in /health
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the agent over HTTP.")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    registry.warmup()
+    server = AgentServer((args.host, args.port), workers=args.workers)
+    print(f"Serving the agent on http://{args.host}:{args.port} with {server.workers} workers "
+          f"(capacity {server.capacity}, timeout {server.request_timeout:.0f} s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if registry.is_initialized("retrieval_batcher"):
+            batcher = tool.get_retrieval_batcher()
+            print(f"Retrieval batches: {batcher.stats['batches']}, mean size {batcher.mean_batch_size:.1f}")
+        registry.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from src import config
+from src import registry
+from src import vector_db
+
+# Keeps tokens such as "c++", "c#", "node.js" and "2021" intact
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "he", "his", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were", "what", "which", "with",
+    "does", "did", "do", "tell", "me", "about", "please", "who", "how",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases the text and splits it into lexical terms, dropping stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    An inverted index over chunk texts, scored with Okapi BM25.
+
+    Each term maps to a posting list of {point_id: term frequency}, so a query only touches the
+    postings of its own terms instead of scanning every chunk. Documents are keyed by their
+    Qdrant point ID, which lets the lexical and dense rankings be fused.
+    """
+
+    def __init__(self, k1: float = None, b: float = None):
+        self.k1 = config.BM25_K1 if k1 is None else k1
+        self.b = config.BM25_B if b is None else b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        # The terms of each chunk, so removing it only touches its own posting lists
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, point_id: str) -> bool:
+        return point_id in self.doc_lengths
+
+    def add(self, point_id: str, text: str):
+        """Indexes one chunk, replacing any earlier version with the same ID."""
+        with self._lock:
+            if point_id in self.doc_lengths:
+                self.remove([point_id])
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[point_id] = tf
+            self.doc_lengths[point_id] = sum(counts.values())
+            self._doc_terms[point_id] = list(counts)
+            self._total_length += self.doc_lengths[point_id]
+
+    def remove(self, point_ids: Iterable[str]):
+        """Drops chunks from the index, e.g. stale points deleted during re-ingestion."""
+        with self._lock:
+            for point_id in point_ids:
+                if point_id not in self.doc_lengths:
+                    continue
+                for term in self._doc_terms.pop(point_id):
+                    posting = self.postings[term]
+                    del posting[point_id]
+                    if not posting:
+                        del self.postings[term]
+                self._total_length -= self.doc_lengths.pop(point_id)
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_lengths) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Scores the chunks that contain at least one query term.
+
+        Returns:
+            List[Tuple[str, float]]: (point_id, BM25 score) pairs, best first.
+        """
+        with self._lock:
+            if not self.doc_lengths:
+                return []
+            average_length = self._total_length / len(self.doc_lengths)
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = self.idf(term)
+                for point_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[point_id] / average_length)
+                    scores[point_id] = scores.get(point_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def save(self, path: str = None):
+        """Writes the index to disk atomically (temporary file, then rename)."""
+        path = path or config.SPARSE_INDEX_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            data = {"k1": self.k1, "b": self.b, "postings": self.postings, "doc_lengths": self.doc_lengths}
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = None) -> "BM25Index":
+        """Reads an index written by `save`, or returns an empty one if there is none yet."""
+        path = path or config.SPARSE_INDEX_PATH
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["k1"], data["b"])
+        index.postings = data["postings"]
+        index.doc_lengths = data["doc_lengths"]
+        index._total_length = sum(index.doc_lengths.values())
+        for term, posting in index.postings.items():
+            for point_id in posting:
+                index._doc_terms.setdefault(point_id, []).append(term)
+        return index
+
+
+def _load_or_rebuild() -> BM25Index:
+    index = BM25Index.load()
+    client = vector_db.get_shared_client()
+    if not len(index) and client.collection_exists(collection_name=config.QDRANT_COLLECTION_NAME):
+        count = rebuild_from_collection(client, index)
+        if count:
+            print(f"Rebuilt the lexical index from {count} stored chunks.")
+    return index
+
+
+def get_sparse_index() -> BM25Index:
+    """
+    Returns the process-wide BM25 index, loading it from disk on first use.
+    If there is no index file but the collection has chunks, the index is rebuilt from them.
+    """
+    return registry.get_or_create("sparse_index", _load_or_rebuild)
+
+
+def rebuild_from_collection(client, index: BM25Index, batch_size: int = 256) -> int:
+    """
+    Re-indexes every chunk stored in the Qdrant collection, e.g. when the index file is missing
+    for a collection that was ingested before the lexical index existed.
+
+    Returns:
+        int: Number of chunks indexed.
+    """
+    count, offset = 0, None
+    while True:
+        with vector_db.serialized(client):
+            records, offset = client.scroll(collection_name=config.QDRANT_COLLECTION_NAME, limit=batch_size,
+                                            offset=offset, with_payload=["page_content"], with_vectors=False)
+        for record in records:
+            index.add(str(record.id), record.payload.get("page_content", ""))
+        count += len(records)
+        if offset is None:
+            return count
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = None) -> List[Tuple[str, float]]:
+    """
+    Merges several rankings of IDs: each ID scores sum(1 / (k + rank)) over the rankings it appears in.
+    Only ranks matter, so dense cosine scores and BM25 scores never need to be put on one scale.
+    """
+    k = config.RRF_K if k is None else k
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,11 +1,83 @@
+import asyncio
+from typing import List
+
 import requests
 from langchain.tools import tool
-#from langchain_huggingface import HuggingFaceInferenceAPIEmbeddings
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_community.utilities import OpenWeatherMapAPIWrapper
+from langchain_core.documents import Document
 
 from src import config
+from src import context
+from src import embeddings
+from src import registry
+from src import sparse_index
 from src import vector_db
+from src.batching import MicroBatcher
+from src.weather_cache import WeatherCache, normalize_city
+
+def get_weather_wrapper() -> OpenWeatherMapAPIWrapper:
+    """Returns the process-wide OpenWeatherMap wrapper, creating it on first use."""
+    return registry.get_or_create(
+        "weather_wrapper",
+        lambda: OpenWeatherMapAPIWrapper(openweathermap_api_key=config.OPENWEATHERMAP_API_KEY)
+    )
+
+def get_weather_cache() -> WeatherCache:
+    """Returns the process-wide weather cache, which calls the shared wrapper on a miss."""
+    return registry.get_or_create(
+        "weather_cache",
+        lambda: WeatherCache(lambda city: get_weather_wrapper().run(city))
+    )
+
+def _to_document(payload: dict) -> Document:
+    return Document(page_content=payload.get("page_content", ""), metadata=payload.get("metadata") or {})
+
+def search_documents(questions: List[str], query_embeddings: List[List[float]]) -> List[List[Document]]:
+    """
+    Retrieves the top chunks for each question, best first, with their metadata (source and
+    position, which context assembly uses to merge neighbours). With hybrid search on, the dense
+    ranking is fused with the BM25 ranking by reciprocal rank fusion.
+    """
+    client = vector_db.get_shared_client()
+    top_k = config.RETRIEVAL_TOP_K
+    hybrid = config.HYBRID_SEARCH_ENABLED
+    with vector_db.serialized(client):
+        dense = vector_db.search_batch(client, query_embeddings, top_k=config.HYBRID_CANDIDATES if hybrid else top_k,
+                                       payload_fields=["page_content", "metadata"])
+    if not hybrid:
+        return [[_to_document(hit.payload) for hit in hits] for hits in dense]
+
+    index = sparse_index.get_sparse_index()
+    results = []
+    for question, hits in zip(questions, dense):
+        lexical = [point_id for point_id, _ in index.search(question, config.HYBRID_CANDIDATES)]
+        fused = [point_id for point_id, _ in sparse_index.reciprocal_rank_fusion([[hit.id for hit in hits], lexical])]
+        fused = fused[:top_k]
+
+        # Chunks found only by the lexical side still need their payload from Qdrant
+        payloads = {hit.id: hit.payload for hit in hits}
+        missing = [point_id for point_id in fused if point_id not in payloads]
+        if missing:
+            with vector_db.serialized(client):
+                records = client.retrieve(collection_name=config.QDRANT_COLLECTION_NAME, ids=missing,
+                                          with_payload=["page_content", "metadata"])
+            payloads.update({str(record.id): record.payload for record in records})
+        results.append([_to_document(payloads[point_id]) for point_id in fused if point_id in payloads])
+    return results
+
+def retrieve_batch(questions: List[str]) -> List[List[Document]]:
+    """Embeds many questions in one call and searches for all of them in one Qdrant request."""
+    query_embeddings = embeddings.get_embeddings_model().embed_documents(questions)
+    return search_documents(questions, query_embeddings)
+
+def get_retrieval_batcher() -> MicroBatcher:
+    """Returns the process-wide batcher that groups concurrent retrievals."""
+    return registry.get_or_create(
+        "retrieval_batcher",
+        lambda: MicroBatcher(retrieve_batch, config.MICRO_BATCH_MAX_SIZE, config.MICRO_BATCH_MAX_WAIT_MS,
+                             name="retrieval-batcher"),
+        close=lambda batcher: batcher.close()
+    )
 
 @tool
 def get_weather_info(city: str) -> str:
@@ -14,16 +86,13 @@ def get_weather_info(city: str) -> str:
     Use this tool when asked about weather, temperature, or climate in a specific location.
     """
     try:
-        # Initialize the wrapper with your API key
-        weather_wrapper = OpenWeatherMapAPIWrapper(
-            openweathermap_api_key=config.OPENWEATHERMAP_API_KEY
-        )
+        # The input may be a whole question; reduce it to a normalized city name for the cache key
+        city = normalize_city(city)
         print(f"--- Fetching weather for city: '{city}' ---")
         
-        # Run the query for the city (wrapper handles the API call and formatting)
-        result = weather_wrapper.run(city)
-        
-        return result
+        # Served from the cache when fresh; otherwise one upstream call through the shared wrapper
+        # (which handles the API call and formatting), however many requests ask at once
+        return get_weather_cache().get(city)
     
     except Exception as e:
         return f"An error occurred while fetching weather data: {str(e)}"
@@ -34,29 +103,58 @@ def retrieve_pdf_context(question: str) -> str:
     Use this tool for any questions about the content of the document, such as inquiries about the Eiffel Tower.
     """
     print(f"--- Retrieving context for question: '{question}' ---")
+    return format_context(retrieve_documents(question))
+
+def retrieve_documents(question: str) -> List[Document]:
+    """Returns the top chunks for one question, best first, before context assembly."""
+    # Concurrent requests (e.g. from the HTTP server) share one embedding call and one search
+    if config.MICRO_BATCH_ENABLED:
+        return get_retrieval_batcher()(question)
     
-    # Initialize the embedding model
-    embeddings_model = HuggingFaceEndpointEmbeddings(
-        huggingfacehub_api_token=config.HUGGINGFACEHUB_API_TOKEN,
-        model=config.EMBEDDING_MODEL_NAME
-    )
+    # Get the shared embedding model
+    embeddings_model = embeddings.get_embeddings_model()
     
     # Generate embedding for the user's question
     query_embedding = embeddings_model.embed_query(question)
     
-    # Get the Qdrant client
-    qdrant_client = vector_db.get_qdrant_client()
+    # Query the collection (dense, fused with the lexical index when hybrid search is on)
+    return search_documents([question], [query_embedding])[0]
+
+def format_context(retrieved_docs: List[Document]) -> str:
+    """
+    Combines the retrieved documents into a single context string: adjacent chunks are merged,
+    near-duplicates dropped and the rest packed into `config.CONTEXT_TOKEN_BUDGET`.
+    """
+    return context.build_context(retrieved_docs)
+
+# --- Async Variants ---
+
+async def aget_weather_info(city: str) -> str:
+    """
+    Async version of `get_weather_info`. The OpenWeatherMap wrapper has no async client,
+    so the blocking call runs in a worker thread instead of holding the event loop.
+    """
+    return await asyncio.to_thread(get_weather_info.invoke, city)
+
+async def aretrieve_pdf_context(question: str) -> str:
+    """Async version of `retrieve_pdf_context`."""
+    print(f"--- Retrieving context for question: '{question}' ---")
+    return format_context(await aretrieve_documents(question))
+
+async def aretrieve_documents(question: str) -> List[Document]:
+    """
+    Async version of `retrieve_documents`. The query embedding uses the model's async client;
+    the local Qdrant store is in-process, so its search runs in a worker thread.
+    """
+    if config.MICRO_BATCH_ENABLED:
+        return await asyncio.wrap_future(get_retrieval_batcher().submit(question))
     
-    # Query the collection
-    retrieved_docs = vector_db.query_collection(qdrant_client, query_embedding)
+    embeddings_model = embeddings.get_embeddings_model()
+    query_embedding = await embeddings_model.aembed_query(question)
     
-    if not retrieved_docs:
-        return "No relevant information found in the document for this question."
-        
-    # Combine the retrieved documents into a single context string
-    context = "\n\n---\n\n".join(retrieved_docs)
-    #print(f"--- Retrieved Context ---\n{context}\n-------------------------")
-    return context
+    [retrieved_docs] = await asyncio.to_thread(search_documents, [question], [query_embedding])
+    
+    return retrieved_docs
 
 # A list of all tools for the agent to use
 all_tools = [get_weather_info, retrieve_pdf_context]
\ No newline at end of file
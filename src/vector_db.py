@@ -1,23 +1,58 @@
 import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import PointStruct, UpdateStatus
+from qdrant_client.local.qdrant_local import QdrantLocal
 from langchain_core.documents import Document
-from typing import List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 import uuid
 
 from src import config
+from src import manifest
+from src import metrics
+from src import registry
+from src.mmap_store import MmapVectorStore
+
+# Namespace for deterministic point IDs, so the same chunk always maps to the same point
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a4e-8d3b-5e7a-9c0f-2b4d6e8a1c3f")
+
+# Serializes access to the local client from several threads (parallel upserts, server workers)
+_local_lock = threading.RLock()
 
 def get_qdrant_client() -> QdrantClient:
     """
     Initializes and returns the Qdrant client using a local file path.
-    Ensures the storage directory exists.
+    Ensures the storage directory exists. Connects to a Qdrant server instead if QDRANT_URL is set.
+    With VECTOR_STORE_BACKEND='mmap' it returns the memory-mapped store, which has the same interface.
+
+    Raises:
+        ValueError: If the backend name is unknown.
     """
+    if config.VECTOR_STORE_BACKEND == "mmap":
+        return MmapVectorStore(config.MMAP_STORE_PATH, config.MMAP_VECTOR_DTYPE)
+    if config.VECTOR_STORE_BACKEND != "qdrant":
+        raise ValueError(f"Unknown vector store backend '{config.VECTOR_STORE_BACKEND}'. Choose 'qdrant' or 'mmap'.")
+    if config.QDRANT_URL:
+        return QdrantClient(url=config.QDRANT_URL, api_key=config.QDRANT_API_KEY)
+
     # Ensure the storage directory for Qdrant exists
     os.makedirs(config.QDRANT_STORAGE_PATH, exist_ok=True)
     
     # Initialize the client with the local path
     return QdrantClient(path=config.QDRANT_STORAGE_PATH)
 
+def get_shared_client() -> QdrantClient:
+    """
+    Returns the process-wide Qdrant client, opening the local store on first use.
+    The local store can only be opened once per process, so all callers should share this client.
+    """
+    return registry.get_or_create("qdrant_client", get_qdrant_client, close=lambda client: client.close())
+
 #def create_collection_if_not_exists(client: QdrantClient):
 #    """
 #    Creates the Qdrant collection if it doesn't already exist.
@@ -36,54 +71,401 @@ def get_qdrant_client() -> QdrantClient:
 #        )
 #        print("Collection created successfully.")
 
-def create_collection_if_not_exists(client: QdrantClient):
+def get_profile(profile: str = None) -> Dict[str, Any]:
+    """
+    Returns the settings of a collection profile from `config.COLLECTION_PROFILES`.
+
+    Raises:
+        ValueError: If the profile is not defined.
+    """
+    profile = profile or config.QDRANT_COLLECTION_PROFILE
+    if profile not in config.COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{profile}'. "
+                         f"Choose one of: {', '.join(config.COLLECTION_PROFILES)}")
+    return config.COLLECTION_PROFILES[profile]
+
+def collection_settings(profile: str = None, dimension: int = None) -> Dict[str, Any]:
+    """Translates a collection profile into keyword arguments for `client.create_collection`."""
+    settings = get_profile(profile)
+    on_disk = settings.get("on_disk", False)
+    quantization = None
+    if settings.get("quantization") == "scalar":
+        quantization = models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+        ))
+    elif settings.get("quantization") == "binary":
+        quantization = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+
+    hnsw = None
+    if "hnsw_m" in settings or "hnsw_ef_construct" in settings or on_disk:
+        hnsw = models.HnswConfigDiff(m=settings.get("hnsw_m"), ef_construct=settings.get("hnsw_ef_construct"),
+                                     on_disk=on_disk or None)
+    return {
+        "vectors_config": models.VectorParams(
+            size=dimension or config.EMBEDDING_MODEL_DIMENSION,
+            distance=models.Distance.COSINE,
+            on_disk=on_disk or None
+        ),
+        "hnsw_config": hnsw,
+        "quantization_config": quantization,
+        "on_disk_payload": on_disk or None,
+    }
+
+def search_params(client: QdrantClient, profile: str = None) -> Optional[models.SearchParams]:
+    """
+    Returns the query-time settings of a profile (beam width, re-scoring, oversampling).
+    The local client and the mmap store always search exactly, so they get None.
+    """
+    settings = get_profile(profile)
+    if is_local_client(client) or isinstance(client, MmapVectorStore) or not settings:
+        return None
+    quantization = None
+    if settings.get("quantization"):
+        quantization = models.QuantizationSearchParams(
+            rescore=settings.get("rescore", True), oversampling=settings.get("oversampling")
+        )
+    return models.SearchParams(hnsw_ef=settings.get("search_ef"), quantization=quantization)
+
+def create_collection_if_not_exists(client: QdrantClient, collection_name: str = None, profile: str = None):
     """
     Creates the Qdrant collection if it doesn't already exist.
+    Defaults to the document collection and the configured collection profile.
     """
+    collection_name = collection_name or config.QDRANT_COLLECTION_NAME
     # Use the collection_exists method to check
-    if not client.collection_exists(collection_name=config.QDRANT_COLLECTION_NAME):
-        print(f"Collection '{config.QDRANT_COLLECTION_NAME}' not found. Creating...")
-        client.create_collection(
-            collection_name=config.QDRANT_COLLECTION_NAME,
-            vectors_config=models.VectorParams(
-                size=config.EMBEDDING_MODEL_DIMENSION,
-                distance=models.Distance.COSINE
-            ),
-        )
+    if not client.collection_exists(collection_name=collection_name):
+        print(f"Collection '{collection_name}' not found. Creating...")
+        client.create_collection(collection_name=collection_name, **collection_settings(profile))
         print("Collection created successfully.")
     else:
-        print(f"Collection '{config.QDRANT_COLLECTION_NAME}' already exists.")
+        print(f"Collection '{collection_name}' already exists.")
 
-def upsert_documents(client: QdrantClient, documents: List[Document]):
+def _resolve_alias(client: QdrantClient, name: str) -> Optional[str]:
+    """Returns the collection an alias points to, or None if `name` is not an alias."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return None
+
+def _copy_collection(client: QdrantClient, source: str, target: str, profile: str, batch_size: int) -> int:
+    """Copies every point of `source` into a freshly created `target` and returns the number copied."""
+    if client.collection_exists(collection_name=target):
+        client.delete_collection(collection_name=target)
+    client.create_collection(collection_name=target, **collection_settings(profile))
+
+    copied, offset = 0, None
+    while True:
+        records, offset = client.scroll(collection_name=source, limit=batch_size, offset=offset,
+                                        with_payload=True, with_vectors=True)
+        if records:
+            client.upsert(collection_name=target, wait=True, points=[
+                PointStruct(id=record.id, vector=record.vector, payload=record.payload) for record in records
+            ])
+            copied += len(records)
+        if offset is None:
+            break
+
+    expected = client.count(collection_name=source, exact=True).count
+    if client.count(collection_name=target, exact=True).count != expected:
+        raise RuntimeError(f"Copied {copied} of {expected} points from '{source}'; '{target}' is incomplete.")
+    return copied
+
+def _put_behind_alias(client: QdrantClient, collection_name: str, batch_size: int) -> str:
     """
-    Upserts documents into the Qdrant collection.
-    Each document is converted into a Qdrant PointStruct.
+    Moves a plain collection into '<name>__default' and makes `collection_name` an alias of it.
+
+    A plain collection and an alias cannot share a name, so the plain collection is only deleted
+    once its copy is complete. If the process stops between that delete and the alias creation,
+    the data is still in '<name>__default' and the next call finishes the switch.
+    """
+    adopted = f"{collection_name}__default"
+    if client.collection_exists(collection_name=collection_name):
+        print(f"Moving plain collection '{collection_name}' into '{adopted}'...")
+        _copy_collection(client, collection_name, adopted, "default", batch_size)
+        client.delete_collection(collection_name=collection_name)
+    elif not client.collection_exists(collection_name=adopted):
+        raise ValueError(f"Collection '{collection_name}' does not exist.")
+    client.update_collection_aliases(change_aliases_operations=[models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=adopted, alias_name=collection_name)
+    )])
+    return adopted
+
+def migrate_collection(client: QdrantClient, profile: str, collection_name: str = None,
+                       batch_size: int = None, keep_old: bool = False) -> str:
+    """
+    Rebuilds a collection into a new profile and switches its name over to the rebuilt copy.
+
+    Points (vectors and payloads) are copied in batches into a new physical collection named
+    '<name>__<profile>'. Once the counts match, the `collection_name` alias is moved to the new
+    collection in one atomic operation, so readers keep using the same name. A plain collection
+    is first moved behind an alias of its own '<name>__default' copy; that copy counts as the
+    previous collection and is kept when `keep_old` is set.
+
+    Args:
+        client (QdrantClient): The Qdrant client instance.
+        profile (str): Name of the target profile in `config.COLLECTION_PROFILES`.
+        collection_name (str, optional): Logical collection name. Defaults to the document collection.
+        batch_size (int, optional): Points copied per scroll/upsert round trip.
+        keep_old (bool): Keep the previous physical collection instead of deleting it.
+
+    Returns:
+        str: The name of the new physical collection.
+
+    Raises:
+        RuntimeError: If the copy does not contain every point.
+    """
+    get_profile(profile)
+    collection_name = collection_name or config.QDRANT_COLLECTION_NAME
+    batch_size = batch_size or config.QDRANT_UPSERT_BATCH_SIZE
+    target = f"{collection_name}__{profile}"
+    source = _resolve_alias(client, collection_name)
+    if source is None:
+        source = _put_behind_alias(client, collection_name, batch_size)
+        if source == target:
+            return target
+    if target == source:
+        raise ValueError(f"'{collection_name}' already uses profile '{profile}'.")
+
+    print(f"Migrating '{source}' into '{target}' (profile '{profile}')...")
+    start = time.perf_counter()
+    copied = _copy_collection(client, source, target, profile, batch_size)
+
+    client.update_collection_aliases(change_aliases_operations=[
+        models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=collection_name)),
+        models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target, alias_name=collection_name)),
+    ])
+    if not keep_old:
+        client.delete_collection(collection_name=source)
+
+    print(f"Migrated {copied} points in {time.perf_counter() - start:.2f} s; "
+          f"'{collection_name}' now points to '{target}'.")
+    return target
+
+def make_point_id(source: str, content: str, occurrence: int = 0) -> str:
+    """
+    Builds a deterministic point ID from the document identity and the chunk's content hash.
+
+    Args:
+        source (str): The document the chunk belongs to (e.g. its file path).
+        content (str): The chunk text.
+        occurrence (int): Index among identical chunks of the same document.
+
+    Returns:
+        str: A UUID string that is stable across ingestion runs.
     """
-    points = []
+    key = f"{manifest.normalize_source(source)}|{manifest.content_hash(content)}|{occurrence}"
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, key))
+
+def assign_point_ids(documents: List[Document]) -> List[str]:
+    """
+    Stores a deterministic 'point_id' in the metadata of every chunk and returns the IDs.
+    Identical chunks within one document get distinct IDs through an occurrence counter.
+    """
+    seen = {}
+    point_ids = []
     for doc in documents:
-        # Each document must have a unique ID. We'll use UUIDs.
-        point = PointStruct(
-            id=str(uuid.uuid4()),
-            vector=doc.metadata['embedding'], # We will store the embedding here
-            payload={
-                "page_content": doc.page_content,
-                "metadata": doc.metadata
-            }
+        source = str(doc.metadata.get("source", ""))
+        key = (source, doc.page_content)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        doc.metadata["point_id"] = make_point_id(source, doc.page_content, occurrence)
+        point_ids.append(doc.metadata["point_id"])
+    return point_ids
+
+def get_existing_point_ids(client: QdrantClient, point_ids: Iterable[str]) -> Set[str]:
+    """Returns the subset of `point_ids` that are already stored in the collection."""
+    point_ids = list(point_ids)
+    if not point_ids:
+        return set()
+    records = client.retrieve(
+        collection_name=config.QDRANT_COLLECTION_NAME,
+        ids=point_ids,
+        with_payload=False,
+        with_vectors=False
+    )
+    return {str(record.id) for record in records}
+
+def get_point_ids_by_source(client: QdrantClient, source: str, page_size: int = 256) -> Set[str]:
+    """Returns the IDs of every stored point whose 'metadata.source' is `source`."""
+    point_ids, offset = set(), None
+    while True:
+        records, offset = client.scroll(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            scroll_filter=source_filter(source),
+            limit=page_size,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
         )
-        points.append(point)
+        point_ids.update(str(record.id) for record in records)
+        if offset is None:
+            return point_ids
 
-    operation_info = client.upsert(
+def delete_points(client: QdrantClient, point_ids: Iterable[str]):
+    """Deletes the given points from the collection."""
+    point_ids = list(point_ids)
+    if not point_ids:
+        return
+    client.delete(
         collection_name=config.QDRANT_COLLECTION_NAME,
-        wait=True,
-        points=points
+        points_selector=models.PointIdsList(points=point_ids),
+        wait=True
     )
-    
-    if operation_info.status == UpdateStatus.COMPLETED:
-        print(f"Successfully upserted {len(points)} documents.")
+    print(f"Deleted {len(point_ids)} stale points.")
+
+@dataclass
+class UpsertReport:
+    """Per-batch latency and overall throughput of a streaming upsert."""
+    points: int = 0
+    batch_latencies: List[float] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def batches(self) -> int:
+        return len(self.batch_latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Points written per second."""
+        return self.points / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        if not self.batch_latencies:
+            return "Upserted 0 points."
+        latencies = sorted(self.batch_latencies)
+        p50 = latencies[len(latencies) // 2]
+        return (f"Upserted {self.points} points in {self.batches} batches "
+                f"({self.throughput:.1f} points/s, batch p50 {p50 * 1000:.1f} ms, "
+                f"max {latencies[-1] * 1000:.1f} ms)")
+
+def document_to_point(doc: Document) -> PointStruct:
+    """
+    Converts a chunk with an 'embedding' in its metadata into a Qdrant point.
+    The embedding is stored only as the point's vector, not again in the payload.
+    """
+    # Deterministic IDs make re-ingestion overwrite points instead of duplicating them
+    point_id = doc.metadata.get("point_id") or make_point_id(
+        str(doc.metadata.get("source", "")), doc.page_content
+    )
+    metadata = {key: value for key, value in doc.metadata.items() if key != "embedding"}
+    return PointStruct(
+        id=point_id,
+        vector=doc.metadata['embedding'],
+        payload={
+            "page_content": doc.page_content,
+            "metadata": metadata
+        }
+    )
+
+def is_local_client(client: QdrantClient) -> bool:
+    """Returns True for the in-process (path or ':memory:') client, which is not thread-safe."""
+    return isinstance(getattr(client, "_client", None), QdrantLocal)
+
+def serialized(client: QdrantClient):
+    """
+    Context manager that serializes calls to the local client, which is not thread-safe.
+    A remote Qdrant server handles concurrent calls itself, so there it does nothing.
+    """
+    return _local_lock if is_local_client(client) else nullcontext()
+
+def upsert_batch(client: QdrantClient, points: List[PointStruct]) -> float:
+    """
+    Writes one batch of points and returns how long it took in seconds.
+
+    Raises:
+        RuntimeError: If Qdrant does not report the write as completed.
+    """
+    start = time.perf_counter()
+    with metrics.timer("qdrant_seconds", op="upsert"):
+        operation_info = client.upsert(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            wait=True,
+            points=points
+        )
+    if operation_info.status != UpdateStatus.COMPLETED:
+        raise RuntimeError(f"Error upserting documents: {operation_info.status}")
+    return time.perf_counter() - start
+
+def upsert_stream(client: QdrantClient, documents: Iterable[Document], batch_size: int = None,
+                  parallel: int = None, on_batch: Optional[Callable[[List[PointStruct]], None]] = None) -> UpsertReport:
+    """
+    Upserts an iterator of embedded chunks in fixed-size batches.
+
+    Only one batch per worker is held in memory at a time. With `parallel` > 1, batches are
+    written concurrently; the local client is not thread-safe, so its writes are serialized.
+
+    Args:
+        client (QdrantClient): The Qdrant client instance.
+        documents (Iterable[Document]): Chunks with an 'embedding' in their metadata.
+        batch_size (int, optional): Points per upsert call.
+        parallel (int, optional): Number of batches written concurrently.
+        on_batch (Callable, optional): Called with each batch's points once they are stored, in order.
+
+    Returns:
+        UpsertReport: Point count, per-batch latencies and throughput.
+    """
+    batch_size = batch_size or config.QDRANT_UPSERT_BATCH_SIZE
+    parallel = parallel or config.QDRANT_UPSERT_PARALLEL
+    report = UpsertReport()
+    start = time.perf_counter()
+
+    def batches():
+        batch = []
+        for doc in documents:
+            batch.append(document_to_point(doc))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def write(points: List[PointStruct]):
+        if parallel > 1:
+            with serialized(client):
+                return upsert_batch(client, points)
+        return upsert_batch(client, points)
+
+    def stored(points: List[PointStruct], latency: float):
+        report.batch_latencies.append(latency)
+        report.points += len(points)
+        if on_batch is not None:
+            on_batch(points)
+
+    if parallel <= 1:
+        for points in batches():
+            stored(points, write(points))
     else:
-        print(f"Error upserting documents: {operation_info.status}")
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="upsert") as executor:
+            pending = deque()
+            for points in batches():
+                pending.append((points, executor.submit(write, points)))
+                if len(pending) >= parallel:
+                    points, future = pending.popleft()
+                    stored(points, future.result())
+            while pending:
+                points, future = pending.popleft()
+                stored(points, future.result())
 
-def query_collection(client: QdrantClient, query_embedding: List[float], top_k: int = 3) -> List[str]:
+    report.elapsed = time.perf_counter() - start
+    return report
+
+def upsert_documents(client: QdrantClient, documents: List[Document]):
+    """
+    Upserts documents into the Qdrant collection.
+    Each document is converted into a Qdrant PointStruct.
+    """
+    report = upsert_stream(client, documents)
+    print(f"Successfully upserted {report.points} documents.")
+    return report
+
+def source_filter(source: str) -> models.Filter:
+    """Builds a filter that matches only the chunks of one document."""
+    return models.Filter(
+        must=[models.FieldCondition(key="metadata.source", match=models.MatchValue(value=source))]
+    )
+
+def query_collection(client: QdrantClient, query_embedding: List[float], top_k: int = 3,
+                     source: Optional[str] = None) -> List[str]:
     """
     Performs a similarity search on the Qdrant collection.
 
@@ -91,18 +473,104 @@ def query_collection(client: QdrantClient, query_embedding: List[float], top_k:
         client (QdrantClient): The Qdrant client instance.
         query_embedding (List[float]): The embedding vector of the query.
         top_k (int): The number of top results to retrieve.
+        source (str, optional): Only search chunks of this document (its file path).
 
     Returns:
         List[str]: A list of page contents from the retrieved documents.
     """
-    search_result = client.search(
-        collection_name=config.QDRANT_COLLECTION_NAME,
-        query_vector=query_embedding,
-        limit=top_k,
-        with_payload=True  # Ensure we get the payload which contains our text
-    )
+    with metrics.timer("qdrant_seconds", op="search"):
+        search_result = client.query_points(
+            collection_name=config.QDRANT_COLLECTION_NAME,
+            query=query_embedding,
+            query_filter=source_filter(source) if source else None,
+            search_params=search_params(client),
+            limit=top_k,
+            with_payload=True  # Ensure we get the payload which contains our text
+        )
     
     # Extract the 'page_content' from the payload of each result
-    retrieved_contents = [point.payload['page_content'] for point in search_result]
+    retrieved_contents = [point.payload['page_content'] for point in search_result.points]
     return retrieved_contents
 
+
+@dataclass
+class SearchHit:
+    """One scored search result with its (possibly projected) payload."""
+    id: str
+    score: float
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def page_content(self) -> Optional[str]:
+        return self.payload.get("page_content")
+
+def metadata_filter(conditions: Dict[str, Any]) -> Optional[models.Filter]:
+    """
+    Builds a filter that requires every metadata field to match, e.g. {"source": "a.pdf", "page": [0, 1]}.
+    A list value matches any of its elements.
+    """
+    if not conditions:
+        return None
+    must = []
+    for key, value in conditions.items():
+        match = models.MatchAny(any=list(value)) if isinstance(value, (list, tuple, set)) else models.MatchValue(value=value)
+        must.append(models.FieldCondition(key=f"metadata.{key}", match=match))
+    return models.Filter(must=must)
+
+def search_batch(client: QdrantClient, query_embeddings: List[List[float]], top_k: int = 3,
+                 score_threshold: Optional[float] = None, filters: Optional[Dict[str, Any]] = None,
+                 payload_fields: Optional[List[str]] = None, offset: int = 0,
+                 collection_name: str = None) -> List[List[SearchHit]]:
+    """
+    Answers many query vectors with a single Qdrant call.
+
+    Args:
+        client (QdrantClient): The Qdrant client instance.
+        query_embeddings (List[List[float]]): One embedding per query.
+        top_k (int): Hits per query (the page size).
+        score_threshold (float, optional): Drop hits scoring below this similarity.
+        filters (Dict[str, Any], optional): Metadata fields the hits must match (see `metadata_filter`).
+        payload_fields (List[str], optional): Only return these payload fields, e.g.
+            ["page_content", "metadata.page"]. By default the whole payload is returned.
+        offset (int): Hits to skip per query, for fetching the next page.
+        collection_name (str, optional): Defaults to the document collection.
+
+    Returns:
+        List[List[SearchHit]]: The hits for each query, in input order, best first.
+    """
+    if not query_embeddings:
+        return []
+    query_filter = metadata_filter(filters)
+    params = search_params(client)
+    with_payload = models.PayloadSelectorInclude(include=payload_fields) if payload_fields else True
+    with metrics.timer("qdrant_seconds", op="search_batch"):
+        responses = client.query_batch_points(
+            collection_name=collection_name or config.QDRANT_COLLECTION_NAME,
+            requests=[
+                models.QueryRequest(query=embedding, filter=query_filter, limit=top_k, offset=offset or None,
+                                    score_threshold=score_threshold, params=params, with_payload=with_payload)
+                for embedding in query_embeddings
+            ]
+        )
+    return [
+        [SearchHit(id=str(point.id), score=point.score, payload=point.payload or {}) for point in response.points]
+        for response in responses
+    ]
+
+def query_collection_batch(client: QdrantClient, query_embeddings: List[List[float]], top_k: int = 3,
+                           source: Optional[str] = None) -> List[List[str]]:
+    """
+    Runs several similarity searches in a single Qdrant call.
+
+    Args:
+        client (QdrantClient): The Qdrant client instance.
+        query_embeddings (List[List[float]]): One embedding per query.
+        top_k (int): The number of top results to retrieve per query.
+        source (str, optional): Only search chunks of this document (its file path).
+
+    Returns:
+        List[List[str]]: The page contents retrieved for each query, in input order.
+    """
+    results = search_batch(client, query_embeddings, top_k=top_k, filters={"source": source} if source else None,
+                           payload_fields=["page_content"])
+    return [[hit.page_content for hit in hits] for hits in results]
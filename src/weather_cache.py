@@ -0,0 +1,141 @@
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from src import config
+from src import metrics
+from src.router import CITY_GAZETTEER, WEATHER_KEYWORDS
+
+# Words that surround a city name in a weather question but are not part of it
+FILLER_WORDS = WEATHER_KEYWORDS | {
+    "what", "what's", "whats", "is", "the", "how", "like", "today", "tomorrow", "now", "right",
+    "current", "currently", "tell", "me", "about", "please", "show", "give", "check", "it", "will",
+    "be", "going", "to", "there", "outside", "of", "in", "at", "for", "city", "report", "a",
+}
+
+
+def normalize_city(question: str) -> str:
+    """
+    Extracts and normalizes the city from a weather question, e.g.
+    "What's the weather like in New Delhi today?" -> "new delhi".
+    """
+    text = re.sub(r"[^\w\s']", " ", question.lower())
+    normalized = " ".join(text.split())
+    padded = f" {normalized} "
+
+    # Prefer the longest known city mentioned anywhere in the question
+    known = [city for city in CITY_GAZETTEER if f" {city} " in padded]
+    if known:
+        return max(known, key=len)
+
+    # Otherwise take what follows a preposition, or whatever is left after dropping filler words
+    match = re.search(r"\b(?:in|at|for|of)\s+(.+)$", normalized)
+    candidate = match.group(1) if match else normalized
+    words = [word for word in candidate.split() if word not in FILLER_WORDS]
+    return " ".join(words) or normalized
+
+
+@dataclass
+class _Entry:
+    value: str
+    fetched_at: float
+
+
+class WeatherCache:
+    """
+    Caches weather reports per normalized city.
+
+    - Fresh entries (younger than `ttl_seconds`) are served directly.
+    - Stale entries (up to `stale_seconds` past the TTL) are served immediately while one
+      background refresh runs (stale-while-revalidate).
+    - Concurrent misses for the same city share a single upstream call (single-flight).
+    """
+
+    def __init__(self, fetch: Callable[[str], str], ttl_seconds: float = None, stale_seconds: float = None):
+        self.fetch = fetch
+        self.ttl_seconds = config.WEATHER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.stale_seconds = config.WEATHER_CACHE_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0, "errors": 0}
+        self._entries: Dict[str, _Entry] = {}
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def display_name(city: str) -> str:
+        """The city name sent upstream, e.g. 'new delhi' -> 'New Delhi'."""
+        return city.title()
+
+    def get(self, city: str) -> str:
+        """
+        Returns the weather report for a normalized city name.
+
+        Raises:
+            Exception: Whatever the upstream fetch raised, if there is no usable cached value.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(city)
+                age = time.time() - entry.fetched_at if entry else None
+                if entry and age < self.ttl_seconds:
+                    self.stats["hits"] += 1
+                    metrics.increment("cache_requests_total", cache="weather", result="hit")
+                    return entry.value
+                if entry and age < self.ttl_seconds + self.stale_seconds:
+                    self.stats["stale_hits"] += 1
+                    metrics.increment("cache_requests_total", cache="weather", result="stale")
+                    if city not in self._in_flight:
+                        self._in_flight[city] = threading.Event()
+                        threading.Thread(target=self._refresh, args=(city,), daemon=True).start()
+                    return entry.value
+
+                event = self._in_flight.get(city)
+                if event is None:
+                    # This caller becomes the leader and fetches for everyone
+                    self._in_flight[city] = threading.Event()
+                    self.stats["misses"] += 1
+                    metrics.increment("cache_requests_total", cache="weather", result="miss")
+                    break
+                self.stats["coalesced"] += 1
+                metrics.increment("cache_requests_total", cache="weather", result="coalesced")
+
+            # Wait for the leader, then re-check the cache (or take over if the leader failed)
+            event.wait()
+            with self._lock:
+                entry = self._entries.get(city)
+                if entry and time.time() - entry.fetched_at < self.ttl_seconds + self.stale_seconds:
+                    return entry.value
+
+        return self._refresh(city, raise_errors=True)
+
+    def _refresh(self, city: str, raise_errors: bool = False) -> Optional[str]:
+        try:
+            with self._lock:
+                self.stats["upstream_calls"] += 1
+            with metrics.timer("weather_seconds"):
+                value = self.fetch(self.display_name(city))
+            with self._lock:
+                self._entries[city] = _Entry(value, time.time())
+            return value
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+            if raise_errors:
+                raise
+            return None
+        finally:
+            with self._lock:
+                event = self._in_flight.pop(city, None)
+            if event is not None:
+                event.set()
+
+    @property
+    def hit_rate(self) -> float:
+        served = self.stats["hits"] + self.stats["stale_hits"] + self.stats["coalesced"]
+        total = served + self.stats["misses"]
+        return served / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+from qdrant_client import QdrantClient
+
+from src import config
+from src import registry
+from src import vector_db
+from src.embeddings import FakeEmbeddings
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    """Ensures every test starts with an empty registry of shared clients."""
+    registry.shutdown()
+    yield
+    registry.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def isolated_sparse_index(tmp_path, monkeypatch):
+    """Keeps tests from reading or writing the real lexical index under data/."""
+    monkeypatch.setattr(config, "SPARSE_INDEX_PATH", str(tmp_path / "sparse_index.json"))
+
+
+@pytest.fixture(autouse=True)
+def isolated_ingest_checkpoint(tmp_path, monkeypatch):
+    """Keeps ingestion tests from resuming or leaving behind a checkpoint under data/."""
+    monkeypatch.setattr(config, "INGEST_CHECKPOINT_PATH", str(tmp_path / "ingest_checkpoint.jsonl"))
+
+
+@pytest.fixture
+def offline_agent(monkeypatch):
+    """Replaces every remote dependency of the graph with an in-process fake."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_agent")
+    model = FakeEmbeddings()
+    client = QdrantClient(":memory:")
+    vector_db.create_collection_if_not_exists(client)
+    text = "Avdeep worked as a machine learning engineer."
+    vector_db.upsert_documents(client, [Document(page_content=text, metadata={"embedding": model.embed_query(text)})])
+
+    weather = MagicMock()
+    weather.run.return_value = "Delhi: 31°C, clear sky"
+    registry.override("qdrant_client", client)
+    registry.override("embeddings_model", model)
+    registry.override("weather_wrapper", weather)
+    registry.override("decider_chain", RunnableLambda(
+        lambda inputs: "weather" if "weather" in inputs["question"].lower() else "rag"
+    ))
+    registry.override("processing_chain", RunnableLambda(
+        lambda inputs: f"Answer based on: {inputs['context']}"
+    ))
+    return weather
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from src import agent
+from src import config
+from src import metrics
+from src import registry
+from src import tool
+
+
+def test_import_is_lazy_and_needs_no_credentials():
+    """Importing the agent compiles nothing, prints nothing and loads none of the heavy libraries."""
+    env = {key: value for key, value in os.environ.items() if not key.endswith(("_API_KEY", "_API_TOKEN"))}
+    script = ("import sys; from src import agent; "
+              "print([m for m in ('langgraph', 'langchain_groq', 'qdrant_client', 'langchain_community') if m in sys.modules])")
+    result = subprocess.run([sys.executable, "-c", script], env=env, cwd=os.path.dirname(os.path.dirname(__file__)),
+                            capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_build_app_compiles_once(offline_agent):
+    assert agent.build_app() is agent.build_app() is agent.app
+    assert agent.build_async_app() is agent.async_app
+
+
+def test_abatch_runs_both_paths_concurrently(offline_agent):
+    """The async graph answers a weather and a RAG question in one batch."""
+    states = asyncio.run(agent.abatch(["weather in Delhi", "tell me about avdeep"], max_concurrency=2))
+
+    assert "31°C" in states[0]["answer"]
+    assert "machine learning engineer" in states[1]["answer"]
+    offline_agent.run.assert_called_once_with("Delhi")
+
+
+def test_sync_and_async_graphs_agree(offline_agent):
+    question = "tell me about avdeep"
+    assert agent.app.invoke({"question": question})["answer"] == asyncio.run(agent.ainvoke(question))["answer"]
+
+
+def test_stream_answer_yields_tokens_and_records_ttft(offline_agent):
+    """The processor's tokens are streamed as they are generated and time-to-first-token is tracked."""
+    chat_model = GenericFakeChatModel(messages=iter([AIMessage("Avdeep is an ML engineer.")]))
+    registry.override("processing_chain", ChatPromptTemplate.from_template("{context} {question}") | chat_model | StrOutputParser())
+    metrics.reset()
+
+    tokens = list(agent.stream_answer("tell me about avdeep"))
+
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Avdeep is an ML engineer."
+    assert metrics.summary("answer_ttft_seconds")["count"] == 1
+    assert metrics.summary("answer_ttft_seconds")["p50"] <= metrics.summary("answer_total_seconds")["p50"]
+
+
+def test_astream_answer_falls_back_to_final_answer(offline_agent):
+    """A processor that does not stream still yields its complete answer once."""
+    async def collect():
+        return [token async for token in agent.astream_answer("weather in Delhi")]
+
+    assert asyncio.run(collect()) == ["Answer based on: Delhi: 31°C, clear sky"]
+
+
+@pytest.mark.parametrize("micro_batch", [True, False])
+def test_async_retrieval_with_and_without_micro_batching(offline_agent, monkeypatch, micro_batch):
+    monkeypatch.setattr(config, "MICRO_BATCH_ENABLED", micro_batch)
+
+    context = asyncio.run(tool.aretrieve_pdf_context("what was avdeep's job?"))
+
+    assert "machine learning engineer" in context
+    assert registry.is_initialized("retrieval_batcher") == micro_batch
+
+
+@pytest.fixture
+def speculative_agent(offline_agent, monkeypatch):
+    """The offline agent in speculative mode, with a decider LLM slow enough to overlap with the tools."""
+    monkeypatch.setattr(config, "SPECULATIVE_EXECUTION_ENABLED", True)
+    monkeypatch.setattr(config, "ANSWER_CACHE_ENABLED", False)
+
+    def slow_decider(inputs):
+        time.sleep(0.05)
+        return "rag"
+
+    registry.override("decider_chain", RunnableLambda(slow_decider))
+    metrics.reset()
+    return offline_agent
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_speculative_mode_overlaps_tools_with_the_decider(speculative_agent, use_async):
+    """An ambiguous question starts both tools during the decider call and keeps the chosen one."""
+    question = "anything new on springfield"
+    state = asyncio.run(agent.ainvoke(question)) if use_async else agent.ask(question)
+
+    assert state["route"] == "rag"
+    assert "machine learning engineer" in state["answer"]
+    speculative_agent.run.assert_called_once()  # the weather branch ran and was discarded
+    report = agent.speculation_report()
+    assert report["runs"] == 1
+    assert report["saved_ms_mean"] > 0
+    assert metrics.summary("speculation_wasted_seconds")["count"] == 1
+
+
+def test_speculative_mode_skips_speculation_when_rules_decide(speculative_agent):
+    state = agent.ask("tell me about avdeep's experience")
+
+    assert "machine learning engineer" in state["answer"]
+    speculative_agent.run.assert_not_called()
+    assert agent.speculation_report()["runs"] == 0
@@ -0,0 +1,69 @@
+import asyncio
+
+from src import agent
+from src import answer_cache
+from src import config
+
+
+def test_paraphrase_hit_skips_the_graph(offline_agent, monkeypatch):
+    """A rephrased question is answered from the cache without running any node."""
+    first = agent.ask("tell me about avdeep")
+    assert "cached" not in first
+
+    calls = []
+    monkeypatch.setattr(agent.app, "invoke", lambda *args, **kwargs: calls.append(args))
+    second = agent.ask("Tell me about Avdeep?")
+
+    assert second["cached"] is True
+    assert second["answer"] == first["answer"]
+    assert second["route"] == "rag"
+    assert calls == []
+
+
+def test_weather_answers_expire_sooner(offline_agent, monkeypatch):
+    """Each route has its own TTL; an expired weather entry is a miss while RAG answers stay."""
+    asyncio.run(agent.abatch(["weather in Delhi", "tell me about avdeep"]))
+    monkeypatch.setattr(config, "ANSWER_CACHE_WEATHER_TTL_SECONDS", 0)
+
+    assert answer_cache.lookup("weather in Delhi") is None
+    assert answer_cache.lookup("tell me about avdeep")["route"] == "rag"
+
+    # The expired entry was deleted when the lookup came across it
+    client = answer_cache.get_client()
+    assert client.count(collection_name=config.ANSWER_CACHE_COLLECTION_NAME).count == 1
+
+
+def test_errors_are_not_cached(offline_agent):
+    offline_agent.run.side_effect = RuntimeError("service unavailable")
+    agent.ask("weather in Delhi")
+    assert answer_cache.lookup("weather in Delhi") is None
+
+
+def test_invalidate_drops_only_the_given_route(offline_agent):
+    agent.ask("weather in Delhi")
+    agent.ask("tell me about avdeep")
+
+    answer_cache.invalidate(route="rag")
+
+    assert answer_cache.lookup("tell me about avdeep") is None
+    assert answer_cache.lookup("weather in Delhi") is not None
+
+
+def test_concurrent_lookups_share_batches(offline_agent, monkeypatch):
+    """Cache lookups of concurrent requests are embedded and searched together."""
+    monkeypatch.setattr(config, "MICRO_BATCH_MAX_WAIT_MS", 50)
+    asyncio.run(agent.abatch([f"tell me about avdeep {i}" for i in range(6)]))
+
+    batcher = answer_cache.get_lookup_batcher()
+    assert batcher.stats["items"] == 6
+    assert batcher.stats["batches"] < 6
+
+
+def test_weather_answers_are_only_reused_for_the_same_city(offline_agent, monkeypatch):
+    """However similar two weather questions are, a forecast is never served for another city."""
+    monkeypatch.setattr(config, "ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.3)
+    agent.ask("weather in Delhi")
+
+    assert answer_cache.lookup("weather in Mumbai") is None
+    assert answer_cache.lookup("weather in New Delhi tomorrow") is None
+    assert answer_cache.lookup("what is the weather in delhi?")["route"] == "weather"
@@ -0,0 +1,31 @@
+from benchmarks import run
+
+
+def test_suite_reports_every_benchmark():
+    results = run.run_suite(sizes=[100], ingest_copies=1, queries=5, graph_runs=4, startup_runs=1)
+
+    for name in ("startup.import_ms", "startup.build_app_ms", "ingest.pages_per_s", "ingest.chunks_per_s", "graph.total.p50_ms",
+                 "graph.overhead_per_run_ms", "graph.async_batch.qps",
+                 "query.100.p95_ms", "query.100.qps", "query.100.memory_mb"):
+        assert name in results
+    assert results["ingest.chunks_per_s"] > 0
+    assert results["graph.decider.p50_ms"] > 0
+
+
+def test_compare_flags_regressions_in_the_right_direction():
+    baseline = {"query.1000.p95_ms": 10.0, "query.1000.qps": 100.0, "ingest.pages_per_s": 5.0}
+
+    assert run.compare({"query.1000.p95_ms": 12.0, "query.1000.qps": 90.0, "ingest.pages_per_s": 9.0}, baseline) == []
+
+    regressions = run.compare({"query.1000.p95_ms": 20.0, "query.1000.qps": 50.0, "new.metric": 1.0}, baseline)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("query.1000.p95_ms")
+    assert regressions[1].startswith("query.1000.qps")
+
+
+def test_gate_uses_medians_and_ignores_tail_latency():
+    runs = [{"query.1000.p50_ms": 1.0}, {"query.1000.p50_ms": 9.0, "query.1000.p99_ms": 2.0}, {"query.1000.p50_ms": 2.0}]
+    assert run.median_results(runs) == {"query.1000.p50_ms": 2.0, "query.1000.p99_ms": 2.0}
+
+    assert run.compare({"query.1000.p99_ms": 5.0, "query.1000.memory_mb": 50.0},
+                       {"query.1000.p99_ms": 2.0, "query.1000.memory_mb": 20.0}) == []
@@ -0,0 +1,67 @@
+import pytest
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient, models
+
+from src import config
+from src import profile_benchmark
+from src import vector_db
+
+
+def test_profile_settings_and_memory_estimates():
+    """Quantized, on-disk profiles need far less RAM than plain float32 vectors."""
+    settings = vector_db.collection_settings("binary")
+    assert settings["quantization_config"].binary is not None
+    assert settings["vectors_config"].on_disk is True
+    assert vector_db.collection_settings("default")["quantization_config"] is None
+
+    ram = {profile: profile_benchmark.estimate_memory(profile, 1_000_000)["ram_bytes"]
+           for profile in ("default", "scalar", "binary")}
+    assert ram["binary"] < ram["scalar"] < ram["default"]
+
+    with pytest.raises(ValueError):
+        vector_db.get_profile("nonexistent")
+
+
+def test_migrate_collection_keeps_points_behind_the_same_name(monkeypatch):
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_migrate")
+    client = QdrantClient(":memory:")
+    vector_db.create_collection_if_not_exists(client)
+    docs = [Document(page_content=f"chunk {i}", metadata={"embedding": [float(i + 1)] + [1.0] * (config.EMBEDDING_MODEL_DIMENSION - 1)})
+            for i in range(7)]
+    vector_db.upsert_documents(client, docs)
+
+    assert vector_db.migrate_collection(client, "scalar", batch_size=3) == "test_migrate__scalar"
+    assert vector_db.migrate_collection(client, "binary") == "test_migrate__binary"
+
+    assert client.count(collection_name="test_migrate", exact=True).count == 7
+    assert not client.collection_exists(collection_name="test_migrate__scalar")
+    assert len(vector_db.query_collection(client, docs[0].metadata["embedding"], top_k=10)) == 7
+
+
+def test_migrating_a_plain_collection_keeps_a_copy_until_the_alias_exists(monkeypatch):
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_plain")
+    client = QdrantClient(":memory:")
+    vector_db.create_collection_if_not_exists(client)
+    vector_db.upsert_documents(client, [Document(page_content=f"chunk {i}", metadata={"embedding": [float(i + 1)] * config.EMBEDDING_MODEL_DIMENSION})
+                                        for i in range(5)])
+
+    vector_db.migrate_collection(client, "scalar", keep_old=True)
+    assert client.count(collection_name="test_plain__default", exact=True).count == 5
+    assert client.count(collection_name="test_plain", exact=True).count == 5
+
+    # A run that stopped after the plain collection was deleted, before the alias was created
+    client.delete_collection(collection_name="test_plain__scalar")
+    client.update_collection_aliases(change_aliases_operations=[
+        models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name="test_plain"))
+    ])
+    assert vector_db.migrate_collection(client, "binary") == "test_plain__binary"
+    assert client.count(collection_name="test_plain", exact=True).count == 5
+    assert not client.collection_exists(collection_name="test_plain__default")
+
+
+def test_benchmark_reports_recall_and_latency():
+    results = profile_benchmark.run_benchmark(QdrantClient(":memory:"), ["default", "scalar"],
+                                              points=300, queries=10, dimension=16, k=5)
+    assert [r["profile"] for r in results] == ["default", "scalar"]
+    # Local mode searches exactly, so recall is perfect regardless of the profile
+    assert all(r["recall@5"] == 1.0 and r["p99_ms"] >= r["p50_ms"] for r in results)
@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src import context
+from src import metrics
+
+TEXT = " ".join(f"Sentence number {i} describes project {i} in some detail." for i in range(40))
+
+
+def split(text: str, source: str = "resume.pdf"):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=50, add_start_index=True)
+    return splitter.split_documents([Document(page_content=text, metadata={"source": source})])
+
+
+def test_overlapping_chunks_are_merged_and_tokens_drop():
+    """Consecutive chunks share CHUNK_OVERLAP characters; the merged context keeps them once."""
+    chunks = split(TEXT)
+    retrieved = [chunks[3], chunks[2], chunks[4]]
+    metrics.reset()
+
+    built = context.build_context(retrieved, budget=10_000)
+
+    start = chunks[2].metadata["start_index"]
+    end = chunks[4].metadata["start_index"] + len(chunks[4].page_content)
+    assert built == TEXT[start:end]
+    assert metrics.summary("context_tokens")["mean"] < metrics.summary("context_tokens_raw")["mean"]
+
+
+def test_chunks_on_different_pages_are_not_merged():
+    """'start_index' restarts on every page, so equal offsets on two pages are separate text."""
+    first = Document(page_content="Page one opens with the summary.", metadata={"source": "a.pdf", "page": 0, "start_index": 0})
+    second = Document(page_content="Page two opens with the projects.", metadata={"source": "a.pdf", "page": 1, "start_index": 0})
+
+    passages = context.merge_adjacent([first, second])
+
+    assert [p.text for p in passages] == [first.page_content, second.page_content]
+
+
+def test_near_duplicates_from_other_documents_are_dropped():
+    original = Document(page_content="Avdeep built a retrieval pipeline with Qdrant and LangGraph for resume search.",
+                        metadata={"source": "a.pdf", "start_index": 0})
+    copy = Document(page_content="Avdeep built a retrieval pipeline with Qdrant and LangGraph for resume search!",
+                    metadata={"source": "b.pdf", "start_index": 0})
+    other = Document(page_content="He also led a computer vision project.", metadata={"source": "a.pdf", "start_index": 500})
+
+    built = context.build_context([original, copy, other])
+
+    assert built.count("retrieval pipeline") == 1
+    assert "computer vision" in built
+
+
+def test_packing_respects_the_budget_in_relevance_order():
+    chunks = [Document(page_content=f"Passage {i}. " + "word " * 200, metadata={"source": f"{i}.pdf"}) for i in range(5)]
+
+    built = context.build_context(chunks, budget=400)
+
+    assert context.estimate_tokens(built) <= 400
+    assert built.startswith("Passage 0.")
+    assert "Passage 4." not in built
+    assert context.build_context([]) == context.NO_CONTEXT_MESSAGE
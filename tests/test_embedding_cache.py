@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache, cache_key, is_uncased, normalize_text
+
+
+class CountingEmbeddings:
+    """Stand-in model that records which texts it was asked to embed."""
+
+    def __init__(self):
+        self.seen = []
+
+    def embed_documents(self, texts):
+        self.seen.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def test_normalize_text():
+    assert normalize_text("  Tell me about\n AVDEEP  ") == "tell me about avdeep"
+    assert normalize_text("  Tell me about\n AVDEEP  ", lowercase=False) == "Tell me about AVDEEP"
+
+
+def test_only_uncased_models_share_entries_across_case():
+    assert is_uncased("remote:sentence-transformers/all-MiniLM-L6-v2") and is_uncased("bert-base-uncased")
+    assert cache_key("all-MiniLM-L6-v2", "Apple") == cache_key("all-MiniLM-L6-v2", "apple")
+    assert cache_key("local:BAAI/bge-small-en-v1.5", "Apple") != cache_key("local:BAAI/bge-small-en-v1.5", "apple")
+    assert cache_key("local:BAAI/bge-small-en-v1.5", " Apple\n") == cache_key("local:BAAI/bge-small-en-v1.5", "Apple")
+
+
+def test_cached_embeddings_serves_repeats_from_memory_and_disk(tmp_path):
+    """Repeated and normalized-equal texts hit the cache; a fresh process hits the disk tier."""
+    path = str(tmp_path / "cache.sqlite")
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, EmbeddingCache(path=path, ttl_seconds=60), model_name="all-MiniLM-L6-v2")
+
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    assert model.seen == ["alpha", "beta"]
+    assert cached.embed_query("  ALPHA ") == first[0]
+    assert cached.cache.stats == {"memory_hits": 1, "disk_hits": 0, "misses": 3}
+
+    # A new cache over the same file starts with an empty memory tier
+    reopened = CachedEmbeddings(model, EmbeddingCache(path=path, ttl_seconds=60), model_name="all-MiniLM-L6-v2")
+    assert reopened.embed_query("beta") == first[1]
+    assert reopened.cache.stats["disk_hits"] == 1
+    assert len(model.seen) == 2
+
+
+def test_cache_keys_include_model_name_and_respect_limits(tmp_path):
+    """Different models never share entries, and the memory tier evicts least recently used keys."""
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite"), max_memory_entries=2, ttl_seconds=60)
+    model = CountingEmbeddings()
+    CachedEmbeddings(model, cache, model_name="a").embed_query("x")
+    CachedEmbeddings(model, cache, model_name="b").embed_query("x")
+    assert model.seen == ["x", "x"]
+
+    CachedEmbeddings(model, cache, model_name="a").embed_documents(["y", "z"])
+    assert len(cache.memory) == 2
+
+    # With a negative TTL every stored entry counts as expired
+    assert EmbeddingCache(path=str(tmp_path / "cache.sqlite"), ttl_seconds=0).memory.ttl_seconds == 0
+    expired = EmbeddingCache(path=str(tmp_path / "cache.sqlite"), ttl_seconds=-1)
+    assert expired.get_many([cache_key("a", "x")]) == [None]
+    assert expired.disk.evict() == 4
+    assert len(expired.disk) == 0
+
+
+def test_async_embeddings_use_the_cache_off_the_event_loop(tmp_path):
+    """The SQLite tier is read and written from a worker thread, never from the loop's thread."""
+    threads = []
+
+    class RecordingCache(EmbeddingCache):
+        def get_many(self, keys):
+            threads.append(threading.get_ident())
+            return super().get_many(keys)
+
+        def put_many(self, items):
+            threads.append(threading.get_ident())
+            super().put_many(items)
+
+    cached = CachedEmbeddings(CountingEmbeddings(), RecordingCache(path=str(tmp_path / "cache.sqlite")), model_name="m")
+
+    async def embed():
+        first = await cached.aembed_documents(["alpha", "beta"])
+        return first, await cached.aembed_query("alpha"), threading.get_ident()
+
+    vectors, query_vector, loop_thread = asyncio.run(embed())
+
+    assert query_vector == vectors[0]
+    assert len(threads) == 3 and loop_thread not in threads
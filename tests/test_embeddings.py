@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from src import config
+from src import embeddings
+
+
+def test_fake_embeddings_are_deterministic_and_normalized():
+    """The fake backend returns stable unit vectors, and shared words mean higher similarity."""
+    model = embeddings.FakeEmbeddings()
+    vectors = np.array(model.embed_documents(["python developer", "python engineer", "weather in delhi"]))
+
+    assert vectors.shape == (3, config.EMBEDDING_MODEL_DIMENSION)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert model.embed_query("python developer") == model.embed_documents(["python developer"])[0]
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_build_embeddings_model_selects_backend(monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_BACKEND", "fake")
+    assert isinstance(embeddings.build_embeddings_model(), embeddings.FakeEmbeddings)
+    with pytest.raises(ValueError):
+        embeddings.build_embeddings_model("unknown")
+
+
+def test_local_embeddings_batch_matches_single():
+    """Batched encoding gives the same vectors as encoding one text at a time."""
+    pytest.importorskip("sentence_transformers")
+    model = embeddings.LocalEmbeddings(num_threads=1)
+    batch = model.embed_documents(["hello world", "resume"])
+    assert np.allclose(batch[1], model.embed_query("resume"), atol=1e-5)
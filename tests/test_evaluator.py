@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src import config
+from src import evaluator
+from src import registry
+
+CASES = [
+    {"id": "w", "question": "weather in Delhi", "expected_route": "weather"},
+    {"id": "r", "question": "tell me about avdeep", "expected_route": "rag",
+     "relevant_texts": ["machine   learning engineer"]},
+    {"id": "miss", "question": "what did avdeep study", "expected_route": "weather", "relevant_ids": ["unknown"]},
+]
+
+
+def write_dataset(tmp_path, cases=CASES):
+    path = tmp_path / "eval.jsonl"
+    path.write_text("\n".join(json.dumps(case) for case in cases) + "\n\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("speculative", [False, True])
+def test_evaluate_reports_routing_retrieval_and_latency(offline_agent, tmp_path, monkeypatch, speculative):
+    monkeypatch.setattr(config, "SPECULATIVE_EXECUTION_ENABLED", speculative)
+    report = evaluator.evaluate(evaluator.load_dataset(write_dataset(tmp_path)), workers=3)
+    summary = report.summary()
+
+    assert [result.id for result in report.results] == ["w", "r", "miss"]
+    assert summary["errors"] == 0
+    assert summary["routing_accuracy"] == 2 / 3
+    assert summary["recall@3"] == 0.5  # found for "r", missed for "miss"
+    assert summary["mrr"] == 0.5
+    assert summary["non_empty_rate"] == 1.0
+    assert {"route", "retrieval", "weather", "context", "generation", "total"} <= set(summary["latency"])
+    assert "31°C" in report.results[0].answer
+
+
+def test_cached_cases_are_skipped(offline_agent, tmp_path):
+    calls = []
+    registry.override("processing_chain", RunnableLambda(lambda inputs: calls.append(inputs) or "an answer"))
+    dataset, cache = write_dataset(tmp_path), str(tmp_path / "cache.jsonl")
+
+    evaluator.evaluate(evaluator.load_dataset(dataset), workers=2, cache_path=cache)
+    assert len(calls) == 3
+
+    changed = CASES[:2] + [{**CASES[2], "question": "what did avdeep study at college"}]
+    report = evaluator.evaluate(evaluator.load_dataset(write_dataset(tmp_path, changed)), workers=2, cache_path=cache)
+
+    assert len(calls) == 4  # only the edited case ran again
+    assert [result.cached for result in report.results] == [True, True, False]
+    assert report.summary()["routing_accuracy"] == 2 / 3
+
+
+def test_failing_case_is_reported_not_raised(offline_agent, tmp_path):
+    registry.override("processing_chain", RunnableLambda(lambda inputs: 1 / 0))
+
+    report = evaluator.evaluate(evaluator.load_dataset(write_dataset(tmp_path, CASES[:1])), workers=1)
+
+    assert report.summary()["errors"] == 1
+    assert report.summary()["non_empty_rate"] == 0.0
+    assert report.results[0].error.startswith("ZeroDivisionError")
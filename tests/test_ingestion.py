@@ -0,0 +1,322 @@
+import shutil
+import threading
+import time
+import uuid
+
+import pytest
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient, models
+
+from src import checkpoint
+from src import config
+from src import ingestion
+from src import manifest
+from src import pdf_processor
+from src import registry
+from src import sparse_index
+from src import vector_db
+
+
+class StandInEmbeddings:
+    """A local stand-in for the embedding endpoint that can be slow or flaky."""
+
+    def __init__(self, failures_per_batch: int = 0, delay: float = 0.0):
+        self.failures_per_batch = failures_per_batch
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            key = tuple(texts)
+            self._attempts[key] = self._attempts.get(key, 0) + 1
+            should_fail = self._attempts[key] <= self.failures_per_batch
+        try:
+            time.sleep(self.delay)
+            if should_fail:
+                raise ConnectionError("503 Service Unavailable")
+            return [[float(len(t)), 1.0] for t in texts]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_embed_texts_batches_in_order_with_bounded_concurrency():
+    """Vectors come back in input order, and concurrency never exceeds the limit."""
+    model = StandInEmbeddings(delay=0.01)
+    texts = ["x" * i for i in range(1, 101)]
+    progress = ingestion.IngestionProgress(total=len(texts))
+
+    vectors = ingestion.embed_texts(model, texts, batch_size=8, max_in_flight=3, progress=progress)
+
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert model.calls == 13  # ceil(100 / 8)
+    assert model.max_in_flight <= 3
+    assert progress.done == 100 and progress.batches == 13
+
+
+def test_embed_texts_retries_failed_batches():
+    """Transient failures are retried with backoff until the batch succeeds."""
+    model = StandInEmbeddings(failures_per_batch=2)
+    progress = ingestion.IngestionProgress()
+
+    vectors = ingestion.embed_texts(model, ["a", "bb", "ccc"], batch_size=2, max_retries=2, backoff=0.001,
+                                    progress=progress)
+
+    assert len(vectors) == 3
+    assert progress.retries == 4
+
+
+def test_embed_texts_gives_up_after_max_retries():
+    """A batch that keeps failing surfaces the last error."""
+    model = StandInEmbeddings(failures_per_batch=5)
+    with pytest.raises(ConnectionError):
+        ingestion.embed_texts(model, ["a"], max_retries=1, backoff=0.001)
+
+
+class StandInVectorEmbeddings(StandInEmbeddings):
+    """Stand-in endpoint that returns vectors of the collection's dimension."""
+
+    def embed_documents(self, texts):
+        super().embed_documents(texts)
+        return [[float(len(t) % 7 + 1)] + [1.0] * (config.EMBEDDING_MODEL_DIMENSION - 1) for t in texts]
+
+
+def stand_in_pdf(tmp_path, monkeypatch, name: str = "resume.pdf"):
+    """
+    A PDF whose pages are set by the test: returns its path and a setter that gives it new
+    page texts (and new file content, so the manifest sees a change).
+    """
+    path = tmp_path / name
+    pages = {}
+
+    def set_pages(*texts):
+        path.write_text("\n".join(texts))
+        pages["texts"] = texts
+
+    def iter_loaded_pdfs(paths, workers=None):
+        for file_path in paths:
+            yield file_path, [Document(page_content=t, metadata={"source": file_path, "page": i})
+                              for i, t in enumerate(pages["texts"])]
+
+    monkeypatch.setattr(pdf_processor, "iter_loaded_pdfs", iter_loaded_pdfs)
+    monkeypatch.setattr(config, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    return str(path), set_pages
+
+
+def test_re_ingestion_only_embeds_changed_chunks(tmp_path, monkeypatch):
+    """A re-run skips unchanged chunks, embeds edited ones and deletes stale points."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_incremental")
+    client = QdrantClient(":memory:")
+    registry.override("qdrant_client", client)
+    model = StandInVectorEmbeddings()
+    registry.override("embeddings_model", model)
+    path, set_pages = stand_in_pdf(tmp_path, monkeypatch)
+
+    set_pages("alpha", "beta", "gamma")
+    first = pdf_processor.process_and_store_pdfs(path)
+    assert first["added"] == 3
+    assert client.count(collection_name="test_incremental", exact=True).count == 3
+
+    calls_before = model.calls
+    second = pdf_processor.process_and_store_pdfs(path, force=True)
+    assert second["added"] == 0 and second["unchanged"] == 3
+    assert model.calls == calls_before
+
+    set_pages("alpha", "beta v2")
+    third = pdf_processor.process_and_store_pdfs(path)
+    assert (third["added"], third["unchanged"], third["deleted"]) == (1, 1, 2)
+    stored = {str(p.id) for p in client.scroll("test_incremental")[0]}
+    assert len(stored) == 2 and len(sparse_index.BM25Index.load()) == 2
+    assert set(manifest.get_document_entry(manifest.load_manifest(), path)["point_ids"]) == stored
+
+
+def test_first_ingestion_replaces_points_written_without_a_manifest(tmp_path, monkeypatch):
+    """Points stored by earlier versions (random IDs, no manifest entry) are deleted, not duplicated."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_legacy")
+    client = QdrantClient(":memory:")
+    registry.override("qdrant_client", client)
+    registry.override("embeddings_model", StandInVectorEmbeddings())
+    path, set_pages = stand_in_pdf(tmp_path, monkeypatch)
+    source = manifest.normalize_source(path)
+    vector_db.create_collection_if_not_exists(client)
+    vector = [1.0] * config.EMBEDDING_MODEL_DIMENSION
+    client.upsert("test_legacy", points=[
+        models.PointStruct(id=str(uuid.uuid4()), vector=vector,
+                           payload={"page_content": text, "metadata": {"source": owner}})
+        for text, owner in [("alpha", source), ("beta", source), ("alpha", "other.pdf")]
+    ])
+
+    set_pages("alpha", "beta")
+    stats = pdf_processor.process_and_store_pdfs(path)
+
+    assert (stats["added"], stats["deleted"]) == (2, 2)
+    stored = client.scroll("test_legacy", limit=10)[0]
+    point_ids = manifest.get_document_entry(manifest.load_manifest(), path)["point_ids"]
+    assert sorted(str(p.id) for p in stored if p.payload["metadata"]["source"] == source) == sorted(point_ids)
+    assert len(stored) == 3  # the other document is untouched
+
+
+def test_process_and_store_pdfs_ingests_directory(tmp_path, monkeypatch):
+    """Every PDF in a directory is ingested once, with per-source metadata for filtering."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_directory")
+    monkeypatch.setattr(config, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    for name in ("a.pdf", "b.pdf"):
+        shutil.copy("data/sample.pdf", tmp_path / name)
+    client = QdrantClient(":memory:")
+    registry.override("qdrant_client", client)
+    registry.override("embeddings_model", StandInVectorEmbeddings())
+
+    stats = pdf_processor.process_and_store_pdfs(str(tmp_path), workers=2)
+    total = client.count(collection_name="test_directory", exact=True).count
+    assert stats["added"] == total > 0
+    assert len(sparse_index.BM25Index.load()) == total
+
+    point = client.scroll("test_directory", limit=1)[0][0]
+    assert {"source", "file_name", "page", "start_index"} <= set(point.payload["metadata"])
+    hits = vector_db.query_collection(client, [1.0] * config.EMBEDDING_MODEL_DIMENSION, top_k=100,
+                                      source=str(tmp_path / "a.pdf"))
+    assert len(hits) == total // 2
+
+    rerun = pdf_processor.process_and_store_pdfs(str(tmp_path), workers=2)
+    assert rerun["skipped_documents"] == 2 and rerun["added"] == 0
+
+
+class FailingAfterEmbeddings(StandInVectorEmbeddings):
+    """Stand-in endpoint that goes down for good after a number of calls."""
+
+    def __init__(self, healthy_calls: int = None):
+        super().__init__()
+        self.healthy_calls = healthy_calls
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        if self.healthy_calls is not None and self.calls >= self.healthy_calls:
+            self.calls += 1
+            raise RuntimeError("endpoint down")
+        self.texts += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_interrupted_ingestion_resumes_from_checkpoint(tmp_path, monkeypatch):
+    """A failed run keeps its stored batches; the re-run skips finished documents and embeds only the rest."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_resume")
+    monkeypatch.setattr(config, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(config, "INGEST_CHECKPOINT_PATH", str(tmp_path / "checkpoint.jsonl"))
+    monkeypatch.setattr(config, "EMBEDDING_BATCH_SIZE", 4)
+    monkeypatch.setattr(config, "EMBEDDING_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(config, "EMBEDDING_MAX_RETRIES", 0)
+    monkeypatch.setattr(config, "QDRANT_UPSERT_BATCH_SIZE", 4)
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    for name in ("a.pdf", "b.pdf"):
+        shutil.copy("data/sample.pdf", pdfs / name)
+    client = QdrantClient(":memory:")
+    registry.override("qdrant_client", client)
+    registry.override("embeddings_model", FailingAfterEmbeddings(healthy_calls=8))
+
+    # 22 chunks per document: a.pdf completes, b.pdf stops after 10 of its chunks
+    with pytest.raises(RuntimeError):
+        pdf_processor.process_and_store_pdfs(str(pdfs), workers=1)
+    stored = client.count(collection_name="test_resume", exact=True).count
+    assert stored == 32
+    assert (tmp_path / "checkpoint.jsonl").exists()
+    assert not (tmp_path / "manifest.json").exists()
+
+    # The lexical index of the failed run was never saved; the resumed run restores it
+    registry.override("sparse_index", sparse_index.BM25Index())
+    model = FailingAfterEmbeddings()
+    registry.override("embeddings_model", model)
+    stats = pdf_processor.process_and_store_pdfs(str(pdfs), workers=1)
+
+    assert stats["resumed_documents"] == 1 and stats["added"] == 12
+    assert model.texts == 12
+    assert client.count(collection_name="test_resume", exact=True).count == 44
+    assert len(sparse_index.BM25Index.load()) == 44
+    assert not (tmp_path / "checkpoint.jsonl").exists()
+
+    rerun = pdf_processor.process_and_store_pdfs(str(pdfs), workers=1)
+    assert rerun["skipped_documents"] == 2 and rerun["added"] == 0
+
+
+def test_fresh_run_after_an_interruption_indexes_every_stored_chunk(tmp_path, monkeypatch):
+    """Chunks stored by a run whose checkpoint is discarded still reach the lexical index."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_fresh")
+    monkeypatch.setattr(config, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(config, "INGEST_CHECKPOINT_PATH", str(tmp_path / "checkpoint.jsonl"))
+    monkeypatch.setattr(config, "EMBEDDING_BATCH_SIZE", 4)
+    monkeypatch.setattr(config, "EMBEDDING_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(config, "EMBEDDING_MAX_RETRIES", 0)
+    monkeypatch.setattr(config, "QDRANT_UPSERT_BATCH_SIZE", 4)
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    for name in ("a.pdf", "b.pdf"):
+        shutil.copy("data/sample.pdf", pdfs / name)
+    client = QdrantClient(":memory:")
+    registry.override("qdrant_client", client)
+    registry.override("embeddings_model", FailingAfterEmbeddings(healthy_calls=8))
+    with pytest.raises(RuntimeError):
+        pdf_processor.process_and_store_pdfs(str(pdfs), workers=1)
+
+    registry.override("sparse_index", sparse_index.BM25Index())
+    registry.override("embeddings_model", FailingAfterEmbeddings())
+    stats = pdf_processor.process_and_store_pdfs(str(pdfs), workers=1, resume=False)
+
+    assert stats["resumed_documents"] == 0 and stats["added"] == 12
+    assert client.count(collection_name="test_fresh", exact=True).count == 44
+    assert len(sparse_index.BM25Index.load()) == 44
+
+
+def test_failed_re_ingestion_keeps_the_previous_content(tmp_path, monkeypatch):
+    """Stale points of an edited document are only deleted once all of its new chunks are stored."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_edit")
+    monkeypatch.setattr(config, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(config, "INGEST_CHECKPOINT_PATH", str(tmp_path / "checkpoint.jsonl"))
+    monkeypatch.setattr(config, "EMBEDDING_BATCH_SIZE", 4)
+    monkeypatch.setattr(config, "EMBEDDING_MAX_RETRIES", 0)
+    shutil.copy("data/sample.pdf", tmp_path / "a.pdf")
+    client = QdrantClient(":memory:")
+    registry.override("qdrant_client", client)
+    registry.override("embeddings_model", FailingAfterEmbeddings())
+    pdf_processor.process_and_store_pdfs(str(tmp_path / "a.pdf"), workers=1)
+    old_ids = {str(point.id) for point in client.scroll("test_edit", limit=100)[0]}
+
+    # Re-chunking changes every chunk, like an edit of the whole document
+    monkeypatch.setattr(config, "CHUNK_SIZE", 300)
+    registry.override("embeddings_model", FailingAfterEmbeddings(healthy_calls=1))
+    with pytest.raises(RuntimeError):
+        pdf_processor.process_and_store_pdfs(str(tmp_path / "a.pdf"), force=True, workers=1)
+    assert old_ids <= {str(point.id) for point in client.scroll("test_edit", limit=200)[0]}
+
+    registry.override("embeddings_model", FailingAfterEmbeddings())
+    stats = pdf_processor.process_and_store_pdfs(str(tmp_path / "a.pdf"), force=True, workers=1)
+    stored = {str(point.id) for point in client.scroll("test_edit", limit=200)[0]}
+    assert stats["deleted"] == len(old_ids) and not old_ids & stored
+    assert len(sparse_index.BM25Index.load()) == len(stored)
+
+
+def test_checkpoint_ignores_torn_lines_and_other_jobs(tmp_path):
+    """A half-written last line is dropped, and a checkpoint of a different job is never resumed."""
+    path = str(tmp_path / "checkpoint.jsonl")
+    job = checkpoint.IngestCheckpoint.open("job-1", path)
+    job.record_batch(["p1", "p2"])
+    job.record_document("a.pdf", {"point_ids": ["p1"]}, {"old"})
+    job.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"batch": 2, "point_id')
+
+    resumed = checkpoint.IngestCheckpoint.open("job-1", path)
+    assert resumed.resumed and resumed.batches == 1
+    assert resumed.committed == {"p1", "p2"} and resumed.is_complete("a.pdf")
+    resumed.close()
+
+    other = checkpoint.IngestCheckpoint.open("job-2", path)
+    assert not other.resumed
+    other.finish()
+    assert not (tmp_path / "checkpoint.jsonl").exists()
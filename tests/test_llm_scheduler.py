@@ -0,0 +1,250 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+
+from src import config
+from src import llm_utils
+from src.context import estimate_tokens
+from src.llm_scheduler import DeadlineExceeded, LLMScheduler, TokenBucket
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    """
+    A local stand-in for the Groq chat completions endpoint.
+    `script` lists what to do for each request in turn: (status, delay in seconds, headers);
+    once it is used up every request succeeds immediately.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MockGroqHandler)
+        self.script = []
+        self.requests = []
+        self.client_ports = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request, client_address):
+        pass  # clients closing keep-alive connections
+
+    def next_action(self):
+        with self.lock:
+            return self.script.pop(0) if self.script else (200, 0.0, {})
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        number = len(self.server.requests) + 1
+        self.server.requests.append(body)
+        self.server.client_ports.add(self.client_address[1])
+        status, delay, headers = self.server.next_action()
+        time.sleep(delay)
+        if status == 200:
+            payload = {
+                "id": f"chatcmpl-{number}", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": f"answer {number}"}}],
+                "usage": {"prompt_tokens": 20, "completion_tokens": 5, "total_tokens": 25},
+            }
+        else:
+            payload = {"error": {"message": f"status {status}", "type": "mock"}}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    server = MockGroqServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(config, "GROQ_API_BASE", server.url)
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(config, "LLM_RETRY_BACKOFF_SECONDS", 0.01)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def scheduler(**kwargs) -> LLMScheduler:
+    return LLMScheduler(llm_utils.get_chat_model(), **kwargs)
+
+
+def test_chains_use_the_scheduler_over_pooled_connections(mock_server):
+    chain = llm_utils.get_processing_chain()
+
+    answers = [chain.invoke({"context": "ctx", "question": f"question {i}"}) for i in range(3)]
+
+    assert answers == ["answer 1", "answer 2", "answer 3"]
+    assert isinstance(llm_utils.get_shared_llm(), LLMScheduler)
+    assert len(mock_server.client_ports) == 1  # one keep-alive connection for all calls
+    assert mock_server.requests[0]["max_tokens"] == config.LLM_MAX_OUTPUT_TOKENS
+
+
+def test_retries_rate_limits_and_server_errors(mock_server):
+    mock_server.script = [(429, 0, {"Retry-After": "0.05"}), (503, 0, {})]
+    llm = scheduler()
+
+    start = time.monotonic()
+    assert llm.invoke("hello").content == "answer 3"
+
+    assert time.monotonic() - start >= 0.05
+    assert llm.stats["retries"] == 2 and llm.stats["attempts"] == 3
+
+
+def test_client_errors_are_not_retried(mock_server):
+    mock_server.script = [(400, 0, {})]
+    llm = scheduler()
+
+    with pytest.raises(Exception) as error:
+        llm.invoke("hello")
+
+    assert getattr(error.value, "status_code", None) == 400
+    assert len(mock_server.requests) == 1
+
+
+def test_hedged_request_wins_over_a_slow_one(mock_server):
+    mock_server.script = [(200, 1.0, {})]
+    llm = scheduler(hedge_after_seconds=0.05)
+
+    start = time.monotonic()
+    answer = llm.invoke("hello").content
+
+    assert answer == "answer 2"
+    assert time.monotonic() - start < 0.8
+    assert llm.stats["hedges"] == 1 and llm.stats["hedge_wins"] == 1
+
+
+def test_hedges_report_to_no_callbacks_and_skip_streamed_calls():
+    class TokenStreamHandler(BaseCallbackHandler):
+        def tap_output_iter(self, run_id, output):
+            return output
+
+        def tap_output_aiter(self, run_id, output):
+            return output
+
+    seen = []
+
+    def slow_first_call(prompt, config):
+        seen.append(getattr(config.get("callbacks"), "handlers", None))
+        if len(seen) == 1:
+            time.sleep(0.3)
+        return prompt
+
+    tracer = BaseCallbackHandler()
+    llm = LLMScheduler(RunnableLambda(slow_first_call), hedge_after_seconds=0.05)
+    assert llm.invoke("hello", {"callbacks": [tracer]}) == "hello"
+    assert llm.stats["hedges"] == 1
+    assert tracer in seen[0] and tracer not in (seen[1] or [])
+
+    llm = LLMScheduler(RunnableLambda(slow_first_call), hedge_after_seconds=0.05)
+    llm.invoke("hello", {"callbacks": [TokenStreamHandler()]})
+    assert llm.stats["hedges"] == 0
+
+
+def test_retries_reserve_tokens_again(mock_server):
+    mock_server.script = [(503, 0, {})]
+    llm = scheduler(tokens_per_minute=60, max_output_tokens=20)
+    estimated = estimate_tokens("hello") + 20
+
+    llm.invoke("hello")
+
+    # Two reservations, the successful one corrected to the reported usage of 25 tokens
+    assert llm.tokens._tokens == pytest.approx(60 - estimated - 25, abs=1)
+
+
+def test_deadline_bounds_slow_calls_and_retries(mock_server):
+    mock_server.script = [(200, 1.0, {})]
+    llm = scheduler(deadline_seconds=0.2)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        llm.invoke("hello")
+    assert time.monotonic() - start < 0.6
+
+    # A Retry-After beyond the deadline fails right away instead of sleeping through it
+    mock_server.script = [(429, 0, {"Retry-After": "5"})]
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        scheduler(deadline_seconds=1.0).invoke("hello")
+    assert time.monotonic() - start < 0.6
+
+
+def test_attempt_abandoned_at_the_deadline_keeps_its_slot():
+    finish = threading.Event()
+
+    def stuck(prompt):
+        finish.wait(5)
+        return prompt
+
+    llm = LLMScheduler(RunnableLambda(stuck), max_concurrency=1, deadline_seconds=0.1, hedge_after_seconds=0)
+    with pytest.raises(DeadlineExceeded):
+        llm.invoke("hello")
+
+    # The thread is still running the first call, so a second one cannot start yet
+    assert not llm._slots.acquire(blocking=False)
+    finish.set()
+    assert llm._slots.acquire(timeout=1)
+    llm._slots.release()
+
+
+def test_request_limit_spaces_out_calls(mock_server):
+    llm = scheduler(requests_per_minute=600, deadline_seconds=5)  # a burst of 10, then one per 0.1s
+    llm.requests._tokens = 1
+
+    start = time.monotonic()
+    for _ in range(3):
+        llm.invoke("hello")
+
+    assert time.monotonic() - start >= 0.18
+    assert len(mock_server.requests) == 3
+
+
+def test_async_calls_share_the_limits(mock_server):
+    """ainvoke waits for a slot on the event loop and retries like invoke does."""
+    mock_server.script = [(429, 0, {"Retry-After": "0.05"}), (200, 0.1, {}), (200, 0.1, {}), (200, 0.1, {})]
+    llm = scheduler(max_concurrency=1)
+
+    async def ask_all():
+        return await asyncio.gather(*(llm.ainvoke(f"hello {i}") for i in range(3)))
+
+    start = time.monotonic()
+    answers = asyncio.run(ask_all())
+
+    assert sorted(answer.content for answer in answers) == ["answer 2", "answer 3", "answer 4"]
+    assert time.monotonic() - start >= 0.3  # one call at a time
+    assert llm.stats["retries"] == 1 and llm.stats["calls"] == 3
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire(2) == 0
+    assert bucket.try_acquire(1) == pytest.approx(0.1, abs=0.02)
+
+    with pytest.raises(DeadlineExceeded):
+        bucket.acquire(2, deadline=time.monotonic() + 0.05)
+    assert bucket.acquire(1, deadline=time.monotonic() + 1) > 0
+
+    bucket.refund(-5)  # usage above the estimate puts the bucket in debt
+    assert bucket.try_acquire(1) > 0.5
+    assert TokenBucket(rate=0, capacity=0).try_acquire(1000) == 0
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import threading
+import urllib.request
+
+import pytest
+
+from src import agent
+from src import config
+from src import metrics
+from src.server import AgentServer
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_timer_records_latency_errors_and_json_events(tmp_path, monkeypatch):
+    log_path = tmp_path / "events.jsonl"
+    monkeypatch.setattr(config, "METRICS_LOG_PATH", str(log_path))
+
+    with metrics.timer("qdrant_seconds", op="search"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.timer("qdrant_seconds", op="search"):
+            raise RuntimeError("boom")
+
+    assert metrics.summary("qdrant_seconds", op="search")["count"] == 2
+    assert metrics.counter("errors_total", metric="qdrant_seconds", op="search") == 1
+    events = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [event["event"] for event in events] == ["qdrant_seconds", "qdrant_seconds"]
+    assert "error" not in events[0] and "boom" in events[1]["error"]
+    assert events[0]["op"] == "search" and events[0]["duration_ms"] >= 0
+
+
+def test_percentile_uses_the_nearest_rank():
+    samples = list(range(1, 11))
+    assert metrics.percentile(samples, 50) == 5  # an exact integer rank is not rounded up
+    assert metrics.percentile(samples, 51) == 6
+    assert metrics.percentile(list(range(1, 21)), 95) == 19
+    assert metrics.percentile(samples, 0) == 1
+    assert metrics.percentile(samples, 100) == 10
+    assert metrics.percentile([], 50) == 0.0
+
+
+def test_prometheus_export_format():
+    metrics.observe("node_seconds", 0.25, node="rag_node")
+    metrics.increment("cache_requests_total", 3, cache="answer", result="hit")
+
+    text = metrics.export_prometheus()
+
+    assert "# TYPE node_seconds summary" in text
+    assert 'node_seconds{node="rag_node",quantile="0.99"} 0.25' in text
+    assert 'node_seconds_count{node="rag_node"} 1' in text
+    assert 'cache_requests_total{cache="answer",result="hit"} 3' in text
+
+
+def test_graph_nodes_and_calls_are_instrumented_offline(offline_agent, monkeypatch):
+    """A run with tracing off records node, Qdrant, weather and cache metrics, served at /metrics."""
+    asyncio.run(agent.abatch(["weather in Delhi", "tell me about avdeep"]))
+    agent.ask("tell me about avdeep")
+
+    for node in ("decider", "weather_node", "rag_node", "llm_processor_node"):
+        assert metrics.summary("node_seconds", node=node)["count"] >= 1
+    assert metrics.summary("weather_seconds")["count"] == 1
+    assert metrics.summary("qdrant_seconds", op="search_batch")["count"] >= 1
+    assert metrics.counter("cache_requests_total", cache="answer", result="hit") == 1
+    assert metrics.counter("llm_prompt_tokens_total", chain="processor") > 0
+
+    server = AgentServer(("127.0.0.1", 0), workers=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        host, port = server.server_address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+            body = response.read().decode()
+        assert 'node_seconds_count{node="rag_node"}' in body
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient, models
+
+from src import config
+from src import registry
+from src import tool
+from src import vector_db
+from src.embeddings import FakeEmbeddings
+from src.mmap_store import MmapVectorStore
+
+
+def random_vectors(count: int, dimension: int = 32, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+
+def fill(client, vectors: np.ndarray):
+    client.create_collection(collection_name="points", vectors_config=models.VectorParams(
+        size=vectors.shape[1], distance=models.Distance.COSINE
+    ))
+    client.upsert(collection_name="points", points=models.Batch(
+        ids=list(range(len(vectors))), vectors=vectors.tolist(),
+        payloads=[{"page_content": f"chunk {i}", "metadata": {"page": i % 3}} for i in range(len(vectors))]
+    ))
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_batched_search_matches_qdrant(tmp_path, dtype):
+    vectors, queries = random_vectors(500), random_vectors(8, seed=1)
+    qdrant, store = QdrantClient(":memory:"), MmapVectorStore(str(tmp_path), dtype)
+    fill(qdrant, vectors)
+    fill(store, vectors)
+
+    requests = [models.QueryRequest(query=query.tolist(), limit=5, with_payload=True) for query in queries]
+    expected = qdrant.query_batch_points(collection_name="points", requests=requests)
+    actual = store.query_batch_points(collection_name="points", requests=requests)
+
+    for want, got in zip(expected, actual):
+        assert [str(point.id) for point in got.points] == [str(point.id) for point in want.points]
+        assert np.allclose([p.score for p in got.points], [p.score for p in want.points], atol=1e-2)
+        assert got.points[0].payload["page_content"] == want.points[0].payload["page_content"]
+
+
+def test_store_is_shared_between_instances(tmp_path):
+    """A second instance (as in another process) sees writes and deletes without loading anything."""
+    vectors = random_vectors(50)
+    writer = MmapVectorStore(str(tmp_path))
+    fill(writer, vectors)
+    reader = MmapVectorStore(str(tmp_path))
+    assert reader.count("points").count == 50
+
+    writer.upsert(collection_name="points", points=[models.PointStruct(id=7, vector=vectors[0].tolist(),
+                                                                       payload={"page_content": "moved"})])
+    writer.delete(collection_name="points", points_selector=models.PointIdsList(points=[0]))
+    hits = reader.query_points(collection_name="points", query=vectors[0].tolist(), limit=2).points
+
+    assert [hit.id for hit in hits][0] == 7
+    assert 0 not in [hit.id for hit in hits]
+    assert reader.count("points").count == 49
+    assert [record.payload for record in reader.retrieve("points", [7])] == [{"page_content": "moved"}]
+
+
+def test_failed_update_leaves_the_committed_points_unchanged(tmp_path):
+    vectors = random_vectors(20)
+    store = MmapVectorStore(str(tmp_path))
+    fill(store, vectors)
+
+    with pytest.raises(TypeError):  # the payload cannot be stored, so the write rolls back
+        store.upsert(collection_name="points", points=[models.PointStruct(id=3, vector=vectors[9].tolist(),
+                                                                          payload={"bad": object()})])
+    hits = store.query_points(collection_name="points", query=vectors[3].tolist(), limit=1).points
+    assert [(hit.id, hit.payload["page_content"]) for hit in hits] == [(3, "chunk 3")]
+
+    store.upsert(collection_name="points", points=[models.PointStruct(id=3, vector=vectors[9].tolist(), payload={})])
+    hits = store.query_points(collection_name="points", query=vectors[9].tolist(), limit=3).points
+    assert sorted(hit.id for hit in hits[:2]) == [3, 9] and store.count("points").count == 20
+
+
+def test_filters_projection_and_paging(tmp_path):
+    store = MmapVectorStore(str(tmp_path))
+    fill(store, random_vectors(30))
+    query = random_vectors(1, seed=2)[0].tolist()
+
+    hits = store.query_points(collection_name="points", query=query, limit=20,
+                              query_filter=vector_db.metadata_filter({"page": [1, 2]}),
+                              with_payload=models.PayloadSelectorInclude(include=["metadata.page"])).points
+    assert len(hits) == 20
+    assert all(hit.payload["metadata"]["page"] in (1, 2) and "page_content" not in hit.payload for hit in hits)
+
+    second_page = store.query_points(collection_name="points", query=query, limit=5, offset=5).points
+    first_ten = store.query_points(collection_name="points", query=query, limit=10).points
+    assert [hit.id for hit in second_page] == [hit.id for hit in first_ten[5:]]
+
+    records, offset, seen = [], None, 0
+    while True:
+        records, offset = store.scroll(collection_name="points", limit=7, offset=offset)
+        seen += len(records)
+        if offset is None:
+            break
+    assert seen == 30
+
+    records, _ = store.scroll(collection_name="points", scroll_filter=vector_db.metadata_filter({"page": 1}), limit=30)
+    assert len(records) == 10 and all(record.payload["metadata"]["page"] == 1 for record in records)
+
+
+def test_retrieval_runs_on_the_mmap_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_STORE_BACKEND", "mmap")
+    monkeypatch.setattr(config, "MMAP_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(config, "MICRO_BATCH_ENABLED", False)
+    model = FakeEmbeddings()
+    registry.override("embeddings_model", model)
+    client = vector_db.get_shared_client()
+    assert isinstance(client, MmapVectorStore)
+
+    vector_db.create_collection_if_not_exists(client)
+    texts = ["Avdeep worked on computer vision at a startup.", "He studied electrical engineering."]
+    documents = [Document(page_content=text, metadata={"source": "cv.pdf", "embedding": model.embed_query(text)})
+                 for text in texts]
+    point_ids = vector_db.assign_point_ids(documents)
+    vector_db.upsert_documents(client, documents)
+
+    assert vector_db.get_existing_point_ids(client, point_ids) == set(point_ids)
+    assert "computer vision" in tool.retrieve_pdf_context.invoke("computer vision startup")
+    vector_db.delete_points(client, point_ids[:1])
+    assert vector_db.query_collection(client, model.embed_query("computer vision"), top_k=3) == [texts[1]]
@@ -0,0 +1,41 @@
+import threading
+from unittest.mock import MagicMock
+
+from src import registry
+
+
+def test_get_or_create_builds_once_across_threads():
+    """Concurrent callers must all receive the same instance from a single factory call."""
+    factory = MagicMock(side_effect=lambda: object())
+    results = []
+
+    def worker():
+        results.append(registry.get_or_create("shared", factory))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    factory.assert_called_once()
+    assert all(r is results[0] for r in results)
+
+
+def test_shutdown_closes_and_clears():
+    """Shutdown should call the close hooks and force a rebuild on next use."""
+    close = MagicMock()
+    first = registry.get_or_create("closable", lambda: object(), close=close)
+
+    registry.shutdown()
+
+    close.assert_called_once_with(first)
+    assert not registry.is_initialized("closable")
+    assert registry.get_or_create("closable", lambda: object()) is not first
+
+
+def test_override_replaces_instance():
+    """Overrides take precedence over the factory."""
+    fake = object()
+    registry.override("llm", fake)
+    assert registry.get_or_create("llm", lambda: object()) is fake
@@ -1,15 +1,19 @@
+import os
+
 import pytest
 from qdrant_client import QdrantClient, models
 from langchain_core.documents import Document
 
 from src import config
-from src.vector_db import create_collection_if_not_exists, upsert_documents, query_collection
+from src.vector_db import create_collection_if_not_exists, upsert_documents, query_collection, assign_point_ids, upsert_stream, search_batch, make_point_id
+
 
 @pytest.fixture
 def in_memory_client():
     """Fixture to create an in-memory Qdrant client for testing."""
     return QdrantClient(":memory:")
 
+
 def test_db_operations(in_memory_client):
     """Tests the full cycle of collection creation, upsert, and query."""
     client = in_memory_client
@@ -42,4 +46,70 @@ def test_db_operations(in_memory_client):
     assert results[0] == "The Eiffel Tower is in Paris."
     
     # Cleanup: restore original config value
-    config.QDRANT_COLLECTION_NAME = original_collection_name
\ No newline at end of file
+    config.QDRANT_COLLECTION_NAME = original_collection_name
+
+
+def test_point_ids_are_deterministic():
+    """The same chunk always gets the same ID; duplicates within a document do not collide."""
+    docs = [
+        Document(page_content="Python", metadata={"source": "a.pdf"}),
+        Document(page_content="Python", metadata={"source": "a.pdf"}),
+        Document(page_content="Python", metadata={"source": "b.pdf"}),
+    ]
+    first = assign_point_ids(docs)
+    second = assign_point_ids([Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in docs])
+
+    assert first == second
+    assert len(set(first)) == 3
+
+
+def test_upsert_stream_batches_without_duplicating_embeddings(in_memory_client, monkeypatch):
+    """Streaming upserts write fixed-size batches and keep the vector out of the payload."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_stream")
+    create_collection_if_not_exists(in_memory_client)
+    docs = (
+        Document(page_content=f"chunk {i}", metadata={"source": "a.pdf", "embedding": [0.1 + i] * config.EMBEDDING_MODEL_DIMENSION})
+        for i in range(25)
+    )
+
+    report = upsert_stream(in_memory_client, docs, batch_size=10, parallel=2)
+
+    assert report.points == 25 and report.batches == 3
+    assert in_memory_client.count(collection_name="test_stream", exact=True).count == 25
+    point = in_memory_client.scroll("test_stream", limit=1)[0][0]
+    assert "embedding" not in point.payload["metadata"]
+
+
+def test_search_batch_scores_filters_and_pages(in_memory_client, monkeypatch):
+    """One call answers several queries with scored hits, projected payloads, filters and offsets."""
+    monkeypatch.setattr(config, "QDRANT_COLLECTION_NAME", "test_search_batch")
+    create_collection_if_not_exists(in_memory_client)
+    dim = config.EMBEDDING_MODEL_DIMENSION
+    docs = [
+        Document(page_content=f"chunk {i}", metadata={"source": "a.pdf" if i % 2 else "b.pdf", "page": i,
+                                                      "embedding": [1.0] * (i + 1) + [0.0] * (dim - i - 1)})
+        for i in range(6)
+    ]
+    upsert_documents(in_memory_client, docs)
+    queries = [[1.0] + [0.0] * (dim - 1), [1.0] * 6 + [0.0] * (dim - 6)]
+
+    first, second = search_batch(in_memory_client, queries, top_k=2, payload_fields=["page_content"])
+    assert [hit.page_content for hit in first] == ["chunk 0", "chunk 1"]
+    assert second[0].page_content == "chunk 5" and second[0].score >= second[1].score
+    assert set(first[0].payload) == {"page_content"}
+
+    [filtered] = search_batch(in_memory_client, queries[:1], top_k=10, filters={"source": "a.pdf"})
+    assert [hit.payload["metadata"]["page"] for hit in filtered] == [1, 3, 5]
+
+    [next_page] = search_batch(in_memory_client, queries[:1], top_k=2, offset=2, payload_fields=["page_content"])
+    assert [hit.page_content for hit in next_page] == ["chunk 2", "chunk 3"]
+
+    [confident] = search_batch(in_memory_client, queries[:1], top_k=10, score_threshold=0.6)
+    assert all(hit.score >= 0.6 for hit in confident) and len(confident) < 6
+
+
+def test_point_ids_ignore_how_the_path_is_spelled():
+    """'./data/x.pdf', 'data/x.pdf' and the absolute path are the same document."""
+    spellings = ["data/x.pdf", "./data/x.pdf", "data//x.pdf", os.path.abspath("data/x.pdf")]
+    assert len({make_point_id(source, "Python") for source in spellings}) == 1
+    assert make_point_id("data/y.pdf", "Python") != make_point_id("data/x.pdf", "Python")
@@ -0,0 +1,47 @@
+from langchain_core.runnables import RunnableLambda
+
+from src import config
+from src import registry
+from src import router
+from src.embeddings import FakeEmbeddings
+
+
+def test_rules_route_common_questions_without_the_llm():
+    """Bare city names, weather words and resume words are decided locally."""
+    registry.override("decider_chain", RunnableLambda(lambda _: (_ for _ in ()).throw(AssertionError("LLM called"))))
+
+    for question, expected in [
+        ("Delhi", "weather"),
+        ("Will it rain in Mumbai tomorrow?", "weather"),
+        ("tell me about avdeep's experience? in 2 lines", "rag"),
+        ("What skills are on the resume?", "rag"),
+    ]:
+        decision = router.route(question)
+        assert (decision.route, decision.tier) == (expected, "rules")
+        assert decision.latencies_ms["rules"] < 5
+
+
+def test_low_confidence_falls_back_to_llm():
+    """Questions the rules cannot place go to the LLM decider."""
+    registry.override("decider_chain", RunnableLambda(lambda _: "rag"))
+    router.reset_stats()
+
+    decision = router.route("What is the capital of France?")
+
+    assert (decision.route, decision.tier) == ("rag", "llm")
+    stats = router.get_stats()
+    assert stats["rules"]["calls"] == 1 and stats["rules"]["decisions"] == 0
+    assert stats["llm"]["decisions"] == 1
+
+
+def test_prototype_tier(monkeypatch):
+    """With prototypes enabled, embedding similarity decides before the LLM is asked."""
+    monkeypatch.setattr(config, "ROUTER_USE_PROTOTYPES", True)
+    registry.override("embeddings_model", FakeEmbeddings())
+    registry.override("decider_chain", RunnableLambda(lambda _: "weather"))
+
+    decision = router.route("Which projects has Avdeep completed lately?", threshold=0.95)
+    assert "prototypes" in decision.latencies_ms
+
+    decision = router.route("Summarize the document in two lines please", threshold=0.6)
+    assert (decision.route, decision.tier) == ("rag", "prototypes")
@@ -0,0 +1,120 @@
+import json
+import threading
+import urllib.request
+
+import pytest
+
+from src import agent
+from src import config
+from src import loadtest
+from src import tool
+from src.batching import MicroBatcher
+from src.server import AgentServer
+
+
+@pytest.fixture
+def server(offline_agent):
+    """Runs the HTTP server on a free port in a background thread."""
+    server = AgentServer(("127.0.0.1", 0), workers=4, queue_size=4, timeout=5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server) -> str:
+    host, port = server.server_address
+    return f"http://{host}:{port}"
+
+
+def test_micro_batcher_groups_concurrent_items():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(8)]
+
+    assert [future.result(timeout=5) for future in futures] == list(range(0, 16, 2))
+    assert len(calls) == 1
+    batcher.close()
+
+
+def test_micro_batcher_skips_cancelled_items():
+    calls = []
+    batcher = MicroBatcher(lambda items: calls.append(list(items)) or items, max_batch_size=8, max_wait_ms=50)
+    kept, cancelled = batcher.submit("kept"), batcher.submit("cancelled")
+    assert cancelled.cancel()
+
+    assert kept.result(timeout=5) == "kept"
+    assert calls == [["kept"]]
+    batcher.close()
+
+
+def test_micro_batcher_drains_on_close_and_then_refuses_items():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=8, max_wait_ms=50)
+    queued = batcher.submit("queued")
+    batcher.close()
+
+    assert queued.result(timeout=0) == "queued"
+    with pytest.raises(RuntimeError):
+        batcher.submit("late")
+
+
+def test_ask_and_health(server):
+    request = urllib.request.Request(f"{url(server)}/ask", data=json.dumps({"question": "weather in Delhi"}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        body = json.loads(response.read())
+    with urllib.request.urlopen(f"{url(server)}/health") as response:
+        health = json.loads(response.read())
+
+    assert "31°C" in body["answer"]
+    assert body["route"] == "weather"
+    assert health["status"] == "ok"
+    assert health["requests"] == 1
+
+
+def test_concurrent_retrievals_share_batches(server, monkeypatch):
+    """Concurrent document questions reach Qdrant in fewer batched searches than requests."""
+    monkeypatch.setattr(config, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "MICRO_BATCH_MAX_WAIT_MS", 50)
+    report = loadtest.run_load_test(url(server), ["tell me about avdeep"], requests=8, concurrency=4)
+
+    batcher = tool.get_retrieval_batcher()
+    assert report.statuses == {200: 8}
+    assert batcher.stats["items"] == 8
+    assert batcher.stats["batches"] < 8
+    assert report.summary()["p99_ms"] >= report.summary()["p50_ms"] > 0
+
+
+def test_overload_is_rejected_and_slow_requests_time_out(offline_agent, monkeypatch):
+    """Beyond workers + queue the server answers 503 at once; a stuck request gets a 504."""
+    release = threading.Event()
+    monkeypatch.setattr(agent, "ask", lambda question: release.wait() and {"answer": "late"})
+    server = AgentServer(("127.0.0.1", 0), workers=1, queue_size=1, timeout=0.2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        report = loadtest.run_load_test(url(server), ["slow"], requests=6, concurrency=6)
+        assert report.statuses[503] >= 1
+        assert report.statuses[504] >= 1
+        assert server.health()["rejected"] == report.statuses[503]
+    finally:
+        release.set()
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_submit_releases_its_slot():
+    """A request the worker pool refuses gets a 500 and gives its admission slot back."""
+    server = AgentServer(("127.0.0.1", 0), workers=1, queue_size=0)
+    server.server_close()  # shuts the worker pool down
+
+    for _ in range(3):
+        status, _ = server.answer("hello")
+        assert status == 500
+    assert server.health()["in_flight"] == 0
+    assert server.health()["rejected"] == 0
@@ -0,0 +1,62 @@
+from langchain_core.documents import Document
+
+from src import config
+from src import registry
+from src import sparse_index
+from src import tool
+from src import vector_db
+from src.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_technical_terms():
+    assert tokenize("Built APIs in C++ and Node.js at Acme (2021).") == ["built", "apis", "c++", "node.js", "acme", "2021"]
+
+
+def test_bm25_ranks_exact_terms_and_supports_updates(tmp_path):
+    index = BM25Index()
+    index.add("1", "Worked on Kubernetes deployments at Acme in 2021")
+    index.add("2", "Machine learning research on transformers")
+    index.add("3", "Led the data platform team at Globex")
+
+    assert index.search("acme 2021")[0][0] == "1"
+    assert [point_id for point_id, _ in index.search("globex")] == ["3"]
+    assert index.search("unrelated words") == []
+
+    index.remove(["1"])
+    index.add("3", "Led the data platform team at Initech")
+    assert index.search("acme") == [] and index.search("globex") == []
+
+    path = str(tmp_path / "index.json")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 2 and loaded.search("initech") == index.search("initech")
+    loaded.remove(["3"])
+    assert "initech" not in loaded.postings
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = [item for item, _ in reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]])]
+    assert fused[:2] == ["a", "c"]
+    assert set(fused) == {"a", "b", "c", "d"}
+
+
+def test_hybrid_retrieval_finds_exact_terms_dense_search_misses(offline_agent, monkeypatch):
+    """A chunk that only the lexical side ranks highly still makes it into the context."""
+    client = vector_db.get_shared_client()
+    dim = config.EMBEDDING_MODEL_DIMENSION
+    monkeypatch.setattr(config, "RETRIEVAL_TOP_K", 2)
+    docs = [Document(page_content=f"Generic filler chunk {i}", metadata={"embedding": [1.0] * dim}) for i in range(12)]
+    docs.append(Document(page_content="Certified in Terraform and Ansible in 2019",
+                         metadata={"embedding": [-1.0] * dim}))
+    vector_db.upsert_documents(client, docs)
+    registry.override("sparse_index", BM25Index())
+    sparse_index.rebuild_from_collection(client, sparse_index.get_sparse_index())
+
+    query_embedding = [1.0] * dim
+    monkeypatch.setattr(config, "HYBRID_SEARCH_ENABLED", False)
+    [dense_only] = tool.search_documents(["terraform certification 2019"], [query_embedding])
+    monkeypatch.setattr(config, "HYBRID_SEARCH_ENABLED", True)
+    [hybrid] = tool.search_documents(["terraform certification 2019"], [query_embedding])
+
+    assert not any("Terraform" in doc.page_content for doc in dense_only)
+    assert any("Terraform" in doc.page_content for doc in hybrid)
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from src.weather_cache import WeatherCache, normalize_city
+
+
+@pytest.fixture
+def fake_weather_server():
+    """A local stand-in for OpenWeatherMap that counts requests and answers slowly."""
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            city = parse_qs(urlparse(self.path).query)["q"][0]
+            calls.append(city)
+            time.sleep(0.05)
+            body = json.dumps({"name": city, "temp": 30 + len(calls)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def fetch(city):
+        response = requests.get(f"http://127.0.0.1:{server.server_port}/weather", params={"q": city}, timeout=5)
+        response.raise_for_status()
+        data = response.json()
+        return f"{data['name']}: {data['temp']}°C"
+
+    yield fetch, calls
+    server.shutdown()
+
+
+@pytest.mark.parametrize("question, city", [
+    ("Delhi", "delhi"),
+    ("What's the weather like in New Delhi today?", "new delhi"),
+    ("temperature in Springfield", "springfield"),
+    ("  PARIS! ", "paris"),
+])
+def test_normalize_city(question, city):
+    assert normalize_city(question) == city
+
+
+def test_concurrent_misses_make_one_upstream_call(fake_weather_server):
+    fetch, calls = fake_weather_server
+    cache = WeatherCache(fetch, ttl_seconds=60, stale_seconds=0)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("delhi"))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == ["Delhi"]
+    assert set(results) == {"Delhi: 31°C"}
+    assert cache.stats["upstream_calls"] == 1
+    assert cache.stats["misses"] + cache.stats["coalesced"] + cache.stats["hits"] == 10
+
+    cache.get("delhi")
+    assert cache.stats["hits"] >= 1 and cache.hit_rate == pytest.approx(10 / 11)
+
+
+def test_stale_while_revalidate(fake_weather_server):
+    fetch, calls = fake_weather_server
+    cache = WeatherCache(fetch, ttl_seconds=0.05, stale_seconds=60)
+    assert cache.get("london") == "London: 31°C"
+    time.sleep(0.1)
+
+    # The stale value is returned immediately while a single refresh runs in the background
+    assert cache.get("london") == "London: 31°C"
+    assert cache.stats["stale_hits"] == 1
+    deadline = time.time() + 2
+    while cache.get("london") != "London: 32°C" and time.time() < deadline:
+        time.sleep(0.01)
+    assert calls == ["London", "London"]
+
+
+def test_errors_are_not_cached():
+    attempts = []
+
+    def flaky(city):
+        attempts.append(city)
+        if len(attempts) == 1:
+            raise ConnectionError("API limit reached")
+        return f"{city}: sunny"
+
+    cache = WeatherCache(flaky, ttl_seconds=60)
+    with pytest.raises(ConnectionError):
+        cache.get("paris")
+    assert cache.get("paris") == "Paris: sunny"
+    assert cache.stats["errors"] == 1